@@ -1,3 +1,5 @@
+import os
+
 from pydantic_settings import BaseSettings
 from pydantic import field_validator
 from typing import Optional, List
@@ -27,10 +29,52 @@ class Settings(BaseSettings):
     STORAGE_REGION: str = "auto"
     LOCAL_STORAGE_PATH: str = "./storage"
 
+    # File URL Settings
+    PUBLIC_BASE_URL: Optional[str] = None  # Prefix for file URLs, e.g. https://api.example.com
+    FILE_URL_EXPIRE_SECONDS: int = 7 * 24 * 3600
+    FILE_URL_WINDOW_SECONDS: int = 24 * 3600  # File URLs stay identical within a window
+
     # File Upload Settings
     MAX_FILE_SIZE: int = 100 * 1024 * 1024  # 100MB
     ALLOWED_FILE_TYPES: str = "pdf,epub"
 
+    # Content Index Settings
+    CONTENT_INDEX_ENABLED: bool = True
+    CONTENT_INDEX_BATCH_SIZE: int = 50  # Pages/spine items committed per batch
+
+    # EPUB Resource Settings
+    EPUB_DIRECTORY_CACHE_SIZE: int = 512  # Books whose zip directory is kept in memory
+    EPUB_RESOURCE_MAX_AGE: int = 86400  # Cache-Control max-age in seconds
+    EPUB_MAX_ENTRY_MB: int = 64  # Archive entries declaring more are refused
+
+    # PDF Page Range Settings
+    PAGE_RANGE_MAX_PAGES: int = 50
+    PAGE_RANGE_EXTRACTIONS_PER_BOOK: int = 1  # Concurrent page range extractions of one book, per worker
+
+    # PDF Optimization Settings
+    PDF_OPTIMIZE_ENABLED: bool = False  # Generate an optimized variant at upload
+    PDF_OPTIMIZE_TARGET_DPI: int = 150  # Images above this resolution are downsampled
+    PDF_OPTIMIZE_JPEG_QUALITY: int = 75
+    PDF_OPTIMIZE_MIN_SAVING: float = 0.05  # Keep the variant only if it is this much smaller
+
+    # EPUB Pagination Settings
+    EPUB_CHARS_PER_PAGE: int = 1500  # Characters of text per page in the pagination map
+
+    # Compression Settings
+    COMPRESSION_ENABLED: bool = True
+    COMPRESSION_MIN_SIZE: int = 1024  # Smaller bodies are sent as is
+    COMPRESSION_MAX_SIZE: int = 8 * 1024 * 1024  # Larger bodies are not compressed on the fly
+    COMPRESSION_GZIP_LEVEL: int = 6
+    COMPRESSION_BROTLI_QUALITY: int = 4
+    COMPRESSION_ZSTD_LEVEL: int = 3
+    COMPRESSION_CACHE_SIZE_MB: int = 32  # Compressed bodies of ETagged responses
+
+    # Cache Settings
+    CACHE_BACKEND: str = "memory"  # memory, redis or none
+    CACHE_MAX_MEMORY_MB: int = 64  # Memory backend only
+    CACHE_TTL_SECONDS: int = 300
+    CACHE_REDIS_URL: Optional[str] = None  # e.g. redis://localhost:6379/0, or local:// for an in-process stand-in
+
     # Email Settings (for password reset)
     SMTP_HOST: Optional[str] = None
     SMTP_PORT: int = 587
@@ -46,6 +90,42 @@ class Settings(BaseSettings):
     # CORS Settings
     CORS_ORIGINS: str = "*"
 
+    # Startup Settings
+    PRELOAD_MODULES: str = "background"  # "none", "background" or "startup"
+    WARMUP_ENABLED: bool = False  # /health reports 503 until warm-up is done
+    WARMUP_DB_CONNECTIONS: int = 2
+    WARMUP_CACHE_USERS: int = 0  # Most recent readers whose library is cached
+
+    # Metrics Settings
+    METRICS_ENABLED: bool = True
+    METRICS_TOKEN: Optional[str] = None  # If set, /metrics requires "Authorization: Bearer <token>"
+    METRICS_MULTIPROCESS_DIR: Optional[str] = None  # Shared by workers to merge their metrics
+    METRICS_FLUSH_SECONDS: int = 5
+
+    # Query Stats Settings
+    SLOW_QUERY_MS: int = 200  # Log statements at least this slow (0 disables)
+    N_PLUS_ONE_THRESHOLD: int = 10  # With DEBUG, warn when one request repeats a statement this often
+
+    # Tracing Settings
+    TRACING_ENABLED: bool = False
+    TRACING_SAMPLE_RATE: float = 0.01  # Share of requests traced; an incoming sampled traceparent is always followed
+    TRACING_EXPORT_FILE: Optional[str] = None  # Append OTLP/JSON batches to this file
+    TRACING_OTLP_ENDPOINT: Optional[str] = None  # OTLP/HTTP JSON endpoint, e.g. http://collector:4318/v1/traces
+    TRACING_EXPORT_SECONDS: int = 5
+    TRACING_MAX_QUEUE: int = 10000  # Spans kept between exports; more are dropped
+    TRACING_SERVICE_NAME: str = "diread-api"
+
+    # Server Settings (used by serve.py)
+    SERVER_HOST: str = "0.0.0.0"
+    SERVER_PORT: int = 8000
+    SERVER_WORKERS: Optional[int] = None  # None: one per available CPU
+    SERVER_MAX_WORKERS: int = 8
+    SERVER_MAX_REQUESTS: int = 10000  # Restart a worker after this many requests (0 disables)
+    SERVER_MAX_REQUESTS_JITTER: int = 1000
+    SERVER_KEEPALIVE_TIMEOUT: int = 75  # Longer than the idle timeout of the proxy in front
+    SERVER_BACKLOG: int = 2048
+    SERVER_GRACEFUL_TIMEOUT: int = 30  # Wait for in-flight requests and background tasks
+
     @property
     def allowed_file_types_list(self) -> List[str]:
         return [t.strip() for t in self.ALLOWED_FILE_TYPES.split(",")]
@@ -56,6 +136,16 @@ class Settings(BaseSettings):
             return ["*"]
         return [o.strip() for o in self.CORS_ORIGINS.split(",")]
 
+    @property
+    def server_workers(self) -> int:
+        if self.SERVER_WORKERS:
+            return self.SERVER_WORKERS
+        try:
+            cpus = len(os.sched_getaffinity(0))  # CPUs this container may use
+        except AttributeError:
+            cpus = os.cpu_count() or 1
+        return max(1, min(cpus, self.SERVER_MAX_WORKERS))
+
     class Config:
         env_file = ".env"
         extra = "ignore"
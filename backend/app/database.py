@@ -1,6 +1,16 @@
+import hashlib
+import logging
+import time
+
+from sqlalchemy import event, select
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import declarative_base
 from .config import settings
+from .utils import query_stats, tracing
+from .utils.metrics import DB_QUERY_SECONDS, operation
+
+logger = logging.getLogger(__name__)
 
 engine = create_async_engine(
     settings.DATABASE_URL,
@@ -8,6 +18,36 @@ engine = create_async_engine(
     future=True,
 )
 
+if engine.dialect.name == "sqlite":
+    @event.listens_for(engine.sync_engine, "connect")
+    def _enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+        # SQLite ignores ON DELETE CASCADE unless enforcement is enabled per connection
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
+
+@event.listens_for(engine.sync_engine, "before_cursor_execute")
+def _start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(engine.sync_engine, "after_cursor_execute")
+def _record_query(conn, cursor, statement, parameters, context, executemany):
+    seconds = time.perf_counter() - conn.info["query_start"].pop()
+    kind = operation(statement)
+    DB_QUERY_SECONDS.observe(seconds, (kind,))
+    query_stats.record(statement, seconds)
+    tracing.record_span(kind, seconds, {"db.system": conn.dialect.name, "db.statement": statement})
+
+
+@event.listens_for(engine.sync_engine, "handle_error")
+def _discard_query_timer(exception_context):
+    starts = exception_context.connection.info.get("query_start") if exception_context.connection else None
+    if starts:
+        starts.pop()
+
+
 AsyncSessionLocal = async_sessionmaker(
     engine,
     class_=AsyncSession,
@@ -28,5 +68,65 @@ async def get_db():
 
 
 async def create_tables():
+    from .services.search_service import SearchService
+
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(SearchService.create_indexes)
+
+
+def schema_fingerprint() -> str:
+    """Hash of every table, column, index and full-text index definition."""
+    from . import models  # noqa: F401  (register every table)
+    from .services.search_service import SearchService
+
+    parts = []
+    for table in sorted(Base.metadata.tables.values(), key=lambda t: t.name):
+        parts.append(table.name)
+        for column in table.columns:
+            targets = ",".join(sorted(fk.target_fullname for fk in column.foreign_keys))
+            parts.append(f"{column.name}:{column.type!r}:{column.nullable}:{column.primary_key}:{targets}")
+        parts.extend(sorted(index.name for index in table.indexes))
+    parts.extend(" ".join(statement.split()) for statement in SearchService.index_statements())
+    return hashlib.sha1("\n".join(parts).encode()).hexdigest()
+
+
+async def init_schema() -> bool:
+    """
+    Bring the schema up to date at startup.
+
+    ``create_tables`` inspects every table, so it only runs when the stored
+    schema fingerprint is missing or differs from the models; otherwise a
+    single row is read.
+
+    Returns:
+        True if tables were created or upgraded
+    """
+    from .models.schema_version import SchemaVersion
+    from .services.search_service import SearchService
+
+    fingerprint = schema_fingerprint()
+    # Selected from the table, not the entity: an ORM query would configure
+    # every mapper, which costs more than the check saves
+    table = SchemaVersion.__table__
+    try:
+        async with engine.connect() as conn:
+            stored = (await conn.execute(
+                select(table.c.fingerprint).where(table.c.name == "app")
+            )).scalar_one_or_none()
+            if stored == fingerprint:
+                await conn.run_sync(SearchService.detect_indexes)
+                return False
+    except DBAPIError:
+        pass  # No schema_versions table yet
+
+    logger.info("Schema changed, creating tables")
+    await create_tables()
+    async with AsyncSessionLocal() as db:
+        version = await db.get(SchemaVersion, "app")
+        if version is None:
+            db.add(SchemaVersion(name="app", fingerprint=fingerprint))
+        else:
+            version.fingerprint = fingerprint
+        await db.commit()
+    return True
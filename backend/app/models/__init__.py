@@ -5,6 +5,12 @@ from .bookmark import Bookmark
 from .highlight import Highlight
 from .refresh_token import RefreshToken
 from .password_reset import PasswordResetToken
+from .book_content import BookContent, BookContentIndex
+from .book_variant import BookVariant
+from .book_toc import BookToc
+from .book_pagination import BookPagination
+from .data_version import DataVersion
+from .schema_version import SchemaVersion
 
 __all__ = [
     "User",
@@ -14,4 +20,11 @@ __all__ = [
     "Highlight",
     "RefreshToken",
     "PasswordResetToken",
+    "BookContent",
+    "BookContentIndex",
+    "BookVariant",
+    "BookToc",
+    "BookPagination",
+    "DataVersion",
+    "SchemaVersion",
 ]
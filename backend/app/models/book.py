@@ -1,6 +1,6 @@
 import uuid
 from datetime import datetime
-from sqlalchemy import Column, String, Integer, DateTime, ForeignKey, Enum
+from sqlalchemy import Column, String, Integer, DateTime, ForeignKey, Enum, Index
 from sqlalchemy.orm import relationship
 from ..database import Base
 import enum
@@ -27,6 +27,11 @@ class Book(Base):
 
     # Relationships
     user = relationship("User", back_populates="books")
-    reading_progress = relationship("ReadingProgress", back_populates="book", cascade="all, delete-orphan")
-    bookmarks = relationship("Bookmark", back_populates="book", cascade="all, delete-orphan")
-    highlights = relationship("Highlight", back_populates="book", cascade="all, delete-orphan")
+    reading_progress = relationship("ReadingProgress", back_populates="book", cascade="all, delete-orphan", passive_deletes=True)
+    bookmarks = relationship("Bookmark", back_populates="book", cascade="all, delete-orphan", passive_deletes=True)
+    highlights = relationship("Highlight", back_populates="book", cascade="all, delete-orphan", passive_deletes=True)
+
+    __table_args__ = (
+        Index("ix_books_user_created_at", "user_id", "created_at"),
+        Index("ix_books_user_title", "user_id", "title"),
+    )
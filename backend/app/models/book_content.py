@@ -0,0 +1,38 @@
+"""Extracted book text used for full-text content search."""
+from datetime import datetime
+
+from sqlalchemy import Column, String, Integer, DateTime, ForeignKey, Text, UniqueConstraint
+
+from ..database import Base
+
+
+class BookContent(Base):
+    """Text of one PDF page or EPUB spine item."""
+
+    __tablename__ = "book_contents"
+
+    # Integer key doubles as the SQLite rowid used by the FTS5 index
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    book_id = Column(String, ForeignKey("books.id", ondelete="CASCADE"), nullable=False, index=True)
+    user_id = Column(String, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    location = Column(Integer, nullable=False)  # PDF page index or EPUB spine index (0-based)
+    href = Column(String, nullable=True)  # EPUB spine item href
+    cfi = Column(String, nullable=True)  # EPUB location of the spine item
+    text = Column(Text, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint("book_id", "location", name="unique_book_content_location"),
+    )
+
+
+class BookContentIndex(Base):
+    """Content indexing state of a book, so extraction can resume."""
+
+    __tablename__ = "book_content_index"
+
+    book_id = Column(String, ForeignKey("books.id", ondelete="CASCADE"), primary_key=True)
+    status = Column(String, nullable=False, default="pending")  # pending, done, failed
+    next_location = Column(Integer, nullable=False, default=0)
+    total_locations = Column(Integer, nullable=True)
+    error = Column(String, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -0,0 +1,19 @@
+"""Character-offset pagination map of an EPUB."""
+from datetime import datetime
+
+from sqlalchemy import Column, String, Integer, DateTime, ForeignKey, Text, LargeBinary
+
+from ..database import Base
+
+
+class BookPagination(Base):
+    __tablename__ = "book_paginations"
+
+    book_id = Column(String, ForeignKey("books.id", ondelete="CASCADE"), primary_key=True)
+    # Binary map, see PaginationService.encode for the layout
+    data = Column(LargeBinary, nullable=False)
+    spine = Column(Text, nullable=False)  # JSON list of spine item paths, in spine order
+    total_chars = Column(Integer, nullable=False)
+    total_pages = Column(Integer, nullable=False)
+    etag = Column(String, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -0,0 +1,16 @@
+"""Table of contents extracted from a book file."""
+from datetime import datetime
+
+from sqlalchemy import Column, String, DateTime, ForeignKey, Text
+
+from ..database import Base
+
+
+class BookToc(Base):
+    __tablename__ = "book_tocs"
+
+    book_id = Column(String, ForeignKey("books.id", ondelete="CASCADE"), primary_key=True)
+    # JSON list of {"title", "level", "href" (EPUB) or "page" (PDF)} in reading order
+    entries = Column(Text, nullable=False)
+    etag = Column(String, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
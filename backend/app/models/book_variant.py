@@ -0,0 +1,17 @@
+"""Alternative renditions of a book file, such as an optimized PDF."""
+from datetime import datetime
+
+from sqlalchemy import Column, String, Integer, DateTime, ForeignKey
+
+from ..database import Base
+
+
+class BookVariant(Base):
+    __tablename__ = "book_variants"
+
+    book_id = Column(String, ForeignKey("books.id", ondelete="CASCADE"), primary_key=True)
+    name = Column(String, primary_key=True)  # e.g. "optimized"
+    file_url = Column(String, nullable=False)
+    file_size = Column(Integer, nullable=False)
+    original_size = Column(Integer, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,14 @@
+"""Change counters used to answer conditional GET requests."""
+from sqlalchemy import Column, String, Integer, ForeignKey
+
+from ..database import Base
+
+
+class DataVersion(Base):
+    """Incremented on every write to the data a scope covers."""
+
+    __tablename__ = "data_versions"
+
+    user_id = Column(String, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    scope = Column(String, primary_key=True)  # "library" or "book:{book_id}"
+    version = Column(Integer, nullable=False, default=0)
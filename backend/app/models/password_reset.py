@@ -3,7 +3,7 @@ import uuid
 from datetime import datetime
 
 from sqlalchemy import Column, String, DateTime, ForeignKey
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import backref, relationship
 
 from ..database import Base
 
@@ -25,4 +25,7 @@ class PasswordResetToken(Base):
     used_at = Column(DateTime, nullable=True)
 
     # Relationship
-    user = relationship("User", backref="password_reset_tokens")
+    user = relationship(
+        "User",
+        backref=backref("password_reset_tokens", passive_deletes=True),
+    )
@@ -0,0 +1,14 @@
+"""Fingerprint of the schema the database was last created or upgraded with."""
+from datetime import datetime
+
+from sqlalchemy import Column, String, DateTime
+
+from ..database import Base
+
+
+class SchemaVersion(Base):
+    __tablename__ = "schema_versions"
+
+    name = Column(String, primary_key=True)  # "app"
+    fingerprint = Column(String, nullable=False)
+    applied_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -17,8 +17,8 @@ class User(Base):
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     # Relationships
-    books = relationship("Book", back_populates="user", cascade="all, delete-orphan")
-    reading_progress = relationship("ReadingProgress", back_populates="user", cascade="all, delete-orphan")
-    bookmarks = relationship("Bookmark", back_populates="user", cascade="all, delete-orphan")
-    highlights = relationship("Highlight", back_populates="user", cascade="all, delete-orphan")
-    refresh_tokens = relationship("RefreshToken", back_populates="user", cascade="all, delete-orphan")
+    books = relationship("Book", back_populates="user", cascade="all, delete-orphan", passive_deletes=True)
+    reading_progress = relationship("ReadingProgress", back_populates="user", cascade="all, delete-orphan", passive_deletes=True)
+    bookmarks = relationship("Bookmark", back_populates="user", cascade="all, delete-orphan", passive_deletes=True)
+    highlights = relationship("Highlight", back_populates="user", cascade="all, delete-orphan", passive_deletes=True)
+    refresh_tokens = relationship("RefreshToken", back_populates="user", cascade="all, delete-orphan", passive_deletes=True)
@@ -4,6 +4,7 @@ from .books import router as books_router
 from .progress import router as progress_router
 from .bookmarks import router as bookmarks_router
 from .highlights import router as highlights_router
+from .files import router as files_router
 
 __all__ = [
     "auth_router",
@@ -12,4 +13,5 @@ __all__ = [
     "progress_router",
     "bookmarks_router",
     "highlights_router",
+    "files_router",
 ]
@@ -5,7 +5,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from ..database import get_db
 from ..schemas.auth import UserCreate, UserLogin, Token, TokenRefresh, PasswordResetRequest, PasswordReset, ChangePassword
 from ..schemas.user import UserResponse
-from ..services.auth_service import AuthService
+from ..services.auth_service import AuthService, pwd_context
 from ..services.email_service import EmailService
 from ..utils.security import get_current_user
 from ..models.user import User
@@ -86,35 +86,16 @@ async def refresh_token(
     db: AsyncSession = Depends(get_db),
 ):
     """Refresh access token using refresh token."""
-    # Decode the refresh token to get user_id
-    # Since refresh tokens are UUIDs, we need to verify against stored tokens
-    from sqlalchemy import select
-    from ..models.refresh_token import RefreshToken
-    from datetime import datetime
-
-    # Get all valid refresh tokens
-    result = await db.execute(
-        select(RefreshToken).where(RefreshToken.expires_at > datetime.utcnow())
-    )
-    tokens = result.scalars().all()
-
-    # Find matching token
-    from passlib.context import CryptContext
-    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-    user_id = None
-    for rt in tokens:
-        if pwd_context.verify(token_data.refresh_token, rt.token_hash):
-            user_id = rt.user_id
-            break
-
-    if not user_id:
+    # Refresh tokens are random UUIDs stored hashed, so match against stored tokens
+    stored = await AuthService.find_refresh_token(db, token_data.refresh_token)
+    if not stored:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid or expired refresh token",
         )
 
     # Generate new tokens
+    user_id = stored.user_id
     access_token = AuthService.create_access_token(user_id)
     new_refresh_token, token_hash = AuthService.create_refresh_token()
 
@@ -137,9 +118,6 @@ async def logout(
     # Find and invalidate the refresh token
     from sqlalchemy import select
     from ..models.refresh_token import RefreshToken
-    from passlib.context import CryptContext
-
-    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
     result = await db.execute(select(RefreshToken))
     tokens = result.scalars().all()
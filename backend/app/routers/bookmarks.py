@@ -1,33 +1,55 @@
 from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Request, Response, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..database import get_db
 from ..models.user import User
+from ..models.bookmark import Bookmark
 from ..schemas.bookmark import BookmarkCreate, BookmarkResponse
 from ..services.book_service import BookService
+from ..services.version_service import VersionService, book_scope
+from ..services.cache_service import cache_service
 from ..utils.security import get_current_user
+from ..utils.serialization import dump_rows, response_columns
 
 router = APIRouter(tags=["Bookmarks"])
 
+_bookmark_columns = response_columns(Bookmark, BookmarkResponse)
+
 
 @router.get("/books/{book_id}/bookmarks", response_model=List[BookmarkResponse])
 async def get_bookmarks(
     book_id: str,
+    request: Request,
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
     """Get all bookmarks for a book."""
-    # Check if book exists
-    book = await BookService.get_book(db, book_id, current_user.id)
-    if not book:
+    # One query checks the book's owner and reads the version, so a 304 needs nothing else
+    version = await VersionService.get_book_version(db, current_user.id, book_id)
+    if version is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Book not found",
         )
 
-    bookmarks = await BookService.get_bookmarks(db, book_id, current_user.id)
-    return [BookmarkResponse.model_validate(b) for b in bookmarks]
+    scope = book_scope(book_id)
+    etag = VersionService.etag(version, scope, "bookmarks")
+    if VersionService.matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+    cache_key = cache_service.key(current_user.id, scope, "bookmarks", etag)
+    body = await cache_service.get(cache_key)
+    if body is None:
+        bookmarks = await BookService.get_bookmarks(db, book_id, current_user.id, columns=_bookmark_columns)
+        body = dump_rows(bookmarks, BookmarkResponse.model_fields)
+        await cache_service.set(current_user.id, cache_key, body)
+
+    return Response(
+        content=body,
+        media_type="application/json",
+        headers={"ETag": etag, "Cache-Control": "private, no-cache"},
+    )
 
 
 @router.post("/books/{book_id}/bookmarks", response_model=BookmarkResponse, status_code=status.HTTP_201_CREATED)
@@ -1,40 +1,142 @@
-from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
+from typing import List, Optional, Literal
+from fastapi import APIRouter, Request, Response, BackgroundTasks, Depends, HTTPException, Query, status, UploadFile, File, Form
 from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 import io
+import json
 
 from ..database import get_db
 from ..models.user import User
-from ..schemas.book import BookResponse
+from ..models.book import Book, BookType
+from ..schemas.book import BookResponse, BookVariantResponse, BookTocResponse, ContentSearchResponse
 from ..services.book_service import BookService
+from ..services.search_service import SearchService
+from ..services.epub_service import EpubService, EpubArchiveError
+from ..services.pdf_service import PdfService, PageRangeError, OPTIMIZED_VARIANT
+from ..services.pagination_service import PaginationService
+from ..services.version_service import VersionService, LIBRARY
+from ..services.cache_service import cache_service
+from ..services.storage_service import storage_service
+from ..config import settings
 from ..utils.security import get_current_user
+from ..utils.serialization import dump_rows, response_columns
 
 router = APIRouter(prefix="/books", tags=["Books"])
 
+_book_columns = response_columns(Book, BookResponse)
+
 
 @router.get("", response_model=List[BookResponse])
 async def get_books(
+    request: Request,
+    q: Optional[str] = Query(None, max_length=200, description="Match title or author"),
+    prefix: bool = Query(False, description="Match q as a prefix instead of a substring"),
+    file_type: Optional[BookType] = Query(None),
+    state: Optional[Literal["unread", "reading", "finished"]] = Query(None),
+    sort: Literal["created_at", "title", "author", "last_read"] = Query("created_at"),
+    order: Literal["asc", "desc"] = Query("desc"),
+    page: int = Query(1, ge=1),
+    per_page: Optional[int] = Query(None, ge=1, le=500),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
-    """Get all books for current user."""
-    books = await BookService.get_user_books(db, current_user.id)
-    return [BookResponse.model_validate(book) for book in books]
+    """
+    Get books for current user.
+
+    Without ``per_page`` the whole matching library is returned. Totals are
+    reported in the ``X-Total-Count`` header so the body stays a plain list.
+    A matching If-None-Match is answered with 304 before any book is loaded.
+    Only the response columns are selected and encoded without building
+    ORM objects or response models.
+    """
+    version = await VersionService.get(db, current_user.id, LIBRARY)
+    etag = library_etag(version, str(request.query_params))
+    if VersionService.matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+    total, body = await load_library(
+        db,
+        current_user.id,
+        etag,
+        q=q,
+        prefix=prefix,
+        file_type=file_type,
+        reading_state=state,
+        sort=sort,
+        order=order,
+        page=page,
+        per_page=per_page,
+    )
+
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache", "X-Total-Count": str(total)}
+    if per_page is not None:
+        headers["X-Page"] = str(page)
+        headers["X-Per-Page"] = str(per_page)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def library_etag(version: int, query_string: str) -> str:
+    """ETag of a library listing for a data version and query string."""
+    # Cover URLs are signed per window, so a new window must not get a 304
+    return VersionService.etag(version, LIBRARY, query_string, str(storage_service.url_window()))
+
+
+async def load_library(db: AsyncSession, user_id: str, etag: str, **filters) -> tuple[int, bytes]:
+    """
+    Get (total, JSON body) of a library listing, from the cache or the
+    database. ``filters`` are passed to ``BookService.search_user_books``.
+    """
+    # The ETag identifies version and query, so it doubles as the cache key
+    cache_key = cache_service.key(user_id, LIBRARY, etag)
+    cached = await cache_service.get(cache_key)
+    if cached is not None:
+        total, body = cached.split(b"\n", 1)
+        return int(total), body
+
+    books, total = await BookService.search_user_books(db, user_id, columns=_book_columns, **filters)
+    body = dump_rows(books, BookResponse.model_fields, {"cover_url": storage_service.get_signed_url})
+    await cache_service.set(user_id, cache_key, b"%d\n" % total + body)
+    return total, body
 
 
 @router.post("/upload", response_model=BookResponse, status_code=status.HTTP_201_CREATED)
 async def upload_book(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     title: Optional[str] = Form(None),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
     """Upload a new book."""
-    book = await BookService.create_book(db, current_user.id, file, title)
+    book = await BookService.create_book(db, current_user.id, file, title, background_tasks)
     return BookResponse.model_validate(book)
 
 
+@router.get("/search", response_model=ContentSearchResponse)
+async def search_book_content(
+    q: str = Query(..., min_length=1, max_length=200),
+    page: int = Query(1, ge=1),
+    per_page: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Search the text of all books in the library."""
+    items, total = await SearchService.search_content(
+        db,
+        current_user.id,
+        q,
+        page,
+        per_page,
+    )
+    return ContentSearchResponse(
+        items=items,
+        total=total,
+        page=page,
+        per_page=per_page,
+        pages=SearchService.page_count(total, per_page),
+    )
+
+
 @router.get("/{book_id}", response_model=BookResponse)
 async def get_book(
     book_id: str,
@@ -54,11 +156,12 @@ async def get_book(
 @router.delete("/{book_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_book(
     book_id: str,
+    background_tasks: BackgroundTasks,
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
     """Delete a book."""
-    success = await BookService.delete_book(db, book_id, current_user.id)
+    success = await BookService.delete_book(db, book_id, current_user.id, background_tasks)
     if not success:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -69,21 +172,28 @@ async def delete_book(
 
 @router.post("/refresh-metadata", response_model=List[BookResponse])
 async def refresh_all_metadata(
+    regenerate_toc: bool = Query(False, description="Also rebuild stored tables of contents"),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
     """Refresh metadata (page count, etc.) for all books."""
-    books = await BookService.refresh_all_metadata(db, current_user.id)
+    books = await BookService.refresh_all_metadata(db, current_user.id, regenerate_toc=regenerate_toc)
     return [BookResponse.model_validate(book) for book in books]
 
 
 @router.get("/{book_id}/download")
 async def download_book(
     book_id: str,
+    variant: Literal["original", "optimized"] = Query("original"),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
-    """Download book file."""
+    """
+    Download book file.
+
+    With ``variant=optimized`` the optimized PDF is served when one exists;
+    otherwise the original is returned. ``X-Book-Variant`` tells which.
+    """
     book = await BookService.get_book(db, book_id, current_user.id)
     if not book:
         raise HTTPException(
@@ -91,7 +201,18 @@ async def download_book(
             detail="Book not found",
         )
 
-    content = await BookService.get_book_content(db, book_id, current_user.id)
+    content = None
+    served_variant = "original"
+    if variant == OPTIMIZED_VARIANT:
+        variants = await BookService.get_variants(db, book_id, current_user.id)
+        optimized = next((v for v in variants if v.name == OPTIMIZED_VARIANT), None)
+        if optimized:
+            content = await storage_service.get_book(optimized.file_url)
+            if content is not None:
+                served_variant = OPTIMIZED_VARIANT
+
+    if content is None:
+        content = await storage_service.get_book(book.file_url)
     if not content:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -106,5 +227,187 @@ async def download_book(
         media_type=media_type,
         headers={
             "Content-Disposition": f'attachment; filename="{filename}"',
+            "X-Book-Variant": served_variant,
+        },
+    )
+
+
+@router.get("/{book_id}/variants", response_model=List[BookVariantResponse])
+async def get_book_variants(
+    book_id: str,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Get the stored variants of a book and the bytes each one saves."""
+    variants = await BookService.get_variants(db, book_id, current_user.id)
+    return [
+        BookVariantResponse(
+            name=v.name,
+            file_size=v.file_size,
+            original_size=v.original_size,
+            bytes_saved=v.original_size - v.file_size,
+            created_at=v.created_at,
+        )
+        for v in variants
+    ]
+
+
+@router.get("/{book_id}/toc", response_model=BookTocResponse)
+async def get_book_toc(
+    book_id: str,
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Get the table of contents of a book.
+
+    The ETag only changes when the table is regenerated, so clients can
+    keep it and revalidate with If-None-Match.
+    """
+    toc = await BookService.get_toc(db, book_id, current_user.id)
+    if toc is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Book not found",
+        )
+
+    headers = {"ETag": toc.etag, "Cache-Control": "private, no-cache"}
+    if VersionService.matches(request.headers.get("if-none-match"), toc.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    # Entries are stored as serialized JSON; embed them without re-encoding
+    return Response(
+        content=f'{{"book_id":{json.dumps(book_id)},"entries":{toc.entries}}}',
+        media_type="application/json",
+        headers=headers,
+    )
+
+
+@router.get("/{book_id}/pagination")
+async def get_book_pagination(
+    book_id: str,
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Get the binary pagination map of an EPUB.
+
+    See the API documentation for the layout; the total page count is also
+    sent in the X-Total-Pages header.
+    """
+    pagination = await PaginationService.get_pagination(db, book_id, current_user.id)
+    if pagination is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Book not found",
+        )
+
+    headers = {
+        "ETag": pagination.etag,
+        "Cache-Control": "private, no-cache",
+        "X-Total-Pages": str(pagination.total_pages),
+    }
+    if VersionService.matches(request.headers.get("if-none-match"), pagination.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    return Response(content=pagination.data, media_type="application/octet-stream", headers=headers)
+
+
+@router.get("/{book_id}/epub/{resource_path:path}")
+async def get_epub_resource(
+    book_id: str,
+    resource_path: str,
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Get a single resource (chapter, stylesheet, image) from an EPUB."""
+    book = await BookService.get_book(db, book_id, current_user.id)
+    if not book or book.file_type != BookType.EPUB:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Book not found",
+        )
+
+    cache_headers = {"Cache-Control": f"private, max-age={settings.EPUB_RESOURCE_MAX_AGE}"}
+    try:
+        etag = await EpubService.get_resource_etag(book.file_url, resource_path)
+        if etag is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Resource not found",
+            )
+        if VersionService.matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag, **cache_headers})
+
+        resource = await EpubService.get_resource(book.file_url, resource_path)
+    except FileNotFoundError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Book file not found",
+        )
+    except EpubArchiveError as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Unreadable EPUB: {e}",
+        )
+
+    return Response(
+        content=resource.content,
+        media_type=resource.media_type,
+        headers={"ETag": resource.etag, **cache_headers},
+    )
+
+
+@router.get("/{book_id}/pages")
+async def get_page_range(
+    book_id: str,
+    first: int = Query(..., alias="from", ge=1),
+    last: int = Query(..., alias="to", ge=1),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Get a standalone PDF with just the requested pages of a book."""
+    if last < first:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="'to' must not be smaller than 'from'",
+        )
+    if last - first + 1 > settings.PAGE_RANGE_MAX_PAGES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {settings.PAGE_RANGE_MAX_PAGES} pages can be requested at once",
+        )
+
+    book = await BookService.get_book(db, book_id, current_user.id)
+    if not book or book.file_type != BookType.PDF:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Book not found",
+        )
+
+    try:
+        content = await PdfService.get_page_range(book, first, last)
+    except PageRangeError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e),
+        )
+    if content is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Book file not found",
+        )
+
+    last = min(last, book.total_pages) if book.total_pages else last
+    return Response(
+        content=content,
+        media_type="application/pdf",
+        headers={
+            "Content-Disposition": f'inline; filename="{book.id}-{first}-{last}.pdf"',
+            "Cache-Control": "private, max-age=86400",
+            "X-Page-Range": f"{first}-{last}",
         },
     )
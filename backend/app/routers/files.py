@@ -0,0 +1,35 @@
+import time
+
+from fastapi import APIRouter, HTTPException, Query, status
+from fastapi.responses import FileResponse
+
+from ..services.storage_service import storage_service
+
+router = APIRouter(prefix="/files", tags=["Files"])
+
+
+@router.get("/{file_path:path}")
+async def get_file(
+    file_path: str,
+    expires: int = Query(...),
+    sig: str = Query(..., max_length=64),
+):
+    """
+    Serve a cover, avatar or derived asset from a signed URL.
+
+    The signature in the URL is the authorization, so no token is decoded
+    and the database is not touched. File names carry a content hash, so
+    responses are cacheable as immutable until the URL expires.
+    """
+    path = storage_service.resolve_signed_file(file_path, expires, sig)
+    if path is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="File not found or link expired",
+        )
+
+    max_age = max(expires - int(time.time()), 0)
+    return FileResponse(
+        path,
+        headers={"Cache-Control": f"private, max-age={max_age}, immutable"},
+    )
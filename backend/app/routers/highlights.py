@@ -1,33 +1,86 @@
 from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Request, Response, Depends, HTTPException, Query, status
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..database import get_db
 from ..models.user import User
-from ..schemas.highlight import HighlightCreate, HighlightResponse, HighlightUpdate
+from ..models.highlight import Highlight
+from ..schemas.highlight import (
+    HighlightCreate,
+    HighlightResponse,
+    HighlightUpdate,
+    HighlightSearchResponse,
+)
 from ..services.book_service import BookService
+from ..services.version_service import VersionService, book_scope
+from ..services.cache_service import cache_service
+from ..services.search_service import SearchService
 from ..utils.security import get_current_user
+from ..utils.serialization import dump_rows, response_columns
 
 router = APIRouter(tags=["Highlights"])
 
+_highlight_columns = response_columns(Highlight, HighlightResponse)
+
+
+@router.get("/highlights/search", response_model=HighlightSearchResponse)
+async def search_highlights(
+    q: str = Query(..., min_length=1, max_length=200),
+    page: int = Query(1, ge=1),
+    per_page: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Search highlights and notes across the whole library."""
+    items, total = await SearchService.search_highlights(
+        db,
+        current_user.id,
+        q,
+        page,
+        per_page,
+    )
+    return HighlightSearchResponse(
+        items=items,
+        total=total,
+        page=page,
+        per_page=per_page,
+        pages=SearchService.page_count(total, per_page),
+    )
+
 
 @router.get("/books/{book_id}/highlights", response_model=List[HighlightResponse])
 async def get_highlights(
     book_id: str,
+    request: Request,
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
     """Get all highlights for a book."""
-    # Check if book exists
-    book = await BookService.get_book(db, book_id, current_user.id)
-    if not book:
+    # One query checks the book's owner and reads the version, so a 304 needs nothing else
+    version = await VersionService.get_book_version(db, current_user.id, book_id)
+    if version is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Book not found",
         )
 
-    highlights = await BookService.get_highlights(db, book_id, current_user.id)
-    return [HighlightResponse.model_validate(h) for h in highlights]
+    scope = book_scope(book_id)
+    etag = VersionService.etag(version, scope, "highlights")
+    if VersionService.matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+    cache_key = cache_service.key(current_user.id, scope, "highlights", etag)
+    body = await cache_service.get(cache_key)
+    if body is None:
+        highlights = await BookService.get_highlights(db, book_id, current_user.id, columns=_highlight_columns)
+        body = dump_rows(highlights, HighlightResponse.model_fields)
+        await cache_service.set(current_user.id, cache_key, body)
+
+    return Response(
+        content=body,
+        media_type="application/json",
+        headers={"ETag": etag, "Cache-Control": "private, no-cache"},
+    )
 
 
 @router.post("/books/{book_id}/highlights", response_model=HighlightResponse, status_code=status.HTTP_201_CREATED)
@@ -1,9 +1,11 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, BackgroundTasks, Depends, status
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..database import get_db
 from ..models.user import User
 from ..schemas.user import UserResponse, UserUpdate
+from ..services.auth_service import AuthService
+from ..services.book_service import BookService
 from ..utils.security import get_current_user
 
 router = APIRouter(prefix="/users", tags=["Users"])
@@ -24,9 +26,17 @@ async def update_profile(
     current_user: User = Depends(get_current_user),
 ):
     """Update current user's profile."""
-    if user_data.name is not None:
-        current_user.name = user_data.name
+    user = await AuthService.update_profile(db, current_user, user_data.name)
+    return UserResponse.model_validate(user)
 
-    await db.commit()
-    await db.refresh(current_user)
-    return UserResponse.model_validate(current_user)
+
+@router.delete("/me", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_account(
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Delete current user's account and library."""
+    file_paths = await AuthService.delete_user(db, current_user)
+    background_tasks.add_task(BookService.delete_stored_files, file_paths, current_user.id)
+    return None
@@ -7,10 +7,25 @@ from .auth import (
     PasswordResetRequest,
 )
 from .user import UserResponse, UserUpdate
-from .book import BookCreate, BookResponse, BookUpdate
+from .book import (
+    BookCreate,
+    BookResponse,
+    BookUpdate,
+    BookVariantResponse,
+    TocEntry,
+    BookTocResponse,
+    ContentSearchResult,
+    ContentSearchResponse,
+)
 from .progress import ProgressResponse, ProgressUpdate
 from .bookmark import BookmarkCreate, BookmarkResponse
-from .highlight import HighlightCreate, HighlightResponse, HighlightUpdate
+from .highlight import (
+    HighlightCreate,
+    HighlightResponse,
+    HighlightUpdate,
+    HighlightSearchResult,
+    HighlightSearchResponse,
+)
 
 __all__ = [
     "UserCreate",
@@ -24,6 +39,11 @@ __all__ = [
     "BookCreate",
     "BookResponse",
     "BookUpdate",
+    "BookVariantResponse",
+    "TocEntry",
+    "BookTocResponse",
+    "ContentSearchResult",
+    "ContentSearchResponse",
     "ProgressResponse",
     "ProgressUpdate",
     "BookmarkCreate",
@@ -31,4 +51,6 @@ __all__ = [
     "HighlightCreate",
     "HighlightResponse",
     "HighlightUpdate",
+    "HighlightSearchResult",
+    "HighlightSearchResponse",
 ]
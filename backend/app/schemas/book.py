@@ -1,7 +1,8 @@
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, field_serializer
+from typing import Optional, List
 from datetime import datetime
 from ..models.book import BookType
+from ..services.storage_service import storage_service
 
 
 class BookCreate(BaseModel):
@@ -24,7 +25,51 @@ class BookResponse(BaseModel):
     class Config:
         from_attributes = True
 
+    @field_serializer("cover_url")
+    def serialize_cover_url(self, cover_url: Optional[str]) -> Optional[str]:
+        # Stored as a storage path; clients get a signed URL they can load directly
+        return storage_service.get_signed_url(cover_url) if cover_url else None
+
 
 class BookUpdate(BaseModel):
     title: Optional[str] = None
     author: Optional[str] = None
+
+
+class BookVariantResponse(BaseModel):
+    name: str
+    file_size: int
+    original_size: int
+    bytes_saved: int
+    created_at: datetime
+
+
+class TocEntry(BaseModel):
+    title: str
+    level: int  # Nesting depth, 0 for top-level entries
+    href: Optional[str] = None  # EPUB resource path, with fragment
+    page: Optional[int] = None  # PDF page (1-based)
+
+
+class BookTocResponse(BaseModel):
+    book_id: str
+    entries: List[TocEntry]
+
+
+class ContentSearchResult(BaseModel):
+    book_id: str
+    title: str
+    location: int
+    page_number: Optional[int] = None  # PDF page (1-based)
+    href: Optional[str] = None  # EPUB spine item
+    cfi: Optional[str] = None  # EPUB location
+    snippet: Optional[str] = None
+    rank: float = 0.0
+
+
+class ContentSearchResponse(BaseModel):
+    items: List[ContentSearchResult]
+    total: int
+    page: int
+    per_page: int
+    pages: int
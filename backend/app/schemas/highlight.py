@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import Optional, List
 from datetime import datetime
 
 
@@ -29,3 +29,17 @@ class HighlightResponse(BaseModel):
 class HighlightUpdate(BaseModel):
     color: Optional[str] = None
     note: Optional[str] = None
+
+
+class HighlightSearchResult(HighlightResponse):
+    text_snippet: Optional[str] = None
+    note_snippet: Optional[str] = None
+    rank: float = 0.0
+
+
+class HighlightSearchResponse(BaseModel):
+    items: List[HighlightSearchResult]
+    total: int
+    page: int
+    per_page: int
+    pages: int
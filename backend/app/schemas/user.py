@@ -1,6 +1,7 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, field_serializer
 from typing import Optional
 from datetime import datetime
+from ..services.storage_service import storage_service
 
 
 class UserResponse(BaseModel):
@@ -14,6 +15,11 @@ class UserResponse(BaseModel):
     class Config:
         from_attributes = True
 
+    @field_serializer("avatar_url")
+    def serialize_avatar_url(self, avatar_url: Optional[str]) -> Optional[str]:
+        # Stored as a storage path; clients get a signed URL they can load directly
+        return storage_service.get_signed_url(avatar_url) if avatar_url else None
+
 
 class UserUpdate(BaseModel):
     name: Optional[str] = None
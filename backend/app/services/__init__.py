@@ -2,5 +2,24 @@ from .auth_service import AuthService
 from .book_service import BookService
 from .storage_service import StorageService
 from .email_service import EmailService
+from .search_service import SearchService
+from .content_index_service import ContentIndexService
+from .epub_service import EpubService
+from .pdf_service import PdfService
+from .pagination_service import PaginationService
+from .version_service import VersionService
+from .cache_service import CacheService
 
-__all__ = ["AuthService", "BookService", "StorageService", "EmailService"]
+__all__ = [
+    "AuthService",
+    "BookService",
+    "StorageService",
+    "EmailService",
+    "SearchService",
+    "ContentIndexService",
+    "EpubService",
+    "PdfService",
+    "PaginationService",
+    "VersionService",
+    "CacheService",
+]
@@ -1,20 +1,38 @@
 import uuid
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, List
 import jwt
 from jwt.exceptions import InvalidTokenError
 from passlib.context import CryptContext
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, delete
 from fastapi import HTTPException, status
 
 from ..config import settings
 from ..models.user import User
+from ..models.book import Book
 from ..models.refresh_token import RefreshToken
 from ..models.password_reset import PasswordResetToken
+from ..utils.metrics import BCRYPT_SECONDS
+from .cache_service import cache_service
 
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+class _TimedCryptContext:
+    """CryptContext wrapper that records how long bcrypt takes."""
+
+    def __init__(self, context: CryptContext):
+        self._context = context
+
+    def hash(self, secret: str) -> str:
+        with BCRYPT_SECONDS.time(("hash",)):
+            return self._context.hash(secret)
+
+    def verify(self, secret: str, hashed: str) -> bool:
+        with BCRYPT_SECONDS.time(("verify",)):
+            return self._context.verify(secret, hashed)
+
+
+pwd_context = _TimedCryptContext(CryptContext(schemes=["bcrypt"], deprecated="auto"))
 
 
 class AuthService:
@@ -64,6 +82,15 @@ class AuthService:
         result = await db.execute(select(User).where(User.id == user_id))
         return result.scalar_one_or_none()
 
+    @staticmethod
+    async def update_profile(db: AsyncSession, user: User, name: Optional[str]) -> User:
+        """Update a user's profile fields."""
+        if name is not None:
+            user.name = name
+        await db.commit()
+        await db.refresh(user)
+        return user
+
     @staticmethod
     async def create_user(
         db: AsyncSession,
@@ -90,6 +117,30 @@ class AuthService:
         await db.refresh(user)
         return user
 
+    @staticmethod
+    async def delete_user(db: AsyncSession, user: User) -> List[str]:
+        """
+        Delete a user and their whole library.
+
+        Books, progress, bookmarks, highlights and tokens are removed by the
+        database (ON DELETE CASCADE), so the number of statements does not
+        grow with the size of the library.
+
+        Returns:
+            Storage paths of the user's files, for the caller to clean up
+        """
+        result = await db.execute(
+            select(Book.file_url, Book.cover_url).where(Book.user_id == user.id)
+        )
+        file_paths = [path for row in result.all() for path in row if path]
+        if user.avatar_url:
+            file_paths.append(user.avatar_url)
+
+        await db.execute(delete(User).where(User.id == user.id))
+        await db.commit()
+        await cache_service.invalidate(user.id)
+        return file_paths
+
     @staticmethod
     async def authenticate_user(
         db: AsyncSession,
@@ -119,6 +170,17 @@ class AuthService:
         await db.commit()
         return refresh_token
 
+    @staticmethod
+    async def find_refresh_token(db: AsyncSession, token: str) -> Optional[RefreshToken]:
+        """Find the unexpired stored refresh token matching a plain token."""
+        result = await db.execute(
+            select(RefreshToken).where(RefreshToken.expires_at > datetime.utcnow())
+        )
+        for rt in result.scalars().all():
+            if pwd_context.verify(token, rt.token_hash):
+                return rt
+        return None
+
     @staticmethod
     async def verify_refresh_token(
         db: AsyncSession,
@@ -1,15 +1,36 @@
+import asyncio
+import hashlib
 import io
-from typing import Optional, List
+import json
+import logging
+from typing import Optional, List, Sequence, Union, BinaryIO
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from fastapi import UploadFile, HTTPException, status
+from sqlalchemy import select, delete, func, or_
+from fastapi import BackgroundTasks, UploadFile, HTTPException, status
 
 from ..config import settings
+from ..database import AsyncSessionLocal
 from ..models.book import Book, BookType
 from ..models.progress import ReadingProgress
 from ..models.bookmark import Bookmark
 from ..models.highlight import Highlight
+from ..models.book_variant import BookVariant
+from ..models.book_toc import BookToc
+from ..models.book_pagination import BookPagination
+from ..utils.metrics import METADATA_SECONDS
 from .storage_service import storage_service
+from .content_index_service import ContentIndexService
+from .search_service import SearchService
+from .epub_service import EpubService
+from .pdf_service import PdfService
+from .pagination_service import PaginationService
+from .version_service import VersionService, LIBRARY, book_scope
+
+# Progress (0-1) at which a book counts as finished, matching the app
+FINISHED_PROGRESS = 0.95
+
+
+logger = logging.getLogger(__name__)
 
 
 class BookService:
@@ -37,10 +58,10 @@ class BookService:
 
     @staticmethod
     async def extract_metadata(
-        file_content: bytes,
+        file_content: Union[bytes, BinaryIO],
         file_type: BookType,
     ) -> dict:
-        """Extract metadata from book file."""
+        """Extract metadata from book file contents or a seekable binary stream."""
         metadata = {
             "title": None,
             "author": None,
@@ -49,46 +70,65 @@ class BookService:
         }
 
         try:
-            if file_type == BookType.PDF:
-                from pypdf import PdfReader
-                pdf = PdfReader(io.BytesIO(file_content))
-                info = pdf.metadata
-                if info:
-                    metadata["title"] = info.get("/Title")
-                    metadata["author"] = info.get("/Author")
-                metadata["total_pages"] = len(pdf.pages)
-
-            elif file_type == BookType.EPUB:
-                from ebooklib import epub, ITEM_DOCUMENT
-                book = epub.read_epub(io.BytesIO(file_content))
-                title = book.get_metadata("DC", "title")
-                if title:
-                    metadata["title"] = title[0][0]
-                creator = book.get_metadata("DC", "creator")
-                if creator:
-                    metadata["author"] = creator[0][0]
-
-                # Count chapters (spine items) as pages
-                spine_items = [item for item in book.get_items() if item.get_type() == ITEM_DOCUMENT]
-                metadata["total_pages"] = len(spine_items) if spine_items else len(list(book.get_items_of_type(ITEM_DOCUMENT)))
-
-                # Get cover image
-                for item in book.get_items():
-                    if item.get_type() == 3:  # Image type
-                        if "cover" in item.get_name().lower():
-                            metadata["cover"] = item.get_content()
-                            break
+            stream = io.BytesIO(file_content) if isinstance(file_content, bytes) else file_content
+
+            with METADATA_SECONDS.time((file_type.value,)):
+                if file_type == BookType.PDF:
+                    metadata.update(PdfService.read_metadata(stream))
+
+                elif file_type == BookType.EPUB:
+                    try:
+                        metadata.update(EpubService.read_metadata(stream))
+                    except Exception:
+                        # Malformed package: let ebooklib try its more forgiving parse
+                        stream.seek(0)
+                        metadata.update(BookService.extract_epub_metadata_ebooklib(stream.read()))
         except Exception:
             pass  # Silently fail metadata extraction
 
         return metadata
 
+    @staticmethod
+    async def extract_stored_metadata(file_url: str, file_type: BookType) -> Optional[dict]:
+        """Extract metadata from a stored book without loading it into memory."""
+        async with storage_service.open_stream(file_url) as stream:
+            if stream is None:
+                return None
+            return await BookService.extract_metadata(stream, file_type)
+
+    @staticmethod
+    def extract_epub_metadata_ebooklib(file_content: bytes) -> dict:
+        """Extract EPUB metadata by loading the whole book with ebooklib."""
+        from ebooklib import epub, ITEM_DOCUMENT, ITEM_COVER, ITEM_IMAGE
+        metadata = {}
+        book = epub.read_epub(io.BytesIO(file_content))
+        title = book.get_metadata("DC", "title")
+        if title:
+            metadata["title"] = title[0][0]
+        creator = book.get_metadata("DC", "creator")
+        if creator:
+            metadata["author"] = creator[0][0]
+
+        # Count XHTML documents as pages
+        documents = list(book.get_items_of_type(ITEM_DOCUMENT))
+        metadata["total_pages"] = len(documents) or None
+
+        # Get cover image
+        for item in book.get_items():
+            if item.get_type() == ITEM_COVER or (
+                item.get_type() == ITEM_IMAGE and "cover" in item.get_name().lower()
+            ):
+                metadata["cover"] = item.get_content()
+                break
+        return metadata
+
     @staticmethod
     async def create_book(
         db: AsyncSession,
         user_id: str,
         file: UploadFile,
         title: Optional[str] = None,
+        background_tasks: Optional[BackgroundTasks] = None,
     ) -> Book:
         """Upload and create a new book."""
         # Validate file
@@ -140,8 +180,20 @@ class BookService:
         )
 
         db.add(book)
+        await VersionService.bump(db, user_id, LIBRARY)
         await db.commit()
         await db.refresh(book)
+
+        # Index the book's text after the response has been sent
+        if background_tasks is not None and settings.CONTENT_INDEX_ENABLED:
+            background_tasks.add_task(ContentIndexService.index_book, book.id)
+        if background_tasks is not None and settings.PDF_OPTIMIZE_ENABLED and file_type == BookType.PDF:
+            background_tasks.add_task(PdfService.create_optimized_variant, book.id)
+        if background_tasks is not None:
+            background_tasks.add_task(BookService.build_toc, book.id)
+        if background_tasks is not None and file_type == BookType.EPUB:
+            background_tasks.add_task(PaginationService.build_for_book, book.id)
+
         return book
 
     @staticmethod
@@ -153,26 +205,116 @@ class BookService:
         return list(result.scalars().all())
 
     @staticmethod
-    async def refresh_all_metadata(db: AsyncSession, user_id: str) -> List[Book]:
-        """Refresh metadata (page count, etc.) for all books of a user."""
+    async def search_user_books(
+        db: AsyncSession,
+        user_id: str,
+        q: Optional[str] = None,
+        prefix: bool = False,
+        file_type: Optional[BookType] = None,
+        reading_state: Optional[str] = None,
+        sort: str = "created_at",
+        order: str = "desc",
+        page: int = 1,
+        per_page: Optional[int] = None,
+        columns: Optional[Sequence] = None,
+    ) -> tuple[list, int]:
+        """
+        Search, filter and sort a user's library.
+
+        Args:
+            q: Text matched against title and author
+            prefix: Match ``q`` as a prefix instead of a substring
+            file_type: Only return books of this type
+            reading_state: "unread", "reading" or "finished"
+            sort: "created_at", "title", "author" or "last_read"
+            order: "asc" or "desc"
+            page: 1-based page number, used with ``per_page``
+            per_page: Page size; None returns every match
+            columns: Select only these columns and return row tuples
+                instead of Book instances
+
+        Returns:
+            Tuple of (books, total number of matches)
+        """
+        conditions = [Book.user_id == user_id]
+        if q and q.strip():
+            conditions.append(
+                SearchService.book_match_condition(db.bind.dialect.name, q, prefix)
+            )
+        if file_type is not None:
+            conditions.append(Book.file_type == file_type)
+
+        progress_join = (ReadingProgress.book_id == Book.id) & (ReadingProgress.user_id == user_id)
+        needs_progress = reading_state is not None or sort == "last_read"
+        if reading_state == "unread":
+            conditions.append(or_(ReadingProgress.id.is_(None), ReadingProgress.progress_percent <= 0))
+        elif reading_state == "reading":
+            conditions.append(ReadingProgress.progress_percent > 0)
+            conditions.append(ReadingProgress.progress_percent < FINISHED_PROGRESS)
+        elif reading_state == "finished":
+            conditions.append(ReadingProgress.progress_percent >= FINISHED_PROGRESS)
+
+        query = select(*columns) if columns else select(Book)
+        if needs_progress:
+            query = query.outerjoin(ReadingProgress, progress_join)
+        query = query.where(*conditions)
+
+        sort_column = {
+            "title": func.lower(Book.title),
+            "author": func.lower(Book.author),
+            "last_read": ReadingProgress.last_read_at,
+            "created_at": Book.created_at,
+        }[sort]
+        sort_column = sort_column.asc() if order == "asc" else sort_column.desc()
+        # Books without an author or never opened go last in either direction
+        query = query.order_by(sort_column.nulls_last(), Book.created_at.desc(), Book.id)
+
+        if per_page is None:
+            result = await db.execute(query)
+            books = list(result.all() if columns else result.scalars().all())
+            return books, len(books)
+
+        count_query = select(func.count()).select_from(Book)
+        if needs_progress:
+            count_query = count_query.outerjoin(ReadingProgress, progress_join)
+        total = (await db.execute(count_query.where(*conditions))).scalar_one()
+
+        result = await db.execute(query.limit(per_page).offset((page - 1) * per_page))
+        return list(result.all() if columns else result.scalars().all()), total
+
+    @staticmethod
+    async def refresh_all_metadata(
+        db: AsyncSession,
+        user_id: str,
+        regenerate_toc: bool = False,
+    ) -> List[Book]:
+        """Refresh metadata (page count, etc.) for all books of a user.
+
+        With ``regenerate_toc`` the stored tables of contents are rebuilt too.
+        """
         books = await BookService.get_user_books(db, user_id)
 
         for book in books:
             try:
-                # Get the book content
-                content = await storage_service.get_book(book.file_url)
-                if content:
-                    # Re-extract metadata
-                    metadata = await BookService.extract_metadata(content, book.file_type)
-
+                # Re-extract metadata from the stored file
+                metadata = await BookService.extract_stored_metadata(book.file_url, book.file_type)
+                if metadata:
                     # Update book with new metadata
                     if metadata.get("total_pages"):
                         book.total_pages = metadata["total_pages"]
                     if metadata.get("author") and not book.author:
                         book.author = metadata["author"]
+                if book.file_type == BookType.EPUB:
+                    # Keep the page count of the pagination map over the document count
+                    pagination = await db.get(BookPagination, book.id)
+                    if pagination is not None:
+                        book.total_pages = pagination.total_pages
+                if regenerate_toc:
+                    await BookService.generate_toc(db, book)
             except Exception:
                 pass  # Skip books that fail to process
 
+        await VersionService.bump(db, user_id, LIBRARY)
         await db.commit()
 
         # Refresh all books to get updated data
@@ -190,22 +332,51 @@ class BookService:
         return result.scalar_one_or_none()
 
     @staticmethod
-    async def delete_book(db: AsyncSession, book_id: str, user_id: str) -> bool:
-        """Delete a book and its files."""
-        book = await BookService.get_book(db, book_id, user_id)
-        if not book:
-            return False
+    async def delete_book(
+        db: AsyncSession,
+        book_id: str,
+        user_id: str,
+        background_tasks: Optional[BackgroundTasks] = None,
+    ) -> bool:
+        """Delete a book and its files.
 
-        # Delete files from storage
-        await storage_service.delete_book(book.file_url)
-        if book.cover_url:
-            await storage_service.delete_cover(book.cover_url)
+        Progress, bookmarks and highlights are removed by the database
+        (ON DELETE CASCADE) instead of being loaded into the session.
+        """
+        result = await db.execute(
+            select(Book.file_url, Book.cover_url).where(
+                Book.id == book_id,
+                Book.user_id == user_id,
+            )
+        )
+        row = result.first()
+        if not row:
+            return False
 
         # Delete from database
-        await db.delete(book)
+        await db.execute(
+            delete(Book).where(Book.id == book_id, Book.user_id == user_id)
+        )
+        await VersionService.forget(db, user_id, book_scope(book_id))
+        await VersionService.bump(db, user_id, LIBRARY)
         await db.commit()
+
+        # Delete files from storage
+        EpubService.forget(row.file_url)
+        file_paths = [path for path in row if path]
+        derived_prefix = f"{user_id}/{book_id}"
+        if background_tasks is not None:
+            background_tasks.add_task(BookService.delete_stored_files, file_paths, derived_prefix)
+        else:
+            await BookService.delete_stored_files(file_paths, derived_prefix)
         return True
 
+    @staticmethod
+    async def delete_stored_files(file_paths: List[str], derived_prefix: str) -> None:
+        """Remove stored files together with everything derived from them."""
+        await storage_service.delete_files(file_paths)
+        await storage_service.delete_derived(derived_prefix)
+
     @staticmethod
     async def get_book_content(db: AsyncSession, book_id: str, user_id: str) -> Optional[bytes]:
         """Get book file content."""
@@ -214,6 +385,85 @@ class BookService:
             return None
         return await storage_service.get_book(book.file_url)
 
+    @staticmethod
+    async def get_variants(db: AsyncSession, book_id: str, user_id: str) -> List[BookVariant]:
+        """Get the stored variants (e.g. optimized PDF) of a book."""
+        result = await db.execute(
+            select(BookVariant)
+            .join(Book, Book.id == BookVariant.book_id)
+            .where(BookVariant.book_id == book_id, Book.user_id == user_id)
+            .order_by(BookVariant.name)
+        )
+        return list(result.scalars().all())
+
+    # Table of Contents
+    @staticmethod
+    def read_toc(stream: BinaryIO, file_type: BookType) -> List[dict]:
+        """Read the table of contents (EPUB navigation or PDF outline) of a book."""
+        if file_type == BookType.PDF:
+            return PdfService.read_toc(stream)
+        return EpubService.read_toc(stream)
+
+    @staticmethod
+    async def generate_toc(db: AsyncSession, book: Book) -> Optional[BookToc]:
+        """
+        Extract a book's table of contents and store it in the session.
+
+        A book without a readable outline gets an empty table so it is not
+        parsed again on every request. The caller commits.
+
+        Returns:
+            The stored table, or None if the book file is missing
+        """
+        async with storage_service.open_stream(book.file_url) as stream:
+            if stream is None:
+                return None
+            try:
+                entries = await asyncio.to_thread(BookService.read_toc, stream, book.file_type)
+            except Exception as e:
+                logger.warning(f"Could not read table of contents of book {book.id}: {e}")
+                entries = []
+
+        data = json.dumps(entries, ensure_ascii=False, separators=(",", ":"))
+        toc = await db.get(BookToc, book.id)
+        if toc is None:
+            toc = BookToc(book_id=book.id)
+            db.add(toc)
+        toc.entries = data
+        toc.etag = f'"{hashlib.sha1(data.encode()).hexdigest()[:20]}"'
+        return toc
+
+    @staticmethod
+    async def build_toc(book_id: str) -> None:
+        """Generate a book's table of contents in its own session (background task)."""
+        async with AsyncSessionLocal() as db:
+            book = (await db.execute(select(Book).where(Book.id == book_id))).scalar_one_or_none()
+            if book and await BookService.generate_toc(db, book) is not None:
+                await db.commit()
+
+    @staticmethod
+    async def get_toc(db: AsyncSession, book_id: str, user_id: str) -> Optional[BookToc]:
+        """
+        Get the stored table of contents of a book.
+
+        Books uploaded before tables of contents were extracted at ingest
+        get theirs generated on first request.
+        """
+        result = await db.execute(
+            select(Book, BookToc)
+            .outerjoin(BookToc, BookToc.book_id == Book.id)
+            .where(Book.id == book_id, Book.user_id == user_id)
+        )
+        row = result.first()
+        if row is None:
+            return None
+        book, toc = row
+        if toc is None:
+            toc = await BookService.generate_toc(db, book)
+            if toc is not None:
+                await db.commit()
+        return toc
+
     # Reading Progress
     @staticmethod
     async def get_progress(
@@ -239,7 +489,16 @@ class BookService:
         current_cfi: Optional[str],
         progress_percent: float,
     ) -> ReadingProgress:
-        """Update or create reading progress."""
+        """Update or create reading progress.
+
+        For EPUBs with a pagination map, ``progress_percent`` is derived from
+        ``current_cfi`` instead of trusting the client's value.
+        """
+        if current_cfi:
+            computed = await PaginationService.progress_for_cfi(db, book_id, current_cfi, progress_percent)
+            if computed is not None:
+                progress_percent = computed
+
         progress = await BookService.get_progress(db, book_id, user_id)
 
         if progress:
@@ -256,6 +515,8 @@ class BookService:
             )
             db.add(progress)
 
+        # Progress moves books between states and changes the last_read order
+        await VersionService.bump(db, user_id, LIBRARY)
         await db.commit()
         await db.refresh(progress)
         return progress
@@ -266,15 +527,22 @@ class BookService:
         db: AsyncSession,
         book_id: str,
         user_id: str,
-    ) -> List[Bookmark]:
-        """Get all bookmarks for a book."""
+        columns: Optional[Sequence] = None,
+    ) -> list:
+        """
+        Get all bookmarks for a book.
+
+        With ``columns`` only those columns are selected and row tuples
+        are returned instead of Bookmark instances.
+        """
+        query = select(*columns) if columns else select(Bookmark)
         result = await db.execute(
-            select(Bookmark).where(
+            query.where(
                 Bookmark.book_id == book_id,
                 Bookmark.user_id == user_id,
             ).order_by(Bookmark.created_at.desc())
         )
-        return list(result.scalars().all())
+        return list(result.all() if columns else result.scalars().all())
 
     @staticmethod
     async def create_bookmark(
@@ -294,6 +562,7 @@ class BookService:
             title=title,
         )
         db.add(bookmark)
+        await VersionService.bump(db, user_id, book_scope(book_id))
         await db.commit()
         await db.refresh(bookmark)
         return bookmark
@@ -316,6 +585,7 @@ class BookService:
             return False
 
         await db.delete(bookmark)
+        await VersionService.bump(db, user_id, book_scope(bookmark.book_id))
         await db.commit()
         return True
 
@@ -325,15 +595,22 @@ class BookService:
         db: AsyncSession,
         book_id: str,
         user_id: str,
-    ) -> List[Highlight]:
-        """Get all highlights for a book."""
+        columns: Optional[Sequence] = None,
+    ) -> list:
+        """
+        Get all highlights for a book.
+
+        With ``columns`` only those columns are selected and row tuples
+        are returned instead of Highlight instances.
+        """
+        query = select(*columns) if columns else select(Highlight)
         result = await db.execute(
-            select(Highlight).where(
+            query.where(
                 Highlight.book_id == book_id,
                 Highlight.user_id == user_id,
             ).order_by(Highlight.created_at.desc())
         )
-        return list(result.scalars().all())
+        return list(result.all() if columns else result.scalars().all())
 
     @staticmethod
     async def create_highlight(
@@ -357,6 +634,7 @@ class BookService:
             note=note,
         )
         db.add(highlight)
+        await VersionService.bump(db, user_id, book_scope(book_id))
         await db.commit()
         await db.refresh(highlight)
         return highlight
@@ -385,6 +663,7 @@ class BookService:
         if note is not None:
             highlight.note = note
 
+        await VersionService.bump(db, user_id, book_scope(highlight.book_id))
         await db.commit()
         await db.refresh(highlight)
         return highlight
@@ -407,5 +686,6 @@ class BookService:
             return False
 
         await db.delete(highlight)
+        await VersionService.bump(db, user_id, book_scope(highlight.book_id))
         await db.commit()
         return True
@@ -0,0 +1,209 @@
+"""Per-user cache for serialized responses and query results."""
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Set, List, Tuple
+
+from ..config import settings
+
+
+class MemoryCacheBackend:
+    """In-process LRU cache bounded by the total size of keys and values."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, Tuple[bytes, float]]" = OrderedDict()
+        self._user_keys: Dict[str, Set[str]] = {}
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at < time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, user_id: str, key: str, value: bytes, ttl: int) -> None:
+        if key in self._entries:
+            self._remove(key)
+        entry_size = len(key) + len(value)
+        if entry_size > self.max_bytes // 8:
+            return  # Do not let one large value flush the cache
+        self._entries[key] = (value, time.monotonic() + ttl)
+        self._user_keys.setdefault(user_id, set()).add(key)
+        self.size += entry_size
+        while self.size > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    async def delete_prefix(self, user_id: str, prefix: str) -> int:
+        keys = [key for key in self._user_keys.get(user_id, ()) if key.startswith(prefix)]
+        for key in keys:
+            self._remove(key)
+        return len(keys)
+
+    def _remove(self, key: str) -> None:
+        value, _ = self._entries.pop(key)
+        self.size -= len(key) + len(value)
+        user_id = key.split(":", 1)[0]
+        keys = self._user_keys.get(user_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._user_keys[user_id]
+
+    @property
+    def entries(self) -> int:
+        return len(self._entries)
+
+
+class LocalRedis:
+    """
+    In-process stand-in for the subset of the redis.asyncio client used by
+    RedisCacheBackend, so the shared backend can run without a server.
+    Select it with ``CACHE_REDIS_URL=local://``.
+    """
+
+    def __init__(self):
+        self._values: Dict[str, Tuple[bytes, float]] = {}
+        self._sets: Dict[str, Set[str]] = {}
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self._values.get(key)
+        if entry is None or entry[1] < time.monotonic():
+            self._values.pop(key, None)
+            return None
+        return entry[0]
+
+    async def set(self, key: str, value: bytes, ex: int) -> None:
+        self._values[key] = (value, time.monotonic() + ex)
+
+    async def delete(self, *keys: str) -> int:
+        removed = 0
+        for key in keys:
+            if self._values.pop(key, None) is not None or self._sets.pop(key, None) is not None:
+                removed += 1
+        return removed
+
+    async def sadd(self, key: str, *members: str) -> None:
+        self._sets.setdefault(key, set()).update(members)
+
+    async def srem(self, key: str, *members: str) -> None:
+        self._sets.get(key, set()).difference_update(members)
+
+    async def smembers(self, key: str) -> Set[bytes]:
+        return {member.encode() for member in self._sets.get(key, ())}
+
+    async def expire(self, key: str, seconds: int) -> None:
+        pass  # Sets of the stand-in live as long as the process
+
+
+class RedisCacheBackend:
+    """
+    Cache shared by all workers, in Redis or a Redis-compatible server.
+
+    Keys of each user are tracked in a set so a user's entries can be
+    invalidated without scanning the keyspace; memory is bounded by the
+    server's own ``maxmemory`` policy.
+    """
+
+    # Size and evictions are tracked by the server (INFO memory / evicted_keys)
+    evictions = 0
+    entries = 0
+    size = 0
+
+    def __init__(self, url: str):
+        if url.startswith("local://"):
+            self.client = LocalRedis()
+        else:
+            import redis.asyncio as redis
+            self.client = redis.from_url(url)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self.client.get(key)
+
+    async def set(self, user_id: str, key: str, value: bytes, ttl: int) -> None:
+        await self.client.set(key, value, ex=ttl)
+        index = f"{user_id}:keys"
+        await self.client.sadd(index, key)
+        await self.client.expire(index, ttl)
+
+    async def delete_prefix(self, user_id: str, prefix: str) -> int:
+        index = f"{user_id}:keys"
+        keys: List[str] = [
+            key for key in (member.decode() for member in await self.client.smembers(index))
+            if key.startswith(prefix)
+        ]
+        if keys:
+            await self.client.delete(*keys)
+            await self.client.srem(index, *keys)
+        return len(keys)
+
+
+class CacheService:
+    """
+    Per-user cache. Every key starts with the user id, so a user's entries
+    (or just one scope of them) can be dropped when their data changes.
+    """
+
+    def __init__(self, backend: Optional[str] = None):
+        self.backend_name = backend or settings.CACHE_BACKEND
+        if self.backend_name == "redis":
+            self.backend = RedisCacheBackend(settings.CACHE_REDIS_URL or "redis://localhost:6379/0")
+        elif self.backend_name == "memory":
+            self.backend = MemoryCacheBackend(settings.CACHE_MAX_MEMORY_MB * 1024 * 1024)
+        else:
+            self.backend = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    @staticmethod
+    def key(user_id: str, scope: str, *parts: str) -> str:
+        return ":".join((user_id, scope, *parts))
+
+    async def get(self, key: str) -> Optional[bytes]:
+        if self.backend is None:
+            return None
+        value = await self.backend.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, user_id: str, key: str, value: bytes, ttl: Optional[int] = None) -> None:
+        if self.backend is not None:
+            await self.backend.set(user_id, key, value, ttl or settings.CACHE_TTL_SECONDS)
+
+    async def invalidate(self, user_id: str, scope: Optional[str] = None) -> None:
+        """Drop a user's cached entries, either all of them or one scope."""
+        if self.backend is None:
+            return
+        prefix = self.key(user_id, scope, "") if scope else f"{user_id}:"
+        self.invalidations += await self.backend.delete_prefix(user_id, prefix)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": self.backend_name,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": getattr(self.backend, "evictions", 0),
+            "invalidations": self.invalidations,
+            "entries": getattr(self.backend, "entries", 0),
+            "bytes": getattr(self.backend, "size", 0),
+        }
+
+
+# Singleton instance
+cache_service = CacheService()
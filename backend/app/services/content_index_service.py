@@ -0,0 +1,202 @@
+"""Extraction of book text into the full-text content index."""
+import asyncio
+import io
+import logging
+from html.parser import HTMLParser
+from typing import Optional, List, Any
+
+from sqlalchemy import select, delete
+
+from ..config import settings
+from ..database import AsyncSessionLocal
+from ..models.book import Book, BookType
+from ..models.book_content import BookContent, BookContentIndex
+from .storage_service import storage_service
+
+logger = logging.getLogger(__name__)
+
+
+class _HTMLTextExtractor(HTMLParser):
+    """Collect the visible text of an XHTML document."""
+
+    _SKIP_TAGS = {"script", "style", "head", "title"}
+    _BLOCK_TAGS = {"p", "div", "br", "li", "h1", "h2", "h3", "h4", "h5", "h6", "tr", "section"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self._parts: List[str] = []
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self._SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag in self._BLOCK_TAGS:
+            self._parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in self._SKIP_TAGS and self._skip_depth:
+            self._skip_depth -= 1
+
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self._parts.append(data)
+
+    def text(self) -> str:
+        return " ".join("".join(self._parts).split())
+
+
+class _ContentDocument:
+    """A parsed book whose pages or spine items can be extracted one by one."""
+
+    def __init__(self, file_content: bytes, file_type: BookType):
+        self.file_type = file_type
+        if file_type == BookType.PDF:
+            from pypdf import PdfReader
+            self._pdf = PdfReader(io.BytesIO(file_content))
+            self.length = len(self._pdf.pages)
+        else:
+            from ebooklib import epub
+            self._epub = epub.read_epub(io.BytesIO(file_content))
+            # Every itemref counts, even one missing from the manifest: locations
+            # are spine indexes, which the CFI steps are derived from
+            self._spine = [idref for idref, _linear in self._epub.spine]
+            self.length = len(self._spine)
+
+    def extract(self, start: int, count: int) -> List[dict]:
+        """Extract text for locations [start, start + count)."""
+        units = []
+        for location in range(start, min(start + count, self.length)):
+            try:
+                units.append(self._extract_one(location))
+            except Exception as e:
+                logger.warning(f"Failed to extract location {location}: {e}")
+                units.append({"location": location, "href": None, "cfi": None, "text": ""})
+        return units
+
+    def _extract_one(self, location: int) -> dict:
+        if self.file_type == BookType.PDF:
+            text = self._pdf.pages[location].extract_text() or ""
+            return {"location": location, "href": None, "cfi": None, "text": " ".join(text.split())}
+
+        idref = self._spine[location]
+        item = self._epub.get_item_with_id(idref)
+        if item is None:
+            logger.info(f"Spine item {idref!r} is not in the manifest, not indexed")
+            return {"location": location, "href": None, "cfi": None, "text": ""}
+        parser = _HTMLTextExtractor()
+        parser.feed(item.get_content().decode("utf-8", errors="ignore"))
+        return {
+            "location": location,
+            "href": item.get_name(),
+            # Spine items are the even children of the package's spine element
+            "cfi": f"epubcfi(/6/{(location + 1) * 2}[{idref}]!)",
+            "text": parser.text(),
+        }
+
+
+class ContentIndexService:
+    @staticmethod
+    async def index_book(book_id: str) -> Optional[str]:
+        """
+        Extract a book's text into the content index.
+
+        Runs in its own session so it can be scheduled as a background task.
+        Work is committed in batches and the position is stored, so an
+        interrupted run picks up where it stopped.
+
+        Returns:
+            Final index status, or None if the book no longer exists
+        """
+        if not settings.CONTENT_INDEX_ENABLED:
+            return None
+
+        async with AsyncSessionLocal() as db:
+            book = (await db.execute(select(Book).where(Book.id == book_id))).scalar_one_or_none()
+            if not book:
+                return None
+
+            state = await db.get(BookContentIndex, book_id)
+            if state is None:
+                state = BookContentIndex(book_id=book_id, status="pending", next_location=0)
+                db.add(state)
+                await db.commit()
+            if state.status == "done":
+                return state.status
+
+            try:
+                content = await storage_service.get_book(book.file_url)
+                if content is None:
+                    raise FileNotFoundError(book.file_url)
+
+                document = await asyncio.to_thread(_ContentDocument, content, book.file_type)
+                del content
+                state.total_locations = document.length
+
+                if state.next_location == 0:
+                    # Drop leftovers of a run that died before its first commit
+                    await db.execute(delete(BookContent).where(BookContent.book_id == book_id))
+
+                batch_size = max(settings.CONTENT_INDEX_BATCH_SIZE, 1)
+                while state.next_location < document.length:
+                    units = await asyncio.to_thread(document.extract, state.next_location, batch_size)
+                    db.add_all(
+                        BookContent(book_id=book_id, user_id=book.user_id, **unit)
+                        for unit in units
+                        if unit["text"]
+                    )
+                    state.next_location += len(units)
+                    await db.commit()
+
+                state.status = "done"
+                state.error = None
+            except Exception as e:
+                await db.rollback()
+                logger.error(f"Content indexing failed for book {book_id}: {e}")
+                state = await db.get(BookContentIndex, book_id)
+                if state is None:
+                    return None
+                state.status = "failed"
+                state.error = str(e)[:500]
+
+            await db.commit()
+            return state.status
+
+    @staticmethod
+    async def pending_book_ids(limit: Optional[int] = None) -> List[str]:
+        """Books that have not been fully indexed yet, oldest first."""
+        async with AsyncSessionLocal() as db:
+            query = (
+                select(Book.id)
+                .outerjoin(BookContentIndex, BookContentIndex.book_id == Book.id)
+                .where((BookContentIndex.book_id.is_(None)) | (BookContentIndex.status == "pending"))
+                .order_by(Book.created_at)
+            )
+            if limit:
+                query = query.limit(limit)
+            result = await db.execute(query)
+            return list(result.scalars().all())
+
+    @staticmethod
+    async def backfill(limit: Optional[int] = None, retry_failed: bool = False) -> dict[str, Any]:
+        """
+        Index every book that is not indexed yet, one at a time.
+
+        Safe to stop and restart: finished books are skipped and partially
+        indexed ones resume from their stored position.
+        """
+        if retry_failed:
+            async with AsyncSessionLocal() as db:
+                failed = await db.execute(
+                    select(BookContentIndex).where(BookContentIndex.status == "failed")
+                )
+                for state in failed.scalars().all():
+                    state.status = "pending"
+                    state.next_location = 0
+                await db.commit()
+
+        counts = {"done": 0, "failed": 0}
+        for book_id in await ContentIndexService.pending_book_ids(limit):
+            status = await ContentIndexService.index_book(book_id)
+            if status in counts:
+                counts[status] += 1
+        return counts
@@ -0,0 +1,432 @@
+"""EPUB archive access: lightweight metadata reads and single-resource reads."""
+import asyncio
+import hashlib
+import mimetypes
+import posixpath
+import struct
+import zipfile
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Dict, List, Tuple, BinaryIO
+from urllib.parse import unquote
+from xml.etree import ElementTree
+
+from ..config import settings
+from .storage_service import storage_service
+
+
+_EOCD_SIGNATURE = b"PK\x05\x06"
+_EOCD_STRUCT = struct.Struct("<4sHHHHIIH")
+_CENTRAL_STRUCT = struct.Struct("<4sHHHHHHIIIHHHHHII")
+_CENTRAL_SIGNATURE = b"PK\x01\x02"
+_LOCAL_STRUCT = struct.Struct("<4sHHHHHIIIHH")
+_LOCAL_SIGNATURE = b"PK\x03\x04"
+_MAX_COMMENT = 0xFFFF
+_ZIP64_MARKER = 0xFFFFFFFF
+
+_STORED = 0
+_DEFLATED = 8
+_INLINE_INFLATE_SIZE = 256 * 1024  # Larger entries are decompressed off the event loop
+
+_CONTAINER_NS = "{urn:oasis:names:tc:opendocument:xmlns:container}"
+_OPF_NS = "{http://www.idpf.org/2007/opf}"
+_DC_NS = "{http://purl.org/dc/elements/1.1/}"
+_XHTML_NS = "{http://www.w3.org/1999/xhtml}"
+_OPS_NS = "{http://www.idpf.org/2007/ops}"
+_NCX_NS = "{http://www.daisy.org/z3986/2005/ncx/}"
+_MAX_XML_SIZE = 8 * 1024 * 1024  # Refuse absurdly large container/OPF files
+_MAX_TOC_ENTRIES = 5000
+
+_MEDIA_TYPES = {
+    ".xhtml": "application/xhtml+xml",
+    ".html": "text/html",
+    ".htm": "text/html",
+    ".css": "text/css",
+    ".opf": "application/oebps-package+xml",
+    ".ncx": "application/x-dtbncx+xml",
+    ".svg": "image/svg+xml",
+    ".xml": "application/xml",
+    ".otf": "font/otf",
+    ".ttf": "font/ttf",
+    ".woff": "font/woff",
+    ".woff2": "font/woff2",
+}
+
+
+class EpubArchiveError(Exception):
+    """Raised when a stored file is not a readable zip archive."""
+
+
+@dataclass
+class ZipEntry:
+    header_offset: int
+    compressed_size: int
+    size: int
+    method: int
+    crc: int
+    data_offset: Optional[int] = None  # Resolved from the local header on first read
+
+
+@dataclass
+class EpubResource:
+    content: bytes
+    media_type: str
+    etag: str
+
+
+class EpubService:
+    # file_url -> {entry name -> ZipEntry}, least recently used first
+    _directories: "OrderedDict[str, Dict[str, ZipEntry]]" = OrderedDict()
+
+    @staticmethod
+    def read_metadata(stream: BinaryIO) -> dict:
+        """
+        Read title, author, document count and cover of an EPUB from a
+        seekable stream.
+
+        Only the zip central directory, ``META-INF/container.xml``, the OPF
+        package document and the cover image are read; no other entry is
+        decompressed. Raises on malformed archives so callers can fall back
+        to a full parse.
+        """
+        with zipfile.ZipFile(stream) as archive:
+            opf_path, package = EpubService._read_package(archive)
+
+            metadata_element = package.find(f"{_OPF_NS}metadata")
+            manifest = package.find(f"{_OPF_NS}manifest")
+            if manifest is None:
+                raise EpubArchiveError("No manifest in package document")
+
+            def first_text(tag: str) -> Optional[str]:
+                if metadata_element is None:
+                    return None
+                element = metadata_element.find(f"{_DC_NS}{tag}")
+                text = (element.text or "").strip() if element is not None else ""
+                return text or None
+
+            items = manifest.findall(f"{_OPF_NS}item")
+            opf_dir = posixpath.dirname(opf_path)
+
+            cover_item = EpubService._find_cover_item(items, metadata_element)
+            cover = None
+            if cover_item is not None:
+                cover_path = posixpath.normpath(
+                    posixpath.join(opf_dir, unquote(cover_item.get("href", "")))
+                )
+                try:
+                    cover = archive.read(cover_path)
+                except KeyError:
+                    cover = None
+
+            # Same count ebooklib reports as ITEM_DOCUMENT, so stored page
+            # totals do not change when metadata is refreshed
+            documents = sum(1 for item in items if item.get("media-type") == "application/xhtml+xml")
+
+            return {
+                "title": first_text("title"),
+                "author": first_text("creator"),
+                "cover": cover,
+                "total_pages": documents or None,
+            }
+
+    @staticmethod
+    def _read_package(archive: zipfile.ZipFile) -> Tuple[str, ElementTree.Element]:
+        """Locate and parse the OPF package document through container.xml."""
+        container = ElementTree.fromstring(
+            EpubService._read_xml_entry(archive, "META-INF/container.xml")
+        )
+        rootfile = container.find(f"{_CONTAINER_NS}rootfiles/{_CONTAINER_NS}rootfile")
+        if rootfile is None or not rootfile.get("full-path"):
+            raise EpubArchiveError("No rootfile in container.xml")
+        opf_path = rootfile.get("full-path")
+        return opf_path, ElementTree.fromstring(EpubService._read_xml_entry(archive, opf_path))
+
+    @staticmethod
+    def read_toc(stream: BinaryIO) -> List[dict]:
+        """
+        Read the table of contents of an EPUB as a flat list of
+        ``{"title", "level", "href"}`` entries in reading order.
+
+        ``href`` is the archive path (plus fragment) of the target, usable
+        with the EPUB resource endpoint. The EPUB 3 navigation document is
+        preferred; the EPUB 2 NCX is used when there is none.
+        """
+        with zipfile.ZipFile(stream) as archive:
+            opf_path, package = EpubService._read_package(archive)
+            opf_dir = posixpath.dirname(opf_path)
+            manifest = package.find(f"{_OPF_NS}manifest")
+            items = manifest.findall(f"{_OPF_NS}item") if manifest is not None else []
+
+            def item_path(item) -> str:
+                return posixpath.normpath(posixpath.join(opf_dir, unquote(item.get("href", ""))))
+
+            nav = next((i for i in items if "nav" in (i.get("properties") or "").split()), None)
+            if nav is not None:
+                try:
+                    path = item_path(nav)
+                    entries = EpubService._parse_nav(EpubService._read_xml_entry(archive, path), path)
+                    if entries:
+                        return entries
+                except (ElementTree.ParseError, KeyError):
+                    pass  # e.g. HTML entities in the nav document; try the NCX
+
+            spine = package.find(f"{_OPF_NS}spine")
+            ncx_id = spine.get("toc") if spine is not None else None
+            ncx = next(
+                (i for i in items if i.get("id") == ncx_id or i.get("media-type") == "application/x-dtbncx+xml"),
+                None,
+            )
+            if ncx is not None:
+                path = item_path(ncx)
+                return EpubService._parse_ncx(EpubService._read_xml_entry(archive, path), path)
+            return []
+
+    @staticmethod
+    def _resolve_href(document_path: str, href: Optional[str]) -> Optional[str]:
+        if not href:
+            return None
+        target, _, fragment = href.partition("#")
+        path = posixpath.normpath(posixpath.join(posixpath.dirname(document_path), unquote(target)))
+        return f"{path}#{fragment}" if fragment else path
+
+    @staticmethod
+    def _parse_nav(document: bytes, document_path: str) -> List[dict]:
+        root = ElementTree.fromstring(document)
+        navs = list(root.iter(f"{_XHTML_NS}nav"))
+        toc = next((n for n in navs if n.get(f"{_OPS_NS}type") == "toc"), navs[0] if navs else None)
+        if toc is None:
+            return []
+
+        entries: List[dict] = []
+
+        def walk(ol, level: int) -> None:
+            for li in ol.findall(f"{_XHTML_NS}li"):
+                if len(entries) >= _MAX_TOC_ENTRIES:
+                    return
+                label = li.find(f"{_XHTML_NS}a")
+                if label is None:
+                    label = li.find(f"{_XHTML_NS}span")
+                if label is not None:
+                    entries.append({
+                        "title": " ".join("".join(label.itertext()).split()),
+                        "level": level,
+                        "href": EpubService._resolve_href(document_path, label.get("href")),
+                    })
+                child = li.find(f"{_XHTML_NS}ol")
+                if child is not None:
+                    walk(child, level + 1)
+
+        top = toc.find(f"{_XHTML_NS}ol")
+        if top is not None:
+            walk(top, 0)
+        return entries
+
+    @staticmethod
+    def _parse_ncx(document: bytes, document_path: str) -> List[dict]:
+        root = ElementTree.fromstring(document)
+        nav_map = root.find(f"{_NCX_NS}navMap")
+        entries: List[dict] = []
+
+        def walk(parent, level: int) -> None:
+            for point in parent.findall(f"{_NCX_NS}navPoint"):
+                if len(entries) >= _MAX_TOC_ENTRIES:
+                    return
+                text = point.find(f"{_NCX_NS}navLabel/{_NCX_NS}text")
+                content = point.find(f"{_NCX_NS}content")
+                entries.append({
+                    "title": " ".join((text.text or "").split()) if text is not None else "",
+                    "level": level,
+                    "href": EpubService._resolve_href(
+                        document_path,
+                        content.get("src") if content is not None else None,
+                    ),
+                })
+                walk(point, level + 1)
+
+        if nav_map is not None:
+            walk(nav_map, 0)
+        return entries
+
+    @staticmethod
+    def _read_xml_entry(archive: zipfile.ZipFile, name: str) -> bytes:
+        info = archive.getinfo(name)
+        if info.file_size > _MAX_XML_SIZE:
+            raise EpubArchiveError(f"{name} is too large")
+        return archive.read(info)
+
+    @staticmethod
+    def _find_cover_item(items, metadata_element) -> Optional[ElementTree.Element]:
+        # EPUB 3: manifest item with the cover-image property
+        for item in items:
+            if "cover-image" in (item.get("properties") or "").split():
+                return item
+
+        # EPUB 2: <meta name="cover" content="{manifest id}"/>
+        if metadata_element is not None:
+            for meta in metadata_element.findall(f"{_OPF_NS}meta"):
+                if meta.get("name") == "cover" and meta.get("content"):
+                    for item in items:
+                        if item.get("id") == meta.get("content"):
+                            return item
+
+        # Fallback: an image whose id or href mentions "cover"
+        for item in items:
+            if (item.get("media-type") or "").startswith("image/") and (
+                "cover" in (item.get("id") or "").lower()
+                or "cover" in (item.get("href") or "").lower()
+            ):
+                return item
+        return None
+
+    @staticmethod
+    def media_type(name: str) -> str:
+        extension = "." + name.rsplit(".", 1)[-1].lower() if "." in name else ""
+        return _MEDIA_TYPES.get(extension) or mimetypes.guess_type(name)[0] or "application/octet-stream"
+
+    @staticmethod
+    async def get_directory(file_url: str) -> Dict[str, ZipEntry]:
+        """
+        Get the central directory of a stored archive.
+
+        The directory is read with two ranged reads (the end-of-central-
+        directory record, then the directory itself) and cached per file, so
+        later lookups are a dict access.
+        """
+        directory = EpubService._directories.get(file_url)
+        if directory is not None:
+            EpubService._directories.move_to_end(file_url)
+            return directory
+
+        directory = await EpubService._read_directory(file_url)
+        EpubService._directories[file_url] = directory
+        while len(EpubService._directories) > settings.EPUB_DIRECTORY_CACHE_SIZE:
+            EpubService._directories.popitem(last=False)
+        return directory
+
+    @staticmethod
+    def forget(file_url: str) -> None:
+        """Drop a cached directory, e.g. after the file was deleted."""
+        EpubService._directories.pop(file_url, None)
+
+    @staticmethod
+    async def _read_directory(file_url: str) -> Dict[str, ZipEntry]:
+        size = await storage_service.get_size(file_url)
+        if size is None:
+            raise FileNotFoundError(file_url)
+
+        tail_length = min(size, _EOCD_STRUCT.size + _MAX_COMMENT)
+        tail = await storage_service.read_range(file_url, size - tail_length, tail_length)
+        position = tail.rfind(_EOCD_SIGNATURE) if tail else -1
+        if position < 0 or len(tail) - position < _EOCD_STRUCT.size:
+            raise EpubArchiveError("End of central directory not found")
+
+        _sig, _disk, _cd_disk, _disk_entries, total_entries, cd_size, cd_offset, _comment = (
+            _EOCD_STRUCT.unpack_from(tail, position)
+        )
+        if cd_offset == _ZIP64_MARKER or cd_size == _ZIP64_MARKER:
+            raise EpubArchiveError("ZIP64 archives are not supported")
+
+        central = await storage_service.read_range(file_url, cd_offset, cd_size)
+        if not central or len(central) < cd_size:
+            raise EpubArchiveError("Truncated central directory")
+
+        directory: Dict[str, ZipEntry] = {}
+        offset = 0
+        for _ in range(total_entries):
+            if central[offset:offset + 4] != _CENTRAL_SIGNATURE:
+                raise EpubArchiveError("Corrupt central directory")
+            (
+                _sig, _made_by, _needed, flags, method, _time, _date, crc,
+                compressed_size, uncompressed_size, name_length, extra_length,
+                comment_length, _disk_start, _internal, _external, header_offset,
+            ) = _CENTRAL_STRUCT.unpack_from(central, offset)
+            offset += _CENTRAL_STRUCT.size
+            raw_name = central[offset:offset + name_length]
+            name = raw_name.decode("utf-8" if flags & 0x800 else "cp437", errors="replace")
+            offset += name_length + extra_length + comment_length
+
+            if not name.endswith("/"):
+                directory[name] = ZipEntry(
+                    header_offset=header_offset,
+                    compressed_size=compressed_size,
+                    size=uncompressed_size,
+                    method=method,
+                    crc=crc,
+                )
+        return directory
+
+    @staticmethod
+    async def read_entry(file_url: str, entry: ZipEntry) -> bytes:
+        """
+        Read and decompress a single archive entry.
+
+        Entries declaring more than EPUB_MAX_ENTRY_MB are refused, and
+        decompression stops one byte past the declared size, so a crafted
+        entry cannot inflate beyond it.
+        """
+        max_size = settings.EPUB_MAX_ENTRY_MB * 1024 * 1024
+        if entry.size > max_size or entry.compressed_size > max_size:
+            raise EpubArchiveError(f"Entry larger than {settings.EPUB_MAX_ENTRY_MB} MB")
+
+        if entry.data_offset is None:
+            header = await storage_service.read_range(file_url, entry.header_offset, _LOCAL_STRUCT.size)
+            if not header or len(header) < _LOCAL_STRUCT.size or header[:4] != _LOCAL_SIGNATURE:
+                raise EpubArchiveError("Corrupt local file header")
+            name_length, extra_length = _LOCAL_STRUCT.unpack(header)[-2:]
+            entry.data_offset = entry.header_offset + _LOCAL_STRUCT.size + name_length + extra_length
+
+        data = await storage_service.read_range(file_url, entry.data_offset, entry.compressed_size)
+        if data is None or len(data) < entry.compressed_size:
+            raise EpubArchiveError("Truncated entry")
+
+        if entry.method == _STORED:
+            content = data
+        elif entry.method == _DEFLATED:
+            if entry.size > _INLINE_INFLATE_SIZE:
+                content = await asyncio.to_thread(EpubService._inflate, data, entry.size)
+            else:
+                content = EpubService._inflate(data, entry.size)
+        else:
+            raise EpubArchiveError(f"Unsupported compression method {entry.method}")
+
+        if zlib.crc32(content) != entry.crc:
+            raise EpubArchiveError("CRC mismatch")
+        return content
+
+    @staticmethod
+    def _inflate(data: bytes, size: int) -> bytes:
+        decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+        content = decompressor.decompress(data, size + 1)
+        if len(content) > size or decompressor.unconsumed_tail:
+            raise EpubArchiveError("Entry inflates beyond its declared size")
+        return content
+
+    @staticmethod
+    def etag(file_url: str, name: str, entry: ZipEntry) -> str:
+        # Stored files are never rewritten in place, so the file path plus the
+        # entry's CRC and size identify the bytes exactly
+        digest = hashlib.sha1(f"{file_url}\0{name}".encode()).hexdigest()[:16]
+        return f'"{digest}-{entry.crc:08x}-{entry.size:x}"'
+
+    @staticmethod
+    async def get_resource_etag(file_url: str, name: str) -> Optional[str]:
+        """ETag of an entry, without reading its data."""
+        entry = (await EpubService.get_directory(file_url)).get(name)
+        if entry is None:
+            return None
+        return EpubService.etag(file_url, name, entry)
+
+    @staticmethod
+    async def get_resource(file_url: str, name: str) -> Optional[EpubResource]:
+        """Read one resource (chapter, stylesheet, image...) from a stored EPUB."""
+        entry = (await EpubService.get_directory(file_url)).get(name)
+        if entry is None:
+            return None
+
+        content = await EpubService.read_entry(file_url, entry)
+        return EpubResource(
+            content=content,
+            media_type=EpubService.media_type(name),
+            etag=EpubService.etag(file_url, name, entry),
+        )
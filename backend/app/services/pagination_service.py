@@ -0,0 +1,386 @@
+"""Character-offset pagination maps for EPUBs and CFI-based progress."""
+import asyncio
+import hashlib
+import html
+import json
+import logging
+import math
+import posixpath
+import re
+import struct
+import sys
+import zipfile
+from array import array
+from dataclasses import dataclass
+from html.entities import html5
+from typing import Optional, List, Tuple, BinaryIO
+from urllib.parse import unquote
+from xml.etree import ElementTree
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..config import settings
+from ..database import AsyncSessionLocal
+from ..models.book import Book, BookType
+from ..models.book_pagination import BookPagination
+from .epub_service import EpubService, EpubArchiveError, _OPF_NS
+from .storage_service import storage_service
+from .version_service import VersionService, LIBRARY
+
+logger = logging.getLogger(__name__)
+
+_MAGIC = b"DPM1"
+_HEADER = struct.Struct("<4sII")  # magic, chars per page, spine item count
+_SKIP_TAGS = {"head", "script", "style"}
+_CFI_PATTERN = re.compile(r"^epubcfi\((.*)\)$")
+_STEP_PATTERN = re.compile(r"/(\d+)(?:\[[^\]]*\])?")
+_ENTITY_PATTERN = re.compile(rb"&([A-Za-z][A-Za-z0-9]*);")
+_XML_ENTITIES = {b"amp", b"lt", b"gt", b"quot", b"apos"}
+_SKIP_BLOCK_PATTERN = re.compile(rb"<(head|script|style)\b.*?</\1\s*>", re.S | re.I)
+_TAG_PATTERN = re.compile(rb"<[^>]*>")
+
+
+@dataclass
+class PaginationMap:
+    """
+    Cumulative character and page offsets over the spine of an EPUB.
+
+    ``offsets[i]`` is the number of text characters before spine item ``i``
+    and ``pages[i]`` the page it starts on (0-based); both have one extra
+    trailing entry holding the totals.
+    """
+
+    chars_per_page: int
+    offsets: array
+    pages: array
+
+    @property
+    def total_chars(self) -> int:
+        return self.offsets[-1]
+
+    @property
+    def total_pages(self) -> int:
+        return self.pages[-1]
+
+
+def _local_name(tag) -> str:
+    return tag.rsplit("}", 1)[-1] if isinstance(tag, str) else ""
+
+
+def _children(element) -> list:
+    """Child elements, without entity references left unresolved by the parser."""
+    return [child for child in element if isinstance(child.tag, str)]
+
+
+def _text_length(element) -> int:
+    """Characters of text inside an element, excluding head, scripts and styles."""
+    if _local_name(element.tag) in _SKIP_TAGS:
+        return 0
+    length = len(element.text or "")
+    for child in _children(element):
+        length += _text_length(child) + len(child.tail or "")
+    return length
+
+
+def _character_references(content: bytes) -> bytes:
+    """Replace HTML named entities such as ``&nbsp;``, undefined in XML, by character references."""
+    def replace(match: "re.Match[bytes]") -> bytes:
+        if match.group(1) in _XML_ENTITIES:
+            return match.group(0)
+        chars = html5.get(match.group(1).decode("ascii") + ";")
+        if chars is None:
+            return match.group(0)
+        return "".join(f"&#{ord(char)};" for char in chars).encode("ascii")
+
+    return _ENTITY_PATTERN.sub(replace, content)
+
+
+def parse_document(content: bytes):
+    """
+    Parse an XHTML spine item.
+
+    HTML named entities are accepted and markup errors are recovered from
+    instead of failing the whole document. Comments and processing
+    instructions are dropped, so element children line up with CFI steps.
+    Entities are not resolved and nothing is fetched over the network.
+
+    Raises:
+        ValueError: if no markup could be recovered
+    """
+    from lxml import etree
+
+    parser = etree.XMLParser(
+        recover=True,
+        resolve_entities=False,
+        no_network=True,
+        remove_comments=True,
+        remove_pis=True,
+    )
+    try:
+        root = etree.fromstring(_character_references(content), parser)
+    except etree.LxmlError as e:
+        raise ValueError(str(e)) from e
+    if root is None:
+        raise ValueError("No markup found")
+    return root
+
+
+def _markup_text_length(content: bytes) -> int:
+    """Rough text length of a document that could not be parsed at all."""
+    text = _TAG_PATTERN.sub(b"", _SKIP_BLOCK_PATTERN.sub(b"", content))
+    return len(html.unescape(text.decode("utf-8", errors="replace")))
+
+
+class PaginationService:
+    @staticmethod
+    def encode(pagination: PaginationMap) -> bytes:
+        """
+        Serialize a map: a ``<4sII`` header (``DPM1``, characters per page,
+        spine item count ``n``) followed by the ``n + 1`` character offsets
+        and the ``n + 1`` page offsets, all little-endian uint32.
+        """
+        offsets, pages = array("I", pagination.offsets), array("I", pagination.pages)
+        if sys.byteorder == "big":
+            offsets.byteswap()
+            pages.byteswap()
+        header = _HEADER.pack(_MAGIC, pagination.chars_per_page, len(offsets) - 1)
+        return header + offsets.tobytes() + pages.tobytes()
+
+    @staticmethod
+    def decode(data: bytes) -> PaginationMap:
+        magic, chars_per_page, count = _HEADER.unpack_from(data)
+        if magic != _MAGIC:
+            raise ValueError("Not a pagination map")
+        offsets, pages = array("I"), array("I")
+        size = (count + 1) * offsets.itemsize
+        offsets.frombytes(data[_HEADER.size:_HEADER.size + size])
+        pages.frombytes(data[_HEADER.size + size:_HEADER.size + 2 * size])
+        if sys.byteorder == "big":
+            offsets.byteswap()
+            pages.byteswap()
+        return PaginationMap(chars_per_page=chars_per_page, offsets=offsets, pages=pages)
+
+    @staticmethod
+    def build(stream: BinaryIO, chars_per_page: int) -> Tuple[PaginationMap, List[str]]:
+        """
+        Measure the text of every spine item of an EPUB.
+
+        Non-linear items (notes, pop-ups) count as empty so they do not move
+        progress; linear items without text, such as full-page images, still
+        take one page.
+
+        Returns:
+            The map and the archive paths of the spine items
+        """
+        offsets, pages = array("I", [0]), array("I", [0])
+        paths: List[str] = []
+
+        with zipfile.ZipFile(stream) as archive:
+            opf_path, package = EpubService._read_package(archive)
+            opf_dir = posixpath.dirname(opf_path)
+            manifest = {
+                item.get("id"): posixpath.normpath(posixpath.join(opf_dir, unquote(item.get("href", ""))))
+                for item in package.iterfind(f"{_OPF_NS}manifest/{_OPF_NS}item")
+            }
+
+            for itemref in package.iterfind(f"{_OPF_NS}spine/{_OPF_NS}itemref"):
+                path = manifest.get(itemref.get("idref"), "")
+                paths.append(path)
+                length = 0
+                if itemref.get("linear", "yes") != "no":
+                    try:
+                        content = archive.read(path)
+                    except KeyError:
+                        logger.warning(f"Spine item {path!r} is missing from the archive")
+                    else:
+                        try:
+                            length = _text_length(parse_document(content))
+                        except ValueError as e:
+                            # Keep the chapter's weight in the map rather than count it as empty
+                            length = _markup_text_length(content)
+                            logger.warning(f"Could not parse spine item {path!r}, estimated {length} characters: {e}")
+                    page_count = max(1, math.ceil(length / chars_per_page))
+                else:
+                    page_count = 0
+                offsets.append(offsets[-1] + length)
+                pages.append(pages[-1] + page_count)
+
+        return PaginationMap(chars_per_page=chars_per_page, offsets=offsets, pages=pages), paths
+
+    @staticmethod
+    async def generate(db: AsyncSession, book: Book) -> Optional[BookPagination]:
+        """
+        Build and store the pagination map of an EPUB and use its page count
+        as the book's ``total_pages``. The caller commits.
+
+        Returns:
+            The stored map, or None if the book file is missing or unreadable
+        """
+        async with storage_service.open_stream(book.file_url) as stream:
+            if stream is None:
+                return None
+            try:
+                pagination, paths = await asyncio.to_thread(
+                    PaginationService.build, stream, settings.EPUB_CHARS_PER_PAGE
+                )
+            except (zipfile.BadZipFile, EpubArchiveError, ElementTree.ParseError, KeyError) as e:
+                logger.warning(f"Could not paginate book {book.id}: {e}")
+                return None
+
+        data = PaginationService.encode(pagination)
+        row = await db.get(BookPagination, book.id)
+        if row is None:
+            row = BookPagination(book_id=book.id)
+            db.add(row)
+        row.data = data
+        row.spine = json.dumps(paths, separators=(",", ":"))
+        row.total_chars = pagination.total_chars
+        row.total_pages = pagination.total_pages
+        row.etag = f'"{hashlib.sha1(data).hexdigest()[:20]}"'
+        if pagination.total_pages and pagination.total_pages != book.total_pages:
+            book.total_pages = pagination.total_pages
+            await VersionService.bump(db, book.user_id, LIBRARY)
+        return row
+
+    @staticmethod
+    async def build_for_book(book_id: str) -> None:
+        """Generate a book's pagination map in its own session (background task)."""
+        async with AsyncSessionLocal() as db:
+            book = (await db.execute(select(Book).where(Book.id == book_id))).scalar_one_or_none()
+            if book and book.file_type == BookType.EPUB:
+                if await PaginationService.generate(db, book) is not None:
+                    await db.commit()
+
+    @staticmethod
+    async def get_pagination(db: AsyncSession, book_id: str, user_id: str) -> Optional[BookPagination]:
+        """
+        Get the stored pagination map of a user's EPUB, generating it for
+        books uploaded before maps were built at ingest.
+        """
+        result = await db.execute(
+            select(Book, BookPagination)
+            .outerjoin(BookPagination, BookPagination.book_id == Book.id)
+            .where(Book.id == book_id, Book.user_id == user_id, Book.file_type == BookType.EPUB)
+        )
+        row = result.first()
+        if row is None:
+            return None
+        book, pagination = row
+        if pagination is None:
+            pagination = await PaginationService.generate(db, book)
+            if pagination is not None:
+                await db.commit()
+        return pagination
+
+    @staticmethod
+    def parse_cfi(cfi: str) -> Optional[Tuple[int, List[int], int]]:
+        """
+        Split an EPUB CFI into its spine index, the element path inside the
+        spine item and the terminal character offset. For range CFIs the
+        start of the range is used.
+        """
+        match = _CFI_PATTERN.match(cfi.strip())
+        if not match or "!" not in match.group(1):
+            return None
+        package_path, _, content_path = match.group(1).partition("!")
+        if "," in content_path:
+            parent, start = content_path.split(",")[:2]
+            content_path = parent + start
+
+        package_steps = [int(step) for step in _STEP_PATTERN.findall(package_path)]
+        if len(package_steps) < 2 or package_steps[1] % 2:
+            return None
+
+        path, _, offset = content_path.partition(":")
+        offset = re.match(r"\d*", offset).group()
+        steps = [int(step) for step in _STEP_PATTERN.findall(path)]
+        return package_steps[1] // 2 - 1, steps, int(offset or 0)
+
+    @staticmethod
+    def character_offset(document: bytes, steps: List[int], offset: int) -> Optional[int]:
+        """
+        Number of text characters of a spine item that precede a CFI location,
+        counted the same way as the pagination map.
+        """
+        node = parse_document(document)
+        before = 0
+        for step in steps:
+            if _local_name(node.tag) in _SKIP_TAGS:
+                return before
+            children = _children(node)
+            index = step // 2
+            if step % 2 == 0:
+                # Even steps address element child step / 2
+                if index == 0 or index > len(children):
+                    return None
+                before += len(node.text or "")
+                for child in children[:index - 1]:
+                    before += _text_length(child) + len(child.tail or "")
+                node = children[index - 1]
+            else:
+                # Odd steps address the text after element child step // 2
+                if index > len(children):
+                    return None
+                if index == 0:
+                    return before + min(offset, len(node.text or ""))
+                before += len(node.text or "")
+                for child in children[:index - 1]:
+                    before += _text_length(child) + len(child.tail or "")
+                before += _text_length(children[index - 1])
+                return before + min(offset, len(children[index - 1].tail or ""))
+        return before
+
+    @staticmethod
+    async def progress_for_cfi(
+        db: AsyncSession,
+        book_id: str,
+        cfi: str,
+        reported: Optional[float] = None,
+    ) -> Optional[float]:
+        """
+        Derive reading progress (0-1) of an EPUB from a CFI.
+
+        The CFI is resolved to a character offset within its spine item; if
+        that fails, the client's ``reported`` value is kept when it lies
+        within the spine item, otherwise the item's start is used.
+
+        Returns:
+            Progress, or None if the book has no map or the CFI is unusable
+        """
+        parsed = PaginationService.parse_cfi(cfi)
+        if parsed is None:
+            return None
+        index, steps, offset = parsed
+
+        result = await db.execute(
+            select(BookPagination.data, BookPagination.spine, Book.file_url)
+            .join(Book, Book.id == BookPagination.book_id)
+            .where(BookPagination.book_id == book_id)
+        )
+        row = result.first()
+        if row is None:
+            return None
+        pagination = PaginationService.decode(row.data)
+        if index >= len(pagination.offsets) - 1 or not pagination.total_chars:
+            return None
+
+        start, end = pagination.offsets[index], pagination.offsets[index + 1]
+        total = pagination.total_chars
+        within = None
+        if steps and end > start:
+            path = json.loads(row.spine)[index]
+            try:
+                resource = await EpubService.get_resource(row.file_url, path)
+                if resource is not None:
+                    within = await asyncio.to_thread(
+                        PaginationService.character_offset, resource.content, steps, offset
+                    )
+            except (FileNotFoundError, EpubArchiveError, ValueError) as e:
+                logger.debug(f"Could not resolve CFI {cfi} in book {book_id}: {e}")
+
+        if within is not None:
+            return min(start + min(within, end - start), total) / total
+        if reported is not None and start / total <= reported <= end / total:
+            return reported
+        return start / total
@@ -0,0 +1,360 @@
+"""Server-side PDF processing for stored books."""
+import asyncio
+import io
+import logging
+from contextlib import asynccontextmanager
+from typing import Optional, List, BinaryIO, Dict, AsyncIterator
+
+from sqlalchemy import select
+
+from ..config import settings
+from ..database import AsyncSessionLocal
+from ..models.book import Book, BookType
+from ..models.book_variant import BookVariant
+from .storage_service import storage_service
+
+logger = logging.getLogger(__name__)
+
+OPTIMIZED_VARIANT = "optimized"
+
+# Page attributes a /Page takes from its /Pages ancestors when it has none
+_INHERITABLE_PAGE_ATTRIBUTES = ("/Resources", "/MediaBox", "/CropBox", "/Rotate")
+
+
+class PageRangeError(ValueError):
+    """Raised when a requested page range lies outside the document."""
+
+
+class PdfService:
+    # book id -> [semaphore, holders and waiters] for books being extracted from
+    _extractions: Dict[str, list] = {}
+
+    @staticmethod
+    def read_metadata(stream: BinaryIO) -> dict:
+        """
+        Read title, author and page count of a PDF from a seekable stream.
+
+        Only the cross-reference table, the trailer, ``/Info`` and the root
+        of the page tree are read: the page count comes from ``/Pages/Count``
+        instead of walking every page, and the stream (a file handle or an
+        mmap) is never copied into memory. Files with a broken xref table are
+        handed to pypdf's recovering full parse instead.
+        """
+        from pypdf import PdfReader
+
+        try:
+            reader = PdfReader(stream, strict=True)
+            info = reader.trailer.get("/Info")
+            info = info.get_object() if info is not None else None
+            count = reader.trailer["/Root"].get_object()["/Pages"].get_object()["/Count"]
+            if not isinstance(count, int) or count < 0:
+                raise ValueError("Invalid page count")
+        except Exception:
+            stream.seek(0)
+            reader = PdfReader(stream)
+            info = reader.metadata
+            count = len(reader.pages)
+
+        def text(key: str) -> Optional[str]:
+            value = info.get(key) if info else None
+            value = value.get_object() if hasattr(value, "get_object") else value
+            return str(value) if value else None
+
+        return {
+            "title": text("/Title"),
+            "author": text("/Author"),
+            "total_pages": int(count),
+        }
+
+    @staticmethod
+    def read_toc(stream: BinaryIO, max_entries: int = 5000) -> List[dict]:
+        """
+        Read the document outline of a PDF as a flat list of
+        ``{"title", "level", "page"}`` entries (1-based pages) in outline order.
+        """
+        from pypdf import PdfReader
+
+        reader = PdfReader(stream)
+        entries: List[dict] = []
+
+        def walk(items, level: int) -> None:
+            for item in items:
+                if len(entries) >= max_entries:
+                    return
+                if isinstance(item, list):
+                    walk(item, level + 1)
+                    continue
+                try:
+                    page = reader.get_destination_page_number(item)
+                except Exception:
+                    page = None
+                entries.append({
+                    "title": " ".join(str(item.title or "").split()),
+                    "level": level,
+                    "page": page + 1 if page is not None and page >= 0 else None,
+                })
+
+        try:
+            walk(reader.outline, 0)
+        except Exception as e:
+            logger.warning(f"Could not read PDF outline: {e}")
+        return entries
+
+    @staticmethod
+    def extract_page_range(stream: BinaryIO, first: int, last: int) -> bytes:
+        """
+        Build a standalone PDF containing pages ``first``..``last`` (1-based,
+        inclusive) of a seekable stream. Pages past the end of the document
+        are ignored.
+
+        The xref table is read strictly and the page tree is descended by
+        ``/Count``, so only the requested pages (not the whole file) are read
+        from the stream. Files that do not parse that way get pypdf's
+        recovering full parse instead.
+        """
+        from pypdf import PdfReader
+
+        try:
+            reader = PdfReader(stream, strict=True)
+            total, pages = PdfService._page_window(reader, first, last)
+            content = PdfService._write_pages(pages) if first <= total else None
+        except Exception:
+            stream.seek(0)
+            reader = PdfReader(stream)
+            total = len(reader.pages)
+            content = PdfService._write_pages(reader.pages[first - 1:last]) if first <= total else None
+        if content is None:
+            raise PageRangeError(f"Document has only {total} pages")
+        return content
+
+    @staticmethod
+    def _page_window(reader, first: int, last: int) -> tuple:
+        """
+        Page count and the pages ``first``..``last`` of a document, read from
+        the page tree without loading the pages outside the window.
+        """
+        from pypdf import PageObject
+        from pypdf.generic import DictionaryObject
+
+        pages = []
+
+        def visit(node, offset: int, inherited: dict, depth: int) -> None:
+            if depth > 32:
+                raise ValueError("Page tree too deep")
+            inherited = dict(inherited)
+            for attr in _INHERITABLE_PAGE_ATTRIBUTES:
+                if attr in node:
+                    inherited[attr] = node[attr]
+            kids = node["/Kids"].get_object()
+            # Kids of a node counting one page per kid are all pages, so the
+            # ones before the window need not be read
+            flat = node["/Count"] == len(kids)
+            for kid in kids:
+                if offset >= last:
+                    return
+                if flat and offset + 1 < first:
+                    offset += 1
+                    continue
+                obj = kid.get_object()
+                if not isinstance(obj, DictionaryObject):
+                    raise ValueError("Invalid page tree entry")
+                if obj.get("/Type") == "/Pages" or "/Kids" in obj:
+                    if flat:
+                        raise ValueError("Page tree counts do not match")
+                    count = obj["/Count"]
+                    if offset + count >= first:
+                        visit(obj, offset, inherited, depth + 1)
+                    offset += count
+                    continue
+                if offset + 1 >= first:
+                    page = PageObject(reader, kid.indirect_reference)
+                    page.update(obj)
+                    for attr, value in inherited.items():
+                        if attr not in page:
+                            page[attr] = value
+                    pages.append(page)
+                offset += 1
+
+        root = reader.trailer["/Root"].get_object()["/Pages"].get_object()
+        total = root["/Count"]
+        if not isinstance(total, int) or total < 0:
+            raise ValueError("Invalid page count")
+        visit(root, 0, {}, 0)
+        if first <= total and len(pages) != min(last, total) - first + 1:
+            raise ValueError("Page tree counts do not match")
+        return total, pages
+
+    @staticmethod
+    def _write_pages(pages: list) -> bytes:
+        from pypdf import PdfWriter
+
+        writer = PdfWriter()
+        for page in pages:
+            writer.add_page(page)
+
+        output = io.BytesIO()
+        writer.write(output)
+        return output.getvalue()
+
+    @staticmethod
+    def page_range_filename(book: Book, first: int, last: int) -> str:
+        return f"{book.user_id}/{book.id}/pages-{first}-{last}.pdf"
+
+    @staticmethod
+    async def get_page_range(book: Book, first: int, last: int) -> Optional[bytes]:
+        """
+        Get a PDF with just the requested pages of a book.
+
+        Each window is generated once and then served from storage. The
+        book file is streamed, so only the parts pypdf reads are loaded, and
+        at most PAGE_RANGE_EXTRACTIONS_PER_BOOK windows of one book are
+        extracted at a time.
+
+        Returns:
+            PDF bytes, or None if the book file is missing
+        """
+        if book.total_pages:
+            if first > book.total_pages:
+                raise PageRangeError(f"Document has only {book.total_pages} pages")
+            last = min(last, book.total_pages)
+
+        filename = PdfService.page_range_filename(book, first, last)
+        cached = await storage_service.get_derived(filename)
+        if cached is not None:
+            return cached
+
+        async with PdfService._extraction_slot(book.id):
+            # A request that held the slot may have just generated this window
+            cached = await storage_service.get_derived(filename)
+            if cached is not None:
+                return cached
+
+            async with storage_service.open_stream(book.file_url, ranged=True) as stream:
+                if stream is None:
+                    return None
+                pdf = await asyncio.to_thread(PdfService.extract_page_range, stream, first, last)
+            await storage_service.upload_derived(filename, pdf)
+        return pdf
+
+    @staticmethod
+    @asynccontextmanager
+    async def _extraction_slot(book_id: str) -> AsyncIterator[None]:
+        entry = PdfService._extractions.get(book_id)
+        if entry is None:
+            entry = PdfService._extractions[book_id] = [
+                asyncio.Semaphore(max(settings.PAGE_RANGE_EXTRACTIONS_PER_BOOK, 1)), 0
+            ]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del PdfService._extractions[book_id]
+
+    @staticmethod
+    def optimize(file_content: bytes, target_dpi: int, jpeg_quality: int) -> bytes:
+        """
+        Rewrite a PDF to be smaller.
+
+        Downsamples images that exceed ``target_dpi`` at full page width,
+        compresses content streams and merges identical objects. The result
+        is linearized for fast web view when pikepdf is installed.
+        """
+        from pypdf import PdfReader, PdfWriter
+        from PIL import Image
+
+        writer = PdfWriter(clone_from=PdfReader(io.BytesIO(file_content)))
+
+        for page in writer.pages:
+            max_width = int(float(page.mediabox.width) / 72 * target_dpi)
+            try:
+                images = list(page.images)
+            except Exception:
+                images = []
+            for image in images:
+                try:
+                    picture = image.image
+                    if picture is None or picture.width <= max_width:
+                        continue
+                    if picture.mode in ("RGBA", "LA", "P"):
+                        continue  # Keep transparency intact
+                    height = max(1, round(picture.height * max_width / picture.width))
+                    resized = picture.resize((max_width, height), Image.LANCZOS)
+                    if resized.mode not in ("RGB", "L"):
+                        resized = resized.convert("RGB")
+                    image.replace(resized, quality=jpeg_quality)
+                except Exception as e:
+                    logger.debug(f"Skipping image during optimization: {e}")
+
+            page.compress_content_streams(level=9)
+
+        if hasattr(writer, "compress_identical_objects"):
+            writer.compress_identical_objects(remove_identicals=True, remove_orphans=True)
+
+        output = io.BytesIO()
+        writer.write(output)
+        optimized = output.getvalue()
+
+        try:
+            import pikepdf
+        except ImportError:
+            return optimized
+
+        linearized = io.BytesIO()
+        with pikepdf.open(io.BytesIO(optimized)) as pdf:
+            pdf.save(linearized, linearize=True)
+        return linearized.getvalue()
+
+    @staticmethod
+    async def create_optimized_variant(book_id: str) -> Optional[BookVariant]:
+        """
+        Generate and store the optimized variant of a PDF book.
+
+        Runs in its own session so it can be scheduled as a background task.
+        The variant is only kept if it saves at least PDF_OPTIMIZE_MIN_SAVING.
+        """
+        async with AsyncSessionLocal() as db:
+            book = (await db.execute(select(Book).where(Book.id == book_id))).scalar_one_or_none()
+            if not book or book.file_type != BookType.PDF:
+                return None
+
+            content = await storage_service.get_book(book.file_url)
+            if content is None:
+                return None
+            original_size = len(content)
+
+            try:
+                optimized = await asyncio.to_thread(
+                    PdfService.optimize,
+                    content,
+                    settings.PDF_OPTIMIZE_TARGET_DPI,
+                    settings.PDF_OPTIMIZE_JPEG_QUALITY,
+                )
+            except Exception as e:
+                logger.error(f"PDF optimization failed for book {book_id}: {e}")
+                return None
+            del content
+
+            saved = original_size - len(optimized)
+            logger.info(
+                f"Optimized book {book_id}: {original_size} -> {len(optimized)} bytes "
+                f"({saved / original_size:.1%} saved)"
+            )
+            if saved < original_size * settings.PDF_OPTIMIZE_MIN_SAVING:
+                return None
+
+            file_url = await storage_service.upload_derived(
+                f"{book.user_id}/{book.id}/{OPTIMIZED_VARIANT}.pdf",
+                optimized,
+            )
+            variant = await db.get(BookVariant, (book.id, OPTIMIZED_VARIANT))
+            if variant is None:
+                variant = BookVariant(book_id=book.id, name=OPTIMIZED_VARIANT)
+                db.add(variant)
+            variant.file_url = file_url
+            variant.file_size = len(optimized)
+            variant.original_size = original_size
+            await db.commit()
+            return variant
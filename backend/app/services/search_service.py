@@ -0,0 +1,511 @@
+"""Full-text search over the library, highlights, notes and book content."""
+import html
+import re
+from typing import List, Optional
+
+from sqlalchemy import text, and_, or_, func
+from sqlalchemy.engine import Connection
+from sqlalchemy.sql.elements import ColumnElement
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models.book import Book
+
+
+SNIPPET_START = "<mark>"
+SNIPPET_END = "</mark>"
+SNIPPET_TOKENS = 12
+
+# The database marks matches with control characters; the snippet is then
+# HTML-escaped and only these are turned into SNIPPET_START/SNIPPET_END.
+_MARK_START = "\x02"
+_MARK_END = "\x03"
+_HEADLINE_OPTIONS = f"StartSel={_MARK_START}, StopSel={_MARK_END}, MaxWords={SNIPPET_TOKENS * 2}, MinWords=5"
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# SQLite: external-content FTS5 table kept in sync by triggers, so every
+# insert, update and (cascaded) delete on highlights updates the index.
+# Highlights have UUID keys and only an implicit rowid, which VACUUM may
+# renumber, so the index is keyed by a stable integer from a mapping table
+# and reads its content through a view joining the two.
+_SQLITE_HIGHLIGHT_INDEX = [
+    """
+    CREATE TABLE IF NOT EXISTS highlights_fts_keys (
+        id INTEGER PRIMARY KEY,
+        highlight_id VARCHAR(36) NOT NULL UNIQUE
+    )
+    """,
+    """
+    CREATE VIEW IF NOT EXISTS highlights_fts_content AS
+    SELECT k.id AS id, h.text AS text, h.note AS note
+    FROM highlights_fts_keys k JOIN highlights h ON h.id = k.highlight_id
+    """,
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS highlights_fts USING fts5(
+        text, note,
+        content='highlights_fts_content', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS highlights_fts_ai AFTER INSERT ON highlights BEGIN
+        INSERT INTO highlights_fts_keys(highlight_id) VALUES (new.id);
+        INSERT INTO highlights_fts(rowid, text, note)
+        VALUES ((SELECT id FROM highlights_fts_keys WHERE highlight_id = new.id), new.text, new.note);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS highlights_fts_ad AFTER DELETE ON highlights BEGIN
+        INSERT INTO highlights_fts(highlights_fts, rowid, text, note)
+        VALUES ('delete', (SELECT id FROM highlights_fts_keys WHERE highlight_id = old.id), old.text, old.note);
+        DELETE FROM highlights_fts_keys WHERE highlight_id = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS highlights_fts_au AFTER UPDATE OF text, note ON highlights BEGIN
+        INSERT INTO highlights_fts(highlights_fts, rowid, text, note)
+        VALUES ('delete', (SELECT id FROM highlights_fts_keys WHERE highlight_id = old.id), old.text, old.note);
+        INSERT INTO highlights_fts(rowid, text, note)
+        VALUES ((SELECT id FROM highlights_fts_keys WHERE highlight_id = new.id), new.text, new.note);
+    END
+    """,
+]
+
+# Rows written before the FTS table existed get keys, then the index is rebuilt
+_SQLITE_HIGHLIGHT_REBUILD = [
+    "INSERT OR IGNORE INTO highlights_fts_keys(highlight_id) SELECT id FROM highlights",
+    "INSERT INTO highlights_fts(highlights_fts) VALUES ('rebuild')",
+]
+
+# PostgreSQL: GIN expression index, maintained by the database itself.
+_PG_HIGHLIGHT_VECTOR = (
+    "to_tsvector('simple', coalesce(h.text, '') || ' ' || coalesce(h.note, ''))"
+)
+_PG_HIGHLIGHT_INDEX = [
+    """
+    CREATE INDEX IF NOT EXISTS ix_highlights_fts ON highlights
+    USING GIN (to_tsvector('simple', coalesce(text, '') || ' ' || coalesce(note, '')))
+    """,
+]
+
+_SQLITE_CONTENT_INDEX = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS book_contents_fts USING fts5(
+        text,
+        content='book_contents', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS book_contents_fts_ai AFTER INSERT ON book_contents BEGIN
+        INSERT INTO book_contents_fts(rowid, text) VALUES (new.id, new.text);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS book_contents_fts_ad AFTER DELETE ON book_contents BEGIN
+        INSERT INTO book_contents_fts(book_contents_fts, rowid, text)
+        VALUES ('delete', old.id, old.text);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS book_contents_fts_au AFTER UPDATE OF text ON book_contents BEGIN
+        INSERT INTO book_contents_fts(book_contents_fts, rowid, text)
+        VALUES ('delete', old.id, old.text);
+        INSERT INTO book_contents_fts(rowid, text) VALUES (new.id, new.text);
+    END
+    """,
+]
+
+_SQLITE_CONTENT_REBUILD = [
+    "INSERT INTO book_contents_fts(book_contents_fts) VALUES ('rebuild')",
+]
+
+_PG_CONTENT_VECTOR = "to_tsvector('simple', c.text)"
+_PG_CONTENT_INDEX = [
+    """
+    CREATE INDEX IF NOT EXISTS ix_book_contents_fts ON book_contents
+    USING GIN (to_tsvector('simple', text))
+    """,
+]
+
+# Library title/author search: trigram indexes support substring matching.
+# Keyed through a mapping table like the highlight index, for the same reason.
+_SQLITE_BOOK_INDEX = [
+    """
+    CREATE TABLE IF NOT EXISTS books_fts_keys (
+        id INTEGER PRIMARY KEY,
+        book_id VARCHAR(36) NOT NULL UNIQUE
+    )
+    """,
+    """
+    CREATE VIEW IF NOT EXISTS books_fts_content AS
+    SELECT k.id AS id, b.title AS title, b.author AS author
+    FROM books_fts_keys k JOIN books b ON b.id = k.book_id
+    """,
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5(
+        title, author,
+        content='books_fts_content', content_rowid='id',
+        tokenize='trigram'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS books_fts_ai AFTER INSERT ON books BEGIN
+        INSERT INTO books_fts_keys(book_id) VALUES (new.id);
+        INSERT INTO books_fts(rowid, title, author)
+        VALUES ((SELECT id FROM books_fts_keys WHERE book_id = new.id), new.title, new.author);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS books_fts_ad AFTER DELETE ON books BEGIN
+        INSERT INTO books_fts(books_fts, rowid, title, author)
+        VALUES ('delete', (SELECT id FROM books_fts_keys WHERE book_id = old.id), old.title, old.author);
+        DELETE FROM books_fts_keys WHERE book_id = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS books_fts_au AFTER UPDATE OF title, author ON books BEGIN
+        INSERT INTO books_fts(books_fts, rowid, title, author)
+        VALUES ('delete', (SELECT id FROM books_fts_keys WHERE book_id = old.id), old.title, old.author);
+        INSERT INTO books_fts(rowid, title, author)
+        VALUES ((SELECT id FROM books_fts_keys WHERE book_id = new.id), new.title, new.author);
+    END
+    """,
+]
+
+_SQLITE_BOOK_REBUILD = [
+    "INSERT OR IGNORE INTO books_fts_keys(book_id) SELECT id FROM books",
+    "INSERT INTO books_fts(books_fts) VALUES ('rebuild')",
+]
+
+_PG_BOOK_INDEX = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_books_title_trgm ON books USING GIN (lower(title) gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_books_author_trgm ON books USING GIN (lower(author) gin_trgm_ops)",
+]
+
+# Trigram queries need at least this many characters to use the index
+_TRIGRAM_MIN_LENGTH = 3
+
+_HIGHLIGHT_COLUMNS = (
+    "h.id, h.user_id, h.book_id, h.text, h.page_number, h.cfi, "
+    "h.color, h.note, h.created_at"
+)
+
+
+class SearchService:
+    # Set once the SQLite trigram index on book titles/authors is available
+    books_fts_enabled = False
+
+    @staticmethod
+    def create_indexes(conn: Connection) -> None:
+        """Create the full-text indexes if they do not exist yet."""
+        SearchService._create_index(
+            conn, "highlights_fts", _SQLITE_HIGHLIGHT_INDEX, _SQLITE_HIGHLIGHT_REBUILD, _PG_HIGHLIGHT_INDEX
+        )
+        SearchService._create_index(
+            conn, "book_contents_fts", _SQLITE_CONTENT_INDEX, _SQLITE_CONTENT_REBUILD, _PG_CONTENT_INDEX
+        )
+
+        # The trigram tokenizer (SQLite 3.34+) and pg_trgm are optional;
+        # title/author search falls back to plain LIKE without them.
+        try:
+            with conn.begin_nested():
+                SearchService._create_index(
+                    conn, "books_fts", _SQLITE_BOOK_INDEX, _SQLITE_BOOK_REBUILD, _PG_BOOK_INDEX
+                )
+            SearchService.books_fts_enabled = conn.dialect.name == "sqlite"
+        except Exception:
+            SearchService.books_fts_enabled = False
+
+    @staticmethod
+    def detect_indexes(conn: Connection) -> None:
+        """Set the flags ``create_indexes`` would set, without creating anything."""
+        SearchService.books_fts_enabled = conn.dialect.name == "sqlite" and conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'books_fts'")
+        ).first() is not None
+
+    @staticmethod
+    def index_statements() -> List[str]:
+        """Every statement ``create_indexes`` may run, to fingerprint the schema."""
+        return (
+            _SQLITE_HIGHLIGHT_INDEX + _SQLITE_HIGHLIGHT_REBUILD + _PG_HIGHLIGHT_INDEX
+            + _SQLITE_CONTENT_INDEX + _SQLITE_CONTENT_REBUILD + _PG_CONTENT_INDEX
+            + _SQLITE_BOOK_INDEX + _SQLITE_BOOK_REBUILD + _PG_BOOK_INDEX
+        )
+
+    @staticmethod
+    def _create_index(
+        conn: Connection,
+        fts_table: str,
+        sqlite_statements: List[str],
+        sqlite_rebuild: List[str],
+        pg_statements: List[str],
+    ) -> None:
+        dialect = conn.dialect.name
+        if dialect == "sqlite":
+            exists = SearchService._drop_outdated_index(conn, fts_table, sqlite_statements)
+            for statement in sqlite_statements:
+                conn.execute(text(statement))
+            if not exists:
+                # Index rows written before the FTS table existed
+                for statement in sqlite_rebuild:
+                    conn.execute(text(statement))
+        elif dialect == "postgresql":
+            for statement in pg_statements:
+                conn.execute(text(statement))
+
+    @staticmethod
+    def _drop_outdated_index(conn: Connection, fts_table: str, sqlite_statements: List[str]) -> bool:
+        """
+        Drop an FTS table, its triggers and views if it was created with a
+        different definition (e.g. keyed by the implicit rowid), so it is
+        created and rebuilt anew.
+
+        Returns:
+            True if an up-to-date FTS table exists
+        """
+        stored = conn.execute(
+            text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {"name": fts_table},
+        ).scalar_one_or_none()
+        if stored is None:
+            return False
+        wanted = next(s for s in sqlite_statements if "VIRTUAL TABLE" in s).replace("IF NOT EXISTS ", "")
+        if " ".join(stored.split()) == " ".join(wanted.split()):
+            return True
+        dependents = conn.execute(
+            text(
+                "SELECT type, name FROM sqlite_master "
+                "WHERE type IN ('trigger', 'view') AND name LIKE :prefix ESCAPE '\\'"
+            ),
+            {"prefix": f"{fts_table}\\_%"},
+        ).all()
+        for kind, name in dependents:
+            conn.execute(text(f"DROP {kind.upper()} IF EXISTS {name}"))
+        conn.execute(text(f"DROP TABLE {fts_table}"))
+        return False
+
+    @staticmethod
+    def tokenize_query(query: str) -> List[str]:
+        """Split free-form user input into plain search terms."""
+        return _TOKEN_RE.findall(query.lower())
+
+    @staticmethod
+    def book_match_condition(
+        dialect: str,
+        query: str,
+        prefix: bool = False,
+    ) -> ColumnElement:
+        """
+        Build a WHERE clause matching books whose title or author contains
+        (or, with ``prefix``, starts with) the query, case-insensitively.
+        """
+        needle = query.strip().lower()
+        escaped = needle.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        pattern = f"{escaped}%" if prefix else f"%{escaped}%"
+        condition = or_(
+            func.lower(Book.title).like(pattern, escape="\\"),
+            func.lower(Book.author).like(pattern, escape="\\"),
+        )
+
+        if (
+            dialect == "sqlite"
+            and SearchService.books_fts_enabled
+            and len(needle) >= _TRIGRAM_MIN_LENGTH
+        ):
+            # Narrow candidates through the trigram index, then apply the
+            # exact LIKE check (the index matches substrings anywhere)
+            phrase = needle.replace('"', '""')
+            candidates = text(
+                "books.id IN (SELECT k.book_id FROM books_fts "
+                "JOIN books_fts_keys k ON k.id = books_fts.rowid WHERE books_fts MATCH :book_match)"
+            ).bindparams(book_match=f'"{phrase}"')
+            return and_(candidates, condition)
+        # PostgreSQL answers LIKE on lower(...) from the pg_trgm GIN indexes
+        return condition
+
+    @staticmethod
+    def snippet_html(snippet: Optional[str]) -> Optional[str]:
+        """Escape a snippet of stored text and mark its matches with ``<mark>``."""
+        if snippet is None:
+            return None
+        escaped = html.escape(snippet, quote=False)
+        return escaped.replace(_MARK_START, SNIPPET_START).replace(_MARK_END, SNIPPET_END)
+
+    @staticmethod
+    def _sqlite_match(terms: List[str]) -> str:
+        # Quote every term so user input cannot inject FTS5 query syntax
+        match = " ".join(f'"{t}"' for t in terms[:-1])
+        return f'{match} "{terms[-1]}"*'.strip()
+
+    @staticmethod
+    def _pg_tsquery(terms: List[str]) -> str:
+        return " & ".join(terms[:-1] + [f"{terms[-1]}:*"])
+
+    @staticmethod
+    async def search_highlights(
+        db: AsyncSession,
+        user_id: str,
+        query: str,
+        page: int = 1,
+        per_page: int = 20,
+    ) -> tuple[List[dict], int]:
+        """
+        Search a user's highlights and notes.
+
+        All terms must match; the last one is treated as a prefix so results
+        update while the user is typing.
+
+        Returns:
+            Tuple of (ranked result rows, total match count)
+        """
+        terms = SearchService.tokenize_query(query)
+        if not terms:
+            return [], 0
+
+        offset = (page - 1) * per_page
+        dialect = db.bind.dialect.name
+
+        if dialect == "sqlite":
+            params = {"user_id": user_id, "match": SearchService._sqlite_match(terms)}
+            base = (
+                "FROM highlights_fts "
+                "JOIN highlights_fts_keys k ON k.id = highlights_fts.rowid "
+                "JOIN highlights h ON h.id = k.highlight_id "
+                "WHERE highlights_fts MATCH :match AND h.user_id = :user_id"
+            )
+            rows_sql = (
+                f"SELECT {_HIGHLIGHT_COLUMNS}, "
+                f"snippet(highlights_fts, 0, '{_MARK_START}', '{_MARK_END}', '…', {SNIPPET_TOKENS}) AS text_snippet, "
+                f"snippet(highlights_fts, 1, '{_MARK_START}', '{_MARK_END}', '…', {SNIPPET_TOKENS}) AS note_snippet, "
+                f"-bm25(highlights_fts) AS rank "
+                f"{base} ORDER BY bm25(highlights_fts) LIMIT :limit OFFSET :offset"
+            )
+        elif dialect == "postgresql":
+            params = {
+                "user_id": user_id,
+                "tsquery": SearchService._pg_tsquery(terms),
+                "headline": _HEADLINE_OPTIONS,
+            }
+            base = (
+                "FROM highlights h, to_tsquery('simple', :tsquery) q "
+                f"WHERE h.user_id = :user_id AND {_PG_HIGHLIGHT_VECTOR} @@ q"
+            )
+            rows_sql = (
+                f"SELECT {_HIGHLIGHT_COLUMNS}, "
+                f"ts_headline('simple', h.text, q, :headline) AS text_snippet, "
+                f"CASE WHEN h.note IS NULL THEN NULL ELSE ts_headline('simple', h.note, q, :headline) END AS note_snippet, "
+                f"ts_rank({_PG_HIGHLIGHT_VECTOR}, q) AS rank "
+                f"{base} ORDER BY rank DESC LIMIT :limit OFFSET :offset"
+            )
+        else:
+            # No full-text support: fall back to unranked substring matching
+            params = {"user_id": user_id}
+            conditions = []
+            for i, term in enumerate(terms):
+                params[f"term{i}"] = f"%{term}%"
+                conditions.append(
+                    f"(lower(h.text) LIKE :term{i} OR lower(coalesce(h.note, '')) LIKE :term{i})"
+                )
+            base = f"FROM highlights h WHERE h.user_id = :user_id AND {' AND '.join(conditions)}"
+            rows_sql = (
+                f"SELECT {_HIGHLIGHT_COLUMNS}, NULL AS text_snippet, NULL AS note_snippet, 0.0 AS rank "
+                f"{base} ORDER BY h.created_at DESC LIMIT :limit OFFSET :offset"
+            )
+
+        total = (await db.execute(text(f"SELECT count(*) {base}"), params)).scalar_one()
+        if total == 0 or offset >= total:
+            return [], total
+
+        result = await db.execute(
+            text(rows_sql),
+            {**params, "limit": per_page, "offset": offset},
+        )
+        rows = []
+        for row in result.mappings().all():
+            row = dict(row)
+            row["text_snippet"] = SearchService.snippet_html(row["text_snippet"])
+            row["note_snippet"] = SearchService.snippet_html(row["note_snippet"])
+            rows.append(row)
+        return rows, total
+
+    @staticmethod
+    async def search_content(
+        db: AsyncSession,
+        user_id: str,
+        query: str,
+        page: int = 1,
+        per_page: int = 20,
+    ) -> tuple[List[dict], int]:
+        """
+        Search the extracted text of a user's books.
+
+        Each hit is one PDF page or EPUB spine item, with a snippet around
+        the matched terms.
+
+        Returns:
+            Tuple of (ranked result rows, total match count)
+        """
+        terms = SearchService.tokenize_query(query)
+        if not terms:
+            return [], 0
+
+        offset = (page - 1) * per_page
+        dialect = db.bind.dialect.name
+        columns = "c.book_id, b.title, b.file_type, c.location, c.href, c.cfi"
+
+        if dialect == "sqlite":
+            params = {"user_id": user_id, "match": SearchService._sqlite_match(terms)}
+            base = (
+                "FROM book_contents_fts "
+                "JOIN book_contents c ON c.id = book_contents_fts.rowid "
+                "JOIN books b ON b.id = c.book_id "
+                "WHERE book_contents_fts MATCH :match AND c.user_id = :user_id"
+            )
+            rows_sql = (
+                f"SELECT {columns}, "
+                f"snippet(book_contents_fts, 0, '{_MARK_START}', '{_MARK_END}', '…', {SNIPPET_TOKENS * 2}) AS snippet, "
+                f"-bm25(book_contents_fts) AS rank "
+                f"{base} ORDER BY bm25(book_contents_fts) LIMIT :limit OFFSET :offset"
+            )
+        elif dialect == "postgresql":
+            params = {
+                "user_id": user_id,
+                "tsquery": SearchService._pg_tsquery(terms),
+                "headline": _HEADLINE_OPTIONS,
+            }
+            base = (
+                "FROM book_contents c JOIN books b ON b.id = c.book_id, "
+                "to_tsquery('simple', :tsquery) q "
+                f"WHERE c.user_id = :user_id AND {_PG_CONTENT_VECTOR} @@ q"
+            )
+            rows_sql = (
+                f"SELECT {columns}, "
+                f"ts_headline('simple', c.text, q, :headline) AS snippet, "
+                f"ts_rank({_PG_CONTENT_VECTOR}, q) AS rank "
+                f"{base} ORDER BY rank DESC LIMIT :limit OFFSET :offset"
+            )
+        else:
+            return [], 0
+
+        total = (await db.execute(text(f"SELECT count(*) {base}"), params)).scalar_one()
+        if total == 0 or offset >= total:
+            return [], total
+
+        result = await db.execute(
+            text(rows_sql),
+            {**params, "limit": per_page, "offset": offset},
+        )
+        rows = []
+        for row in result.mappings().all():
+            row = dict(row)
+            row["snippet"] = SearchService.snippet_html(row["snippet"])
+            is_pdf = str(row.pop("file_type")).lower().endswith("pdf")
+            row["page_number"] = row["location"] + 1 if is_pdf else None
+            rows.append(row)
+        return rows, total
+
+    @staticmethod
+    def page_count(total: int, per_page: int) -> int:
+        return (total + per_page - 1) // per_page if per_page else 0
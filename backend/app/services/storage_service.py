@@ -1,16 +1,73 @@
+import base64
+import hashlib
+import hmac
+import io
+import logging
 import os
+import time
+import shutil
 import uuid
 import aiofiles
-from typing import Optional
+from contextlib import asynccontextmanager
+from typing import Optional, List, BinaryIO, AsyncIterator, Callable
 from pathlib import Path
+from urllib.parse import quote
 
 from ..config import settings
+from ..utils.metrics import STORAGE_READ_BYTES, STORAGE_WRITTEN_BYTES
+
+logger = logging.getLogger(__name__)
+
+# Storage folders whose files may be served through signed URLs
+PUBLIC_FOLDERS = ("covers", "avatars", "derived")
+
+# Bytes fetched per ranged GET by streams opened with ``ranged=True``
+_RANGE_BLOCK_SIZE = 256 * 1024
+
+
+class _RangeReader(io.RawIOBase):
+    """Seekable read-only view of a stored object, read with ranged GETs."""
+
+    def __init__(self, read_range: Callable[[int, int], Optional[bytes]], size: int):
+        self._read_range = read_range
+        self._size = size
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += self._size
+        self._position = max(0, offset)
+        return self._position
+
+    def readinto(self, buffer) -> int:
+        length = min(len(buffer), self._size - self._position)
+        if length <= 0:
+            return 0
+        data = self._read_range(self._position, length)
+        if data is None:
+            raise OSError("Stored file could not be read")
+        buffer[:len(data)] = data
+        self._position += len(data)
+        return len(data)
 
 
 class StorageService:
     def __init__(self):
         self.provider = settings.STORAGE_PROVIDER
         self.local_path = Path(settings.LOCAL_STORAGE_PATH)
+        self._s3 = None
+        self._local_root: Optional[str] = None
         self._ensure_local_dirs()
 
     def _ensure_local_dirs(self):
@@ -19,6 +76,11 @@ class StorageService:
             (self.local_path / "books").mkdir(parents=True, exist_ok=True)
             (self.local_path / "covers").mkdir(parents=True, exist_ok=True)
             (self.local_path / "avatars").mkdir(parents=True, exist_ok=True)
+            (self.local_path / "derived").mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def content_hash(content: bytes) -> str:
+        return hashlib.sha256(content).hexdigest()[:16]
 
     async def upload_book(
         self,
@@ -41,8 +103,12 @@ class StorageService:
         book_id: str,
         file_content: bytes,
     ) -> str:
-        """Upload a book cover and return the storage URL/path."""
-        filename = f"{user_id}/{book_id}.jpg"
+        """Upload a book cover and return the storage URL/path.
+
+        The name carries a hash of the content, so a changed cover gets a new
+        URL and served covers can be cached as immutable.
+        """
+        filename = f"{user_id}/{book_id}-{self.content_hash(file_content)}.jpg"
 
         if self.provider == "local":
             return await self._upload_local(filename, file_content, "covers")
@@ -54,14 +120,40 @@ class StorageService:
         user_id: str,
         file_content: bytes,
     ) -> str:
-        """Upload a user avatar and return the storage URL/path."""
-        filename = f"{user_id}.jpg"
+        """Upload a user avatar and return the storage URL/path (content-hashed, see upload_cover)."""
+        filename = f"{user_id}-{self.content_hash(file_content)}.jpg"
 
         if self.provider == "local":
             return await self._upload_local(filename, file_content, "avatars")
         else:
             return await self._upload_s3(filename, file_content, "avatars")
 
+    async def upload_derived(self, filename: str, file_content: bytes) -> str:
+        """
+        Store a file derived from a book (page ranges, optimized variants...).
+
+        Derived files live under ``derived/{user_id}/{book_id}/`` so they can
+        be found again from their name alone and removed with the book.
+        """
+        if self.provider == "local":
+            return await self._upload_local(filename, file_content, "derived")
+        else:
+            return await self._upload_s3(filename, file_content, "derived")
+
+    async def get_derived(self, filename: str) -> Optional[bytes]:
+        """Get a derived file by name, or None if it was never generated."""
+        if self.provider == "local":
+            return await self._get_local(str(self.local_path / "derived" / filename))
+        else:
+            return await self._get_s3(f"derived/{filename}")
+
+    async def delete_derived(self, prefix: str) -> None:
+        """Delete every derived file under ``prefix`` (a book or user)."""
+        if self.provider == "local":
+            shutil.rmtree(self.local_path / "derived" / prefix, ignore_errors=True)
+        else:
+            await self._delete_prefix_s3(f"derived/{prefix}/")
+
     async def get_book(self, file_path: str) -> Optional[bytes]:
         """Get book file content."""
         if self.provider == "local":
@@ -69,6 +161,60 @@ class StorageService:
         else:
             return await self._get_s3(file_path)
 
+    def local_file_path(self, file_path: str) -> Optional[str]:
+        """Path on disk of a stored file, or None if it is not stored locally."""
+        if self.provider == "local" and os.path.isfile(file_path):
+            return file_path
+        return None
+
+    @asynccontextmanager
+    async def open_stream(self, file_path: str, ranged: bool = False) -> AsyncIterator[Optional[BinaryIO]]:
+        """
+        Open a stored file as a seekable stream, or None if it is missing or empty.
+
+        Local files are read in place so only the parts a parser touches are
+        loaded; other providers download the file first. With ``ranged`` they
+        are read on demand with ranged GETs instead, which block: use such a
+        stream from a worker thread only.
+        """
+        local_path = self.local_file_path(file_path)
+        if local_path is not None:
+            with open(local_path, "rb") as f:
+                if f.seek(0, io.SEEK_END) == 0:
+                    yield None
+                    return
+                f.seek(0)
+                yield f
+            return
+
+        if ranged:
+            size = await self.get_size(file_path)
+            if not size:
+                yield None
+                return
+            reader = _RangeReader(lambda start, length: self._fetch_range_s3(file_path, start, length), size)
+            yield io.BufferedReader(reader, buffer_size=_RANGE_BLOCK_SIZE)
+            return
+
+        content = await self.get_book(file_path)
+        yield io.BytesIO(content) if content else None
+
+    async def get_size(self, file_path: str) -> Optional[int]:
+        """Get the size of a stored file in bytes."""
+        if self.provider == "local":
+            return await self._get_size_local(file_path)
+        else:
+            return await self._get_size_s3(file_path)
+
+    async def read_range(self, file_path: str, start: int, length: int) -> Optional[bytes]:
+        """Read ``length`` bytes of a stored file starting at ``start``."""
+        if length <= 0:
+            return b""
+        if self.provider == "local":
+            return await self._read_range_local(file_path, start, length)
+        else:
+            return await self._read_range_s3(file_path, start, length)
+
     async def delete_book(self, file_path: str) -> bool:
         """Delete a book file."""
         if self.provider == "local":
@@ -83,6 +229,14 @@ class StorageService:
         else:
             return await self._delete_s3(file_path)
 
+    async def delete_files(self, file_paths: List[str]) -> None:
+        """Delete several stored files, ignoring ones that are already gone."""
+        for file_path in file_paths:
+            if self.provider == "local":
+                await self._delete_local(file_path)
+            else:
+                await self._delete_s3(file_path)
+
     # Local storage methods
     async def _upload_local(
         self,
@@ -96,14 +250,33 @@ class StorageService:
         async with aiofiles.open(file_path, "wb") as f:
             await f.write(content)
 
+        STORAGE_WRITTEN_BYTES.inc((self.provider,), len(content))
         return str(file_path)
 
     async def _get_local(self, file_path: str) -> Optional[bytes]:
         try:
             async with aiofiles.open(file_path, "rb") as f:
-                return await f.read()
+                content = await f.read()
+        except FileNotFoundError:
+            return None
+        STORAGE_READ_BYTES.inc((self.provider,), len(content))
+        return content
+
+    async def _get_size_local(self, file_path: str) -> Optional[int]:
+        try:
+            return os.path.getsize(file_path)
+        except FileNotFoundError:
+            return None
+
+    async def _read_range_local(self, file_path: str, start: int, length: int) -> Optional[bytes]:
+        try:
+            async with aiofiles.open(file_path, "rb") as f:
+                await f.seek(start)
+                content = await f.read(length)
         except FileNotFoundError:
             return None
+        STORAGE_READ_BYTES.inc((self.provider,), len(content))
+        return content
 
     async def _delete_local(self, file_path: str) -> bool:
         try:
@@ -119,24 +292,13 @@ class StorageService:
         content: bytes,
         folder: str,
     ) -> str:
-        import boto3
-        from botocore.config import Config
-
-        s3_client = boto3.client(
-            "s3",
-            endpoint_url=settings.STORAGE_ENDPOINT_URL,
-            aws_access_key_id=settings.STORAGE_ACCESS_KEY,
-            aws_secret_access_key=settings.STORAGE_SECRET_KEY,
-            region_name=settings.STORAGE_REGION,
-            config=Config(signature_version="s3v4"),
-        )
-
         key = f"{folder}/{filename}"
-        s3_client.put_object(
+        self._s3_client().put_object(
             Bucket=settings.STORAGE_BUCKET,
             Key=key,
             Body=content,
         )
+        STORAGE_WRITTEN_BYTES.inc((self.provider,), len(content))
 
         # Return the S3 URL
         if settings.STORAGE_ENDPOINT_URL:
@@ -144,73 +306,173 @@ class StorageService:
         return f"https://{settings.STORAGE_BUCKET}.s3.amazonaws.com/{key}"
 
     async def _get_s3(self, file_path: str) -> Optional[bytes]:
-        import boto3
-        from botocore.config import Config
         from botocore.exceptions import ClientError
 
-        s3_client = boto3.client(
-            "s3",
-            endpoint_url=settings.STORAGE_ENDPOINT_URL,
-            aws_access_key_id=settings.STORAGE_ACCESS_KEY,
-            aws_secret_access_key=settings.STORAGE_SECRET_KEY,
-            region_name=settings.STORAGE_REGION,
-            config=Config(signature_version="s3v4"),
-        )
-
         try:
             # Extract key from URL
             key = file_path.split(f"{settings.STORAGE_BUCKET}/")[-1]
-            response = s3_client.get_object(Bucket=settings.STORAGE_BUCKET, Key=key)
-            return response["Body"].read()
+            response = self._s3_client().get_object(Bucket=settings.STORAGE_BUCKET, Key=key)
+            content = response["Body"].read()
         except ClientError:
             return None
+        STORAGE_READ_BYTES.inc((self.provider,), len(content))
+        return content
+
+    def _s3_client(self):
+        """Shared boto3 client; clients are thread-safe and costly to create."""
+        if self._s3 is None:
+            import boto3
+            from botocore.config import Config
+
+            self._s3 = boto3.client(
+                "s3",
+                endpoint_url=settings.STORAGE_ENDPOINT_URL,
+                aws_access_key_id=settings.STORAGE_ACCESS_KEY,
+                aws_secret_access_key=settings.STORAGE_SECRET_KEY,
+                region_name=settings.STORAGE_REGION,
+                config=Config(signature_version="s3v4"),
+            )
+        return self._s3
+
+    def warm_up(self) -> None:
+        """
+        Create the S3 client and open its first connection, so the first
+        request does not pay for the TLS handshake. Blocking; run it in a
+        thread. Local storage needs no warm-up.
+        """
+        if self.provider == "local":
+            return
+        from botocore.exceptions import BotoCoreError, ClientError
 
-    async def _delete_s3(self, file_path: str) -> bool:
-        import boto3
-        from botocore.config import Config
+        try:
+            self._s3_client().head_bucket(Bucket=settings.STORAGE_BUCKET)
+        except (BotoCoreError, ClientError) as e:
+            logger.warning(f"Storage warm-up failed: {e}")
+
+    async def _get_size_s3(self, file_path: str) -> Optional[int]:
         from botocore.exceptions import ClientError
 
-        s3_client = boto3.client(
-            "s3",
-            endpoint_url=settings.STORAGE_ENDPOINT_URL,
-            aws_access_key_id=settings.STORAGE_ACCESS_KEY,
-            aws_secret_access_key=settings.STORAGE_SECRET_KEY,
-            region_name=settings.STORAGE_REGION,
-            config=Config(signature_version="s3v4"),
-        )
+        try:
+            key = file_path.split(f"{settings.STORAGE_BUCKET}/")[-1]
+            response = self._s3_client().head_object(Bucket=settings.STORAGE_BUCKET, Key=key)
+            return response["ContentLength"]
+        except ClientError:
+            return None
+
+    async def _read_range_s3(self, file_path: str, start: int, length: int) -> Optional[bytes]:
+        return self._fetch_range_s3(file_path, start, length)
+
+    def _fetch_range_s3(self, file_path: str, start: int, length: int) -> Optional[bytes]:
+        from botocore.exceptions import ClientError
+
+        try:
+            key = file_path.split(f"{settings.STORAGE_BUCKET}/")[-1]
+            response = self._s3_client().get_object(
+                Bucket=settings.STORAGE_BUCKET,
+                Key=key,
+                Range=f"bytes={start}-{start + length - 1}",
+            )
+            content = response["Body"].read()
+        except ClientError:
+            return None
+        STORAGE_READ_BYTES.inc((self.provider,), len(content))
+        return content
+
+    async def _delete_prefix_s3(self, prefix: str) -> None:
+        from botocore.exceptions import ClientError
+
+        s3_client = self._s3_client()
+        try:
+            paginator = s3_client.get_paginator("list_objects_v2")
+            for page in paginator.paginate(Bucket=settings.STORAGE_BUCKET, Prefix=prefix):
+                objects = [{"Key": obj["Key"]} for obj in page.get("Contents", [])]
+                if objects:
+                    s3_client.delete_objects(
+                        Bucket=settings.STORAGE_BUCKET,
+                        Delete={"Objects": objects, "Quiet": True},
+                    )
+        except ClientError:
+            pass
+
+    async def _delete_s3(self, file_path: str) -> bool:
+        from botocore.exceptions import ClientError
 
         try:
             key = file_path.split(f"{settings.STORAGE_BUCKET}/")[-1]
-            s3_client.delete_object(Bucket=settings.STORAGE_BUCKET, Key=key)
+            self._s3_client().delete_object(Bucket=settings.STORAGE_BUCKET, Key=key)
             return True
         except ClientError:
             return False
 
-    def get_signed_url(self, file_path: str, expires_in: int = 3600) -> str:
-        """Generate a signed URL for file access."""
+    def get_signed_url(self, file_path: str, expires_in: Optional[int] = None) -> str:
+        """
+        Generate a signed, expiring URL for file access.
+
+        Local files are served by ``/api/v1/files``. The expiry is rounded up
+        to FILE_URL_WINDOW_SECONDS so the URL of a file stays the same, and
+        client caches stay warm, for a whole window.
+        """
+        expires_in = expires_in or settings.FILE_URL_EXPIRE_SECONDS
         if self.provider == "local":
-            # For local storage, return the file path
-            # In production, you'd serve this through your API
-            return f"/api/v1/files/{file_path}"
-
-        import boto3
-        from botocore.config import Config
-
-        s3_client = boto3.client(
-            "s3",
-            endpoint_url=settings.STORAGE_ENDPOINT_URL,
-            aws_access_key_id=settings.STORAGE_ACCESS_KEY,
-            aws_secret_access_key=settings.STORAGE_SECRET_KEY,
-            region_name=settings.STORAGE_REGION,
-            config=Config(signature_version="s3v4"),
-        )
+            relative = self.relative_path(file_path)
+            if relative is None:
+                return file_path
+            window = max(settings.FILE_URL_WINDOW_SECONDS, 1)
+            expires = ((int(time.time()) + expires_in) // window + 1) * window
+            signature = self.sign_file_path(relative, expires)
+            base = (settings.PUBLIC_BASE_URL or "").rstrip("/")
+            return f"{base}{settings.API_V1_PREFIX}/files/{quote(relative)}?expires={expires}&sig={signature}"
 
         key = file_path.split(f"{settings.STORAGE_BUCKET}/")[-1]
-        return s3_client.generate_presigned_url(
+        return self._s3_client().generate_presigned_url(
             "get_object",
             Params={"Bucket": settings.STORAGE_BUCKET, "Key": key},
             ExpiresIn=expires_in,
         )
 
+    @staticmethod
+    def url_window() -> int:
+        """Index of the current file URL window; signed local URLs change when it does."""
+        return int(time.time()) // max(settings.FILE_URL_WINDOW_SECONDS, 1)
+
+    def relative_path(self, file_path: str) -> Optional[str]:
+        """Path of a local file relative to the storage root, or None if outside it."""
+        if self._local_root is None:
+            # Resolved once: this runs for every cover URL of a library listing
+            self._local_root = str(self.local_path.resolve())
+        path = os.path.abspath(file_path)
+        if not path.startswith(self._local_root + os.sep):
+            return None
+        return path[len(self._local_root) + 1:].replace(os.sep, "/")
+
+    @staticmethod
+    def sign_file_path(relative_path: str, expires: int) -> str:
+        message = f"{relative_path}:{expires}".encode()
+        digest = hmac.new(f"files:{settings.SECRET_KEY}".encode(), message, hashlib.sha256).digest()
+        return base64.urlsafe_b64encode(digest[:18]).decode()
+
+    def resolve_signed_file(self, relative_path: str, expires: int, signature: str) -> Optional[Path]:
+        """
+        Check a signed file URL and return the file it points to.
+
+        Only covers, avatars and derived assets can be served this way; book
+        files always go through the authenticated download endpoints.
+
+        Returns:
+            Path of the file, or None if the signature is invalid or expired,
+            or the file is missing
+        """
+        if expires < time.time():
+            return None
+        expected = self.sign_file_path(relative_path, expires)
+        if not hmac.compare_digest(expected, signature):
+            return None
+        if relative_path.split("/", 1)[0] not in PUBLIC_FOLDERS:
+            return None
+        path = (self.local_path / relative_path).resolve()
+        if self.local_path.resolve() not in path.parents or not path.is_file():
+            return None
+        return path
+
 
 storage_service = StorageService()
@@ -0,0 +1,129 @@
+"""Per-user and per-book change counters for conditional GET."""
+import hashlib
+from typing import Optional
+
+from sqlalchemy import select, delete, update, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models.book import Book
+from ..models.data_version import DataVersion
+from .cache_service import cache_service
+
+# The user's book list, which also depends on reading progress (state filter, last_read sort)
+LIBRARY = "library"
+
+
+def book_scope(book_id: str) -> str:
+    """Scope of a book's bookmarks and highlights."""
+    return f"book:{book_id}"
+
+
+class VersionService:
+    @staticmethod
+    async def get(db: AsyncSession, user_id: str, scope: str) -> int:
+        """Current version of a scope; 0 if it was never written."""
+        result = await db.execute(
+            select(DataVersion.version).where(
+                DataVersion.user_id == user_id,
+                DataVersion.scope == scope,
+            )
+        )
+        return result.scalar_one_or_none() or 0
+
+    @staticmethod
+    async def get_book_version(db: AsyncSession, user_id: str, book_id: str) -> Optional[int]:
+        """
+        Current version of a book's scope, checking in the same query that
+        the book belongs to the user.
+
+        Returns:
+            The version (0 if never written), or None if the user has no such book
+        """
+        result = await db.execute(
+            select(DataVersion.version)
+            .select_from(Book)
+            .outerjoin(
+                DataVersion,
+                and_(DataVersion.user_id == Book.user_id, DataVersion.scope == book_scope(book_id)),
+            )
+            .where(Book.id == book_id, Book.user_id == user_id)
+        )
+        row = result.first()
+        if row is None:
+            return None
+        return row.version or 0
+
+    @staticmethod
+    async def bump(db: AsyncSession, user_id: str, *scopes: str) -> None:
+        """
+        Increment the versions of the given scopes and drop their cached
+        responses.
+
+        Runs in the caller's transaction so the new version becomes visible
+        together with the write it describes. The caller commits. Cache keys
+        include the version, so a response cached by a concurrent request
+        for the old version is never served for the new one.
+        """
+        dialect = db.get_bind().dialect.name
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        elif dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            insert = None
+
+        for scope in scopes:
+            if insert is not None:
+                # Single atomic upsert, safe against concurrent first writes
+                await db.execute(
+                    insert(DataVersion)
+                    .values(user_id=user_id, scope=scope, version=1)
+                    .on_conflict_do_update(
+                        index_elements=[DataVersion.user_id, DataVersion.scope],
+                        set_={"version": DataVersion.version + 1},
+                    )
+                )
+                continue
+            result = await db.execute(
+                update(DataVersion)
+                .where(DataVersion.user_id == user_id, DataVersion.scope == scope)
+                .values(version=DataVersion.version + 1)
+            )
+            if result.rowcount == 0:
+                db.add(DataVersion(user_id=user_id, scope=scope, version=1))
+                await db.flush()
+        for scope in scopes:
+            await cache_service.invalidate(user_id, scope)
+
+    @staticmethod
+    async def forget(db: AsyncSession, user_id: str, scope: str) -> None:
+        """Drop the counter of a scope that no longer exists (e.g. a deleted book)."""
+        await db.execute(
+            delete(DataVersion).where(DataVersion.user_id == user_id, DataVersion.scope == scope)
+        )
+        await cache_service.invalidate(user_id, scope)
+
+    @staticmethod
+    def etag(version: int, *parts: str) -> str:
+        """
+        Weak ETag for a response derived from a versioned scope. ``parts``
+        holds everything else the body depends on, such as query parameters.
+        """
+        digest = hashlib.sha1("\0".join(parts).encode()).hexdigest()[:12]
+        return f'W/"{version}-{digest}"'
+
+    @staticmethod
+    def matches(if_none_match: Optional[str], etag: str) -> bool:
+        """
+        Weak comparison of an If-None-Match header, a list of ETags or
+        ``*``, against an ETag (weak or strong).
+        """
+        if not if_none_match:
+            return False
+        if if_none_match.strip() == "*":
+            return True
+        opaque = etag.removeprefix("W/")
+        return any(
+            candidate.strip().removeprefix("W/") == opaque
+            for candidate in if_none_match.split(",")
+        )
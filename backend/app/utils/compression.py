@@ -0,0 +1,239 @@
+"""Content-negotiated response compression (zstd, brotli, gzip)."""
+import zlib
+from collections import OrderedDict
+from typing import Optional, List, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from ..config import settings
+
+_COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/xhtml+xml",
+    "application/xml",
+    "application/javascript",
+    "application/x-dtbncx+xml",
+    "image/svg+xml",
+)
+
+
+def _available_encodings() -> List[str]:
+    """Encodings this server can produce, in order of preference."""
+    encodings = []
+    try:
+        import zstandard  # noqa: F401
+        encodings.append("zstd")
+    except ImportError:
+        pass
+    try:
+        import brotli  # noqa: F401
+        encodings.append("br")
+    except ImportError:
+        pass
+    encodings.append("gzip")
+    return encodings
+
+
+class _Compressor:
+    """Incremental compressor for one response body."""
+
+    def __init__(self, encoding: str):
+        if encoding == "zstd":
+            import zstandard
+            self._compressor = zstandard.ZstdCompressor(level=settings.COMPRESSION_ZSTD_LEVEL).compressobj()
+            self._process, self._finish = self._compressor.compress, self._compressor.flush
+        elif encoding == "br":
+            import brotli
+            self._compressor = brotli.Compressor(quality=settings.COMPRESSION_BROTLI_QUALITY)
+            self._process, self._finish = self._compressor.process, self._compressor.finish
+        else:
+            # wbits=31 writes a gzip header and trailer
+            self._compressor = zlib.compressobj(settings.COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31)
+            self._process, self._finish = self._compressor.compress, self._compressor.flush
+
+    def compress(self, data: bytes) -> bytes:
+        return self._process(data) if data else b""
+
+    def finish(self) -> bytes:
+        return self._finish()
+
+
+class CompressedBodyCache:
+    """LRU of compressed bodies of immutable responses, bounded by total bytes."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries: "OrderedDict[Tuple[str, str, str], bytes]" = OrderedDict()
+
+    def get(self, key: Tuple[str, str, str]) -> Optional[bytes]:
+        body = self._entries.get(key)
+        if body is not None:
+            self._entries.move_to_end(key)
+        return body
+
+    def put(self, key: Tuple[str, str, str], body: bytes) -> None:
+        if len(body) > self.max_bytes // 8:
+            return  # Do not let one large body flush the cache
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self.size -= len(previous)
+        self._entries[key] = body
+        self.size += len(body)
+        while self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= len(evicted)
+
+
+class CompressionMiddleware:
+    """
+    Compress JSON and text responses with the best encoding the client accepts.
+
+    Bodies smaller than COMPRESSION_MIN_SIZE or larger than
+    COMPRESSION_MAX_SIZE, already encoded bodies and other content types are
+    passed through. Responses with a strong ETag are content-addressed, so
+    their compressed bodies are cached by path, ETag and encoding and reused
+    instead of being compressed again.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self.encodings = _available_encodings()
+        self.cache = CompressedBodyCache(settings.COMPRESSION_CACHE_SIZE_MB * 1024 * 1024)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = self.negotiate(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        responder = _CompressionResponder(self, scope["path"], encoding, send)
+        await self.app(scope, receive, responder.send)
+
+    def negotiate(self, accept_encoding: str) -> Optional[str]:
+        """Pick the preferred available encoding with a non-zero q-value."""
+        accepted = {}
+        for part in accept_encoding.lower().split(","):
+            name, _, params = part.strip().partition(";")
+            quality = 1.0
+            params = params.strip()
+            if params.startswith("q="):
+                try:
+                    quality = float(params[2:])
+                except ValueError:
+                    continue
+            if name:
+                accepted[name] = quality
+
+        wildcard = accepted.get("*", 0.0)
+        candidates = [
+            encoding for encoding in self.encodings
+            if accepted.get(encoding, wildcard) > 0
+        ]
+        if not candidates:
+            return None
+        return max(candidates, key=lambda encoding: accepted.get(encoding, wildcard))
+
+
+class _CompressionResponder:
+    """Wraps ``send`` for one request and compresses the body on the way out."""
+
+    def __init__(self, middleware: CompressionMiddleware, path: str, encoding: str, send: Send):
+        self.middleware = middleware
+        self.path = path
+        self.encoding = encoding
+        self.downstream = send
+        self.start: Optional[Message] = None
+        self.headers: Optional[MutableHeaders] = None
+        self.compressor: Optional[_Compressor] = None
+        self.passthrough = False
+        self.cache_key: Optional[Tuple[str, str, str]] = None
+        self.cached: Optional[bytes] = None
+        self.compressed: List[bytes] = []
+
+    async def send(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            self.start = message
+            self.passthrough = not self._compressible(Headers(raw=message["headers"]))
+            if self.passthrough:
+                await self.downstream(message)
+            return
+
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self.downstream(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.headers is None:
+            if not more_body and len(body) < settings.COMPRESSION_MIN_SIZE:
+                self.passthrough = True
+                await self.downstream(self.start)
+                await self.downstream(message)
+                return
+            self._prepare_headers()
+            if self.cached is not None:
+                self.headers["Content-Length"] = str(len(self.cached))
+            elif not more_body:
+                # Whole body at once: compress it and keep an exact Content-Length
+                data = self.compressor.compress(body) + self.compressor.finish()
+                self.headers["Content-Length"] = str(len(data))
+                await self.downstream(self.start)
+                await self._send_final(data)
+                return
+            else:
+                del self.headers["Content-Length"]
+            await self.downstream(self.start)
+
+        if self.cached is not None:
+            if not more_body:
+                await self.downstream({"type": "http.response.body", "body": self.cached})
+            return
+
+        chunk = self.compressor.compress(body)
+        if more_body:
+            if self.cache_key is not None:
+                self.compressed.append(chunk)
+            await self.downstream({"type": "http.response.body", "body": chunk, "more_body": True})
+        else:
+            await self._send_final(chunk + self.compressor.finish())
+
+    async def _send_final(self, chunk: bytes) -> None:
+        if self.cache_key is not None:
+            self.compressed.append(chunk)
+            self.middleware.cache.put(self.cache_key, b"".join(self.compressed))
+        await self.downstream({"type": "http.response.body", "body": chunk})
+
+    def _compressible(self, headers: Headers) -> bool:
+        if self.start["status"] < 200 or self.start["status"] in (204, 206, 304):
+            return False
+        if "content-encoding" in headers:
+            return False
+        content_type = headers.get("content-type", "").lower()
+        if not content_type.startswith(_COMPRESSIBLE_TYPES):
+            return False
+        length = headers.get("content-length")
+        if length is not None and length.isdigit() and int(length) > settings.COMPRESSION_MAX_SIZE:
+            return False
+        return True
+
+    def _prepare_headers(self) -> None:
+        self.headers = MutableHeaders(raw=self.start["headers"])
+        etag = self.headers.get("etag")
+        if etag and not etag.startswith("W/"):
+            self.cache_key = (self.path, etag, self.encoding)
+            self.cached = self.middleware.cache.get(self.cache_key)
+            # The compressed body is no longer byte-identical to the original
+            self.headers["ETag"] = f"W/{etag}"
+
+        self.headers["Content-Encoding"] = self.encoding
+        self.headers.add_vary_header("Accept-Encoding")
+        if self.cached is None:
+            self.compressor = _Compressor(self.encoding)
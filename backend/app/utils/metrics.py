@@ -0,0 +1,341 @@
+"""
+Prometheus metrics without a client library.
+
+Metrics are plain dicts keyed by label tuples and are only updated from the
+event loop thread, so recording a value is a dict lookup and an addition,
+with no locks. With several workers, set METRICS_MULTIPROCESS_DIR: every
+worker then writes a snapshot there every METRICS_FLUSH_SECONDS and
+``/metrics`` merges the snapshots of all workers.
+"""
+import asyncio
+import glob
+import json
+import logging
+import os
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Tuple
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+Labels = Tuple[str, ...]
+
+# Names this process's snapshot file; the start time keeps a reused pid apart
+_WORKER_ID = f"{os.getpid()}-{int(time.time() * 1000)}"
+
+# Seconds; request latencies from 5 ms to 10 s
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Seconds; single statements and storage calls are usually much faster
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+class Metric:
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = labels
+        self.series: Dict[Labels, object] = {}
+        registry.register(self)
+
+    def snapshot(self) -> list:
+        return [[list(labels), value] for labels, value in self.series.items()]
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, labels: Labels = (), amount: float = 1.0) -> None:
+        self.series[labels] = self.series.get(labels, 0.0) + amount
+
+
+class Gauge(Metric):
+    """
+    A value that goes up and down. ``merge`` says how values of several
+    workers combine: "sum" (in-flight requests) or "max" (event loop lag).
+    """
+
+    type = "gauge"
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = (), merge: str = "sum"):
+        super().__init__(name, documentation, labels)
+        self.merge = merge
+
+    def set(self, value: float, labels: Labels = ()) -> None:
+        self.series[labels] = value
+
+    def inc(self, labels: Labels = (), amount: float = 1.0) -> None:
+        self.series[labels] = self.series.get(labels, 0.0) + amount
+
+    def dec(self, labels: Labels = (), amount: float = 1.0) -> None:
+        self.series[labels] = self.series.get(labels, 0.0) - amount
+
+
+class Histogram(Metric):
+    """Counts per bucket (not cumulative until rendered), sum and count."""
+
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = (), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, labels: Labels = ()) -> None:
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    @contextmanager
+    def time(self, labels: Labels = ()) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, labels)
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: List[Metric] = []
+
+    def register(self, metric: Metric) -> None:
+        self.metrics.append(metric)
+
+    def snapshot(self) -> dict:
+        return {metric.name: metric.snapshot() for metric in self.metrics}
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text format, merged across workers if configured."""
+        merged = self._merge_workers() if settings.METRICS_MULTIPROCESS_DIR else None
+        lines = []
+        for metric in self.metrics:
+            series = merged.get(metric.name, {}) if merged is not None else {
+                labels: value for labels, value in metric.series.items()
+            }
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for labels, value in sorted(series.items()):
+                pairs = list(zip(metric.label_names, labels))
+                if metric.type == "histogram":
+                    counts, total = value
+                    cumulative = 0
+                    for bound, count in zip(metric.buckets + (float("inf"),), counts):
+                        cumulative += count
+                        le = "+Inf" if bound == float("inf") else repr(bound)
+                        lines.append(f"{metric.name}_bucket{_labels(pairs + [('le', le)])} {cumulative}")
+                    lines.append(f"{metric.name}_sum{_labels(pairs)} {total}")
+                    lines.append(f"{metric.name}_count{_labels(pairs)} {cumulative}")
+                else:
+                    lines.append(f"{metric.name}{_labels(pairs)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write_snapshot(self) -> None:
+        """Write this worker's snapshot to METRICS_MULTIPROCESS_DIR (atomically)."""
+        path = os.path.join(settings.METRICS_MULTIPROCESS_DIR, f"metrics-{_WORKER_ID}.json")
+        with open(path + ".tmp", "w") as f:
+            json.dump(self.snapshot(), f)
+        os.replace(path + ".tmp", path)
+
+    def _merge_workers(self) -> Dict[str, Dict[Labels, object]]:
+        """
+        Merge the snapshots of every worker. Snapshots of workers that have
+        exited are folded into an archive, so counters and histograms never
+        go backwards and the directory does not grow with every restart;
+        their gauges are dropped.
+        """
+        import fcntl
+
+        self.write_snapshot()
+        directory = settings.METRICS_MULTIPROCESS_DIR
+        archive_path = os.path.join(directory, "archive.json")
+        with open(os.path.join(directory, "metrics.lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)  # Only scrapes take the lock
+
+            archive = self._merge([_read(archive_path)] if os.path.exists(archive_path) else [])
+            live, dead = [], []
+            for path in glob.glob(os.path.join(directory, "metrics-*.json")):
+                pid = int(os.path.basename(path).split("-")[1])
+                (live if _alive(pid) else dead).append(path)
+
+            if dead:
+                archive = self._merge([_unmerge(archive)] + [_read(path) for path in dead], gauges=False)
+                with open(archive_path + ".tmp", "w") as f:
+                    json.dump(_unmerge(archive), f)
+                os.replace(archive_path + ".tmp", archive_path)
+                for path in dead:
+                    os.remove(path)
+
+            return self._merge([_unmerge(archive)] + [_read(path) for path in live])
+
+    def _merge(self, snapshots: List[dict], gauges: bool = True) -> Dict[str, Dict[Labels, object]]:
+        kinds = {metric.name: metric for metric in self.metrics}
+        merged: Dict[str, Dict[Labels, object]] = {name: {} for name in kinds}
+        for snapshot in snapshots:
+            for name, series in snapshot.items():
+                metric = kinds.get(name)
+                if metric is None or (metric.type == "gauge" and not gauges):
+                    continue
+                target = merged[name]
+                for labels, value in series:
+                    labels = tuple(labels)
+                    current = target.get(labels)
+                    if current is None:
+                        target[labels] = value
+                    elif metric.type == "histogram":
+                        target[labels] = [[a + b for a, b in zip(current[0], value[0])], current[1] + value[1]]
+                    elif metric.type == "gauge" and metric.merge == "max":
+                        target[labels] = max(current, value)
+                    else:
+                        target[labels] = current + value
+        return merged
+
+
+def _read(path: str) -> dict:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _unmerge(merged: Dict[str, Dict[Labels, object]]) -> dict:
+    """Merged series back in snapshot form."""
+    return {name: [[list(labels), value] for labels, value in series.items()] for name, series in merged.items()}
+
+
+def _labels(pairs: List[Tuple[str, str]]) -> str:
+    if not pairs:
+        return ""
+    escaped = (
+        (name, str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'))
+        for name, value in pairs
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+registry = Registry()
+
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP requests.", ("method", "route", "status"))
+HTTP_REQUEST_SECONDS = Histogram("http_request_duration_seconds", "HTTP request latency.", ("method", "route"))
+HTTP_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests being served.")
+DB_QUERY_SECONDS = Histogram(
+    "db_query_duration_seconds", "Database statement duration.", ("operation",), FAST_BUCKETS
+)
+STORAGE_READ_BYTES = Counter("storage_read_bytes_total", "Bytes read from storage.", ("provider",))
+STORAGE_WRITTEN_BYTES = Counter("storage_written_bytes_total", "Bytes written to storage.", ("provider",))
+METADATA_SECONDS = Histogram(
+    "metadata_extraction_duration_seconds", "Book metadata extraction duration.", ("file_type",)
+)
+BCRYPT_SECONDS = Histogram(
+    "bcrypt_duration_seconds", "bcrypt hash and verify duration.", ("operation",), FAST_BUCKETS + (2.5,)
+)
+EVENT_LOOP_LAG = Gauge("event_loop_lag_seconds", "Latest event loop scheduling delay.", merge="max")
+EVENT_LOOP_LAG_SECONDS = Histogram(
+    "event_loop_lag_duration_seconds", "Event loop scheduling delay.", buckets=FAST_BUCKETS
+)
+CACHE_EVENTS = Counter("cache_events_total", "Response cache hits, misses, evictions, invalidations.", ("event",))
+CACHE_BYTES = Gauge("cache_bytes", "Bytes held by the memory response cache.")
+
+
+def operation(statement: str) -> str:
+    """Statement kind used as the ``operation`` label."""
+    verb = statement.lstrip()[:6].upper()
+    return verb if verb in ("SELECT", "INSERT", "UPDATE", "DELETE") else "OTHER"
+
+
+def route_template(scope: Scope) -> str:
+    """
+    Path template of the matched route, e.g. ``/api/v1/books/{book_id}``.
+
+    Routes of included routers carry their path without the API prefix, so
+    it is added back when the request path has it.
+    """
+    route = scope.get("route")
+    template = getattr(route, "path_format", None) or getattr(route, "path", None)
+    if template is None:
+        return "unmatched"
+    prefix = settings.API_V1_PREFIX
+    if scope["path"].startswith(prefix) and not template.startswith(prefix):
+        template = prefix + template
+    return template
+
+
+class MetricsMiddleware:
+    """Count requests and time them per route template (not per raw path)."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        HTTP_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            # Set by the router once matched; the template keeps label values bounded
+            labels = (scope["method"], route_template(scope))
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, labels)
+            HTTP_REQUESTS.inc(labels + (str(status_code),))
+
+
+async def monitor_event_loop(interval: float = 0.5) -> None:
+    """Measure how late the loop wakes a sleeping task; runs until cancelled."""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - start - interval)
+        EVENT_LOOP_LAG.set(lag)
+        EVENT_LOOP_LAG_SECONDS.observe(lag)
+
+
+async def flush_snapshots() -> None:
+    """Write this worker's snapshot periodically; runs until cancelled."""
+    from ..services.cache_service import cache_service
+
+    while True:
+        await asyncio.sleep(settings.METRICS_FLUSH_SECONDS)
+        # Other workers' scrapes only see the cache statistics in the snapshot
+        collect_cache_stats(cache_service.stats())
+        try:
+            registry.write_snapshot()
+        except OSError as e:
+            logger.warning(f"Could not write metrics snapshot: {e}")
+
+
+def collect_cache_stats(stats: dict) -> None:
+    """Copy response cache statistics into the registry before a scrape or snapshot."""
+    for event in ("hits", "misses", "evictions", "invalidations"):
+        CACHE_EVENTS.series[(event,)] = float(stats.get(event, 0))
+    CACHE_BYTES.set(float(stats.get("bytes", 0)))
@@ -0,0 +1,54 @@
+"""Import heavy dependencies before the first request that needs them."""
+import asyncio
+import importlib
+import logging
+import time
+from typing import List, Optional
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+# Imported lazily by the services; together they take longer to import
+# than the rest of the application
+_PARSER_MODULES = ("pypdf", "ebooklib.epub", "lxml.etree", "PIL.Image")
+_S3_MODULES = ("boto3", "botocore.config", "botocore.exceptions")
+
+
+def heavy_modules() -> List[str]:
+    modules = list(_PARSER_MODULES)
+    if settings.STORAGE_PROVIDER != "local":
+        modules.extend(_S3_MODULES)
+    return modules
+
+
+def import_modules(modules: List[str]) -> float:
+    """Import ``modules``, skipping missing ones, and return the seconds taken."""
+    start = time.perf_counter()
+    for name in modules:
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            logger.debug(f"Not preloading {name}: {e}")
+    return time.perf_counter() - start
+
+
+async def preload(mode: Optional[str] = None) -> Optional[asyncio.Task]:
+    """
+    Preload heavy modules according to PRELOAD_MODULES.
+
+    ``startup`` imports them before the app starts serving, ``background``
+    imports them in a worker thread while it already serves (the import
+    lock makes a request that needs a module wait for it), and ``none``
+    leaves them to the first request that uses them.
+
+    Returns:
+        The background task, if one was started
+    """
+    mode = mode or settings.PRELOAD_MODULES
+    if mode == "startup":
+        seconds = import_modules(heavy_modules())
+        logger.info(f"Preloaded modules in {seconds * 1000:.0f} ms")
+    elif mode == "background":
+        return asyncio.create_task(asyncio.to_thread(import_modules, heavy_modules()))
+    return None
@@ -0,0 +1,109 @@
+"""
+Per-request database statement counts and timings.
+
+The engine's cursor events (see ``app.database``) report every statement to
+``record``, which adds it to the ``QueryStats`` of the current request, if
+any. ``QueryStatsMiddleware`` starts the stats for each request. With DEBUG
+on it adds ``X-Query-Count`` / ``X-Query-Time`` response headers and warns
+about statements repeated often in one request, the usual sign of an N+1
+query pattern.
+"""
+import logging
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class QueryStats:
+    """Statements run for one request (or background job)."""
+
+    def __init__(self, label: str):
+        self.label = label
+        self.count = 0
+        self.seconds = 0.0
+        self.statements: Dict[str, int] = {}
+
+    def add(self, statement: str, seconds: float) -> None:
+        self.count += 1
+        self.seconds += seconds
+        # Same SQL text with different parameters counts as a repeat
+        self.statements[statement] = self.statements.get(statement, 0) + 1
+
+    def repeated(self, threshold: int) -> List[Tuple[str, int]]:
+        """Statements run at least ``threshold`` times, most frequent first."""
+        repeats = [(statement, n) for statement, n in self.statements.items() if n >= threshold]
+        return sorted(repeats, key=lambda item: item[1], reverse=True)
+
+
+# A mutable object, so statements run in copied contexts (tasks, greenlets) still count
+_current: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+def current() -> Optional[QueryStats]:
+    return _current.get()
+
+
+def start(label: str):
+    """Collect the statements of the current context; returns a token for ``stop``."""
+    return _current.set(QueryStats(label))
+
+
+def stop(token) -> QueryStats:
+    stats = _current.get()
+    _current.reset(token)
+    return stats
+
+
+def record(statement: str, seconds: float) -> None:
+    """Called for every executed statement."""
+    stats = _current.get()
+    if stats is not None:
+        stats.add(statement, seconds)
+    if settings.SLOW_QUERY_MS and seconds * 1000 >= settings.SLOW_QUERY_MS:
+        where = f" in {stats.label}" if stats is not None else ""
+        logger.warning(f"Slow query ({seconds * 1000:.0f} ms){where}: {' '.join(statement.split())}")
+
+
+def report_repeats(stats: QueryStats) -> None:
+    """Log statements repeated at least N_PLUS_ONE_THRESHOLD times."""
+    for statement, n in stats.repeated(settings.N_PLUS_ONE_THRESHOLD):
+        logger.warning(
+            f"Possible N+1 in {stats.label}: statement ran {n} times "
+            f"({stats.count} statements total): {' '.join(statement.split())}"
+        )
+
+
+class QueryStatsMiddleware:
+    """Count and time the statements of each request."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        token = start(f"{scope['method']} {scope['path']}")
+        stats = current()
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start" and settings.DEBUG:
+                # Statements of background tasks run later and are not included
+                headers = MutableHeaders(scope=message)
+                headers["X-Query-Count"] = str(stats.count)
+                headers["X-Query-Time"] = f"{stats.seconds * 1000:.1f}ms"
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            stop(token)
+            if settings.DEBUG:
+                report_repeats(stats)
@@ -5,10 +5,12 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from ..database import get_db
 from ..models.user import User
 from ..services.auth_service import AuthService
+from .tracing import traced
 
 security = HTTPBearer()
 
 
+@traced()
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: AsyncSession = Depends(get_db),
@@ -0,0 +1,324 @@
+"""
+Request tracing in the OpenTelemetry format, without the OpenTelemetry SDK.
+
+A sampled request gets a root span from ``TracingMiddleware``; service
+methods (see ``instrument``), ``get_current_user``, storage operations and
+SQL statements add child spans. The current span lives in a context
+variable, so background tasks and jobs started with ``asyncio.create_task``
+or ``asyncio.to_thread`` stay in the trace of the request that started
+them. An incoming W3C ``traceparent`` header continues the caller's trace.
+
+Finished spans are queued and exported every TRACING_EXPORT_SECONDS as
+OTLP/JSON: appended as one line per batch to TRACING_EXPORT_FILE (the
+format the collector's ``otlpjsonfile`` receiver reads) and/or posted to
+the OTLP/HTTP endpoint TRACING_OTLP_ENDPOINT. Only TRACING_SAMPLE_RATE of
+requests are recorded; for the others every instrumented call costs one
+context variable lookup.
+"""
+import asyncio
+import functools
+import inspect
+import json
+import logging
+import os
+import random
+import re
+import time
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+# OTLP span kinds and status codes
+INTERNAL, SERVER, CLIENT = 1, 2, 3
+STATUS_ERROR = 2
+
+_TRACEPARENT = re.compile(r"([0-9a-f]{2})-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})")
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "kind", "start", "end",
+                 "attributes", "events", "error", "sampled")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], sampled: bool, kind: int = INTERNAL):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.kind = kind
+        self.sampled = sampled
+        self.start = time.time_ns()
+        self.end: Optional[int] = None
+        self.attributes: Dict[str, Any] = {}
+        self.events: List[tuple] = []
+        self.error: Optional[str] = None
+
+    def add_event(self, name: str) -> None:
+        self.events.append((name, time.time_ns()))
+
+    def finish(self, end: Optional[int] = None) -> None:
+        if self.end is None:
+            self.end = end or time.time_ns()
+            if self.sampled:
+                exporter.add(self)
+
+
+_current: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+def _sample() -> bool:
+    rate = settings.TRACING_SAMPLE_RATE
+    return rate >= 1 or (rate > 0 and random.random() < rate)
+
+
+def start_span(name: str, kind: int = INTERNAL, parent: Optional[Span] = None) -> Span:
+    """A child of ``parent`` (default: the current span), or a new sampled-or-not trace."""
+    parent = parent or _current.get()
+    if parent is not None:
+        return Span(name, parent.trace_id, parent.span_id, parent.sampled, kind)
+    return Span(name, os.urandom(16).hex(), None, _sample(), kind)
+
+
+def traced(name: Optional[str] = None):
+    """
+    Decorator running a coroutine function in its own span. Without a
+    sampled parent span the call goes straight through.
+    """
+    def decorate(func: Callable) -> Callable:
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            parent = _current.get()
+            if parent is None or not parent.sampled:
+                return await func(*args, **kwargs)
+            span = Span(span_name, parent.trace_id, parent.span_id, True)
+            token = _current.set(span)
+            try:
+                return await func(*args, **kwargs)
+            except Exception as e:
+                span.error = f"{type(e).__name__}: {e}"
+                raise
+            finally:
+                _current.reset(token)
+                span.finish()
+
+        wrapper.__traced__ = True
+        return wrapper
+
+    return decorate
+
+
+def instrument(*classes: type) -> None:
+    """Trace every coroutine method of the given service classes."""
+    for cls in classes:
+        for attr, value in list(vars(cls).items()):
+            func = value.__func__ if isinstance(value, (staticmethod, classmethod)) else value
+            if not inspect.iscoroutinefunction(func) or getattr(func, "__traced__", False):
+                continue
+            wrapped = traced(f"{cls.__name__}.{attr}")(func)
+            if isinstance(value, staticmethod):
+                wrapped = staticmethod(wrapped)
+            elif isinstance(value, classmethod):
+                wrapped = classmethod(wrapped)
+            setattr(cls, attr, wrapped)
+
+
+def record_span(name: str, seconds: float, attributes: Dict[str, Any], kind: int = CLIENT) -> None:
+    """Add a finished child span of the current span, e.g. for a SQL statement."""
+    parent = _current.get()
+    if parent is None or not parent.sampled:
+        return
+    end = time.time_ns()
+    span = Span(name, parent.trace_id, parent.span_id, True, kind)
+    span.start = end - int(seconds * 1e9)
+    span.attributes = attributes
+    span.finish(end)
+
+
+def _parse_traceparent(value: str) -> Optional[Span]:
+    """
+    The remote parent of a W3C ``traceparent`` header, as a span to attach
+    to, or None for a malformed header so the request starts a new trace.
+    """
+    match = _TRACEPARENT.fullmatch(value.strip())
+    if match is None:
+        return None
+    version, trace_id, span_id, flags = match.groups()
+    if version == "ff" or not int(trace_id, 16) or not int(span_id, 16):
+        return None
+    parent = Span("remote", trace_id, None, bool(int(flags, 16) & 1))
+    parent.span_id = span_id
+    return parent
+
+
+class TracingMiddleware:
+    """Root span per request, named after the route template once it is matched."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        remote = None
+        for key, value in scope["headers"]:
+            if key == b"traceparent":
+                remote = _parse_traceparent(value.decode("latin-1"))
+                break
+        span = start_span(f"{scope['method']} {scope['path']}", SERVER, parent=remote)
+        if not span.sampled:
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                span.add_event("response.start")  # Time after this is spent streaming
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                _end_request_span(span, scope, status_code)
+
+        token = _current.set(span)
+        try:
+            # Background tasks run inside this call after the response and stay in the trace
+            await self.app(scope, receive, send_wrapper)
+        except Exception as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            _current.reset(token)
+            _end_request_span(span, scope, status_code)
+
+
+def _end_request_span(span: Span, scope: Scope, status_code: int) -> None:
+    if span.end is not None:
+        return
+    from .metrics import route_template
+
+    template = route_template(scope)
+    span.name = f"{scope['method']} {template}"
+    span.attributes.update({
+        "http.request.method": scope["method"],
+        "http.route": template,
+        "url.path": scope["path"],
+        "http.response.status_code": status_code,
+    })
+    if status_code >= 500:
+        span.error = span.error or f"HTTP {status_code}"
+    span.finish()
+
+
+# --------------------------------------------------------------------------
+# Export
+
+
+def _attribute(key: str, value: Any) -> dict:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+def _otlp_span(span: Span) -> dict:
+    data = {
+        "traceId": span.trace_id,
+        "spanId": span.span_id,
+        "name": span.name,
+        "kind": span.kind,
+        "startTimeUnixNano": str(span.start),
+        "endTimeUnixNano": str(span.end),
+        "attributes": [_attribute(k, v) for k, v in span.attributes.items()],
+    }
+    if span.parent_id:
+        data["parentSpanId"] = span.parent_id
+    if span.events:
+        data["events"] = [{"name": name, "timeUnixNano": str(at)} for name, at in span.events]
+    if span.error:
+        data["status"] = {"code": STATUS_ERROR, "message": span.error}
+    return data
+
+
+class Exporter:
+    """Queue of finished spans, exported in OTLP/JSON batches."""
+
+    def __init__(self):
+        self.spans: List[Span] = []
+        self.dropped = 0
+
+    def add(self, span: Span) -> None:
+        if len(self.spans) >= settings.TRACING_MAX_QUEUE:
+            self.dropped += 1
+            return
+        self.spans.append(span)
+
+    def payload(self, spans: List[Span]) -> dict:
+        """An OTLP ``ExportTraceServiceRequest``."""
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [
+                    _attribute("service.name", settings.TRACING_SERVICE_NAME),
+                    _attribute("process.pid", os.getpid()),
+                ]},
+                "scopeSpans": [{
+                    "scope": {"name": "app.utils.tracing"},
+                    "spans": [_otlp_span(span) for span in spans],
+                }],
+            }]
+        }
+
+    async def flush(self) -> None:
+        if not self.spans:
+            return
+        spans, self.spans = self.spans, []
+        body = json.dumps(self.payload(spans), separators=(",", ":"))
+        if settings.TRACING_EXPORT_FILE:
+            try:
+                await asyncio.to_thread(self._append, settings.TRACING_EXPORT_FILE, body)
+            except OSError as e:
+                logger.warning(f"Could not write traces: {e}")
+        if settings.TRACING_OTLP_ENDPOINT:
+            import httpx
+
+            try:
+                async with httpx.AsyncClient(timeout=10) as client:
+                    response = await client.post(
+                        settings.TRACING_OTLP_ENDPOINT,
+                        content=body,
+                        headers={"Content-Type": "application/json"},
+                    )
+                    response.raise_for_status()
+            except httpx.HTTPError as e:
+                logger.warning(f"Could not export {len(spans)} spans: {e}")
+
+    @staticmethod
+    def _append(path: str, body: str) -> None:
+        # One batch per line, written in one call so workers do not interleave
+        with open(path, "a") as f:
+            f.write(body + "\n")
+
+
+exporter = Exporter()
+
+
+async def export_spans() -> None:
+    """Export queued spans periodically; runs until cancelled."""
+    while True:
+        await asyncio.sleep(settings.TRACING_EXPORT_SECONDS)
+        await exporter.flush()
@@ -0,0 +1,68 @@
+"""Warm-up of a new worker: parsers, database pool, storage client, caches."""
+import asyncio
+import logging
+import time
+from contextlib import AsyncExitStack
+
+from sqlalchemy import select, func, text
+
+from ..config import settings
+from ..database import engine, AsyncSessionLocal
+from ..models.progress import ReadingProgress
+from ..services.storage_service import storage_service
+from .preload import heavy_modules, import_modules
+
+logger = logging.getLogger(__name__)
+
+
+async def warm_up(state) -> None:
+    """
+    Prime everything the first requests after a deploy would otherwise pay
+    for, then set ``state.ready`` so ``/health`` reports ready. A failing
+    step is logged and skipped; the worker becomes ready regardless.
+    """
+    start = time.perf_counter()
+    steps = (
+        ("parsers", lambda: asyncio.to_thread(import_modules, heavy_modules())),
+        ("database", lambda: open_connections(settings.WARMUP_DB_CONNECTIONS)),
+        ("storage", lambda: asyncio.to_thread(storage_service.warm_up)),
+        ("caches", lambda: load_hot_users(settings.WARMUP_CACHE_USERS)),
+    )
+    try:
+        for name, step in steps:
+            try:
+                await step()
+            except Exception as e:
+                logger.warning(f"Warm-up step {name} failed: {e}")
+        logger.info(f"Warm-up finished in {(time.perf_counter() - start) * 1000:.0f} ms")
+    finally:
+        state.ready = True
+
+
+async def open_connections(count: int) -> None:
+    """Open ``count`` pooled connections at once and return them to the pool."""
+    size = getattr(engine.pool, "size", lambda: count)()
+    async with AsyncExitStack() as stack:
+        for _ in range(min(count, size)):
+            conn = await stack.enter_async_context(engine.connect())
+            await conn.execute(text("SELECT 1"))
+
+
+async def load_hot_users(count: int) -> None:
+    """Cache the default library listing of the most recent readers."""
+    if count <= 0:
+        return
+    from ..routers.books import library_etag, load_library
+    from ..services.version_service import VersionService, LIBRARY
+
+    async with AsyncSessionLocal() as db:
+        user_ids = (await db.execute(
+            select(ReadingProgress.user_id)
+            .group_by(ReadingProgress.user_id)
+            .order_by(func.max(ReadingProgress.last_read_at).desc())
+            .limit(count)
+        )).scalars().all()
+        for user_id in user_ids:
+            version = await VersionService.get(db, user_id, LIBRARY)
+            # Same key as GET /books without query parameters
+            await load_library(db, user_id, library_etag(version, ""))
@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+"""
+Deterministic synthetic PDF and EPUB corpus.
+
+Stands in for users' private books when measuring metadata extraction,
+cover extraction and uploads. The same seed always produces byte-identical
+files. Books vary in page count, text and image density, image size, PDF
+cross-reference damage and EPUB cover layout:
+
+    xref     ok | offsets (wrong xref offsets) | missing (no xref table,
+             startxref points elsewhere) | truncated (file cut short) |
+             incremental (an appended update section)
+    cover    epub3 (cover-image property) | epub2 (<meta name="cover">) |
+             filename (only the file name says cover) | nested (href with
+             ../ and %20) | missing (declared, not in the archive) | none
+
+Usage:
+    cd backend
+    python -m benchmarks.corpus OUT_DIR [--count 40] [--seed 1]
+                                [--max-pages 400] [--image-density 0.3]
+"""
+
+import argparse
+import io
+import json
+import random
+import zipfile
+import zlib
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+
+XREF_DAMAGE = ("ok", "offsets", "missing", "truncated", "incremental")
+COVER_LAYOUTS = ("epub3", "epub2", "filename", "nested", "missing", "none")
+
+# Fixed zip timestamps keep archives byte-identical between runs
+_ZIP_DATE = (2020, 1, 1, 0, 0, 0)
+_WORDS = (
+    "reading library chapter margin quiet river evening lantern paper window "
+    "garden letter morning story silver harbour winter station mountain voice"
+).split()
+
+
+@dataclass
+class BookSpec:
+    """Everything that determines one generated book."""
+
+    name: str
+    file_type: str  # "pdf" or "epub"
+    pages: int  # PDF pages or EPUB chapters
+    text_kb: int  # Text per page or chapter
+    images_per_page: float
+    image_kb: int
+    xref: str = "ok"  # PDF only, see XREF_DAMAGE
+    cover: str = "epub3"  # EPUB only, see COVER_LAYOUTS
+    seed: int = 0
+
+    @property
+    def title(self) -> str:
+        return f"Synthetic {self.file_type.upper()} {self.name}"
+
+    @property
+    def author(self) -> str:
+        return f"Author {self.seed % 97}"
+
+    @property
+    def has_cover(self) -> bool:
+        return self.file_type == "epub" and self.cover not in ("missing", "none")
+
+
+def _text(rng: random.Random, size: int) -> str:
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(_WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return " ".join(words)
+
+
+def _jpeg(rng: random.Random, kb: int) -> Tuple[bytes, int, int]:
+    """A JPEG of roughly ``kb`` KB; blocky noise compresses like photos do."""
+    from PIL import Image
+
+    side = max(16, int((kb * 1024 / 0.9) ** 0.5))
+    cells = max(2, side // 4)
+    image = Image.frombytes("RGB", (cells, cells), rng.randbytes(cells * cells * 3))
+    image = image.resize((side, side), Image.NEAREST)
+    output = io.BytesIO()
+    image.save(output, "JPEG", quality=85)
+    return output.getvalue(), side, side
+
+
+def _image_pool(rng: random.Random, count: int, kb: int) -> List[Tuple[bytes, int, int]]:
+    # A book reuses up to 16 distinct images; generating one per page is slow
+    return [_jpeg(rng, kb) for _ in range(min(count, 16))]
+
+
+# --------------------------------------------------------------------------
+# PDF
+
+
+def generate_pdf(spec: BookSpec) -> bytes:
+    """Write the PDF objects by hand, so the xref table can be damaged on purpose."""
+    rng = random.Random(spec.seed)
+    image_count = int(spec.pages * spec.images_per_page)
+    images = _image_pool(rng, image_count, spec.image_kb) if image_count else []
+
+    # 1 catalog, 2 page tree, 3 font, 4 info, then per image an XObject,
+    # then per page a page object and its content stream
+    objects: List[bytes] = [b"", b"", b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    objects.append(
+        f"<< /Title ({spec.title}) /Author ({spec.author}) /Producer (diRead corpus) >>".encode()
+    )
+    image_ids = []
+    for data, width, height in images:
+        header = (
+            f"<< /Type /XObject /Subtype /Image /Width {width} /Height {height} /ColorSpace /DeviceRGB "
+            f"/BitsPerComponent 8 /Filter /DCTDecode /Length {len(data)} >>\nstream\n"
+        ).encode()
+        objects.append(header + data + b"\nendstream")
+        image_ids.append(len(objects))
+
+    page_ids = []
+    placed = 0
+    for page in range(spec.pages):
+        lines = _text(rng, spec.text_kb * 1024).replace("(", "").replace(")", "")
+        content = ["BT /F1 10 Tf 40 760 Td 12 TL"]
+        for start in range(0, len(lines), 90):
+            content.append(f"({lines[start:start + 90]}) '")
+        content.append("ET")
+        resources = "/Font << /F1 3 0 R >>"
+        target = int((page + 1) * spec.images_per_page)
+        if images and target > placed:
+            names = []
+            for slot, i in enumerate(range(placed, target)):
+                names.append(f"/Im{slot} {image_ids[i % len(image_ids)]} 0 R")
+                x, y = 40 + 220 * (slot % 2), 300 - 210 * (slot // 2 % 2)
+                content.append(f"q 200 0 0 200 {x} {y} cm /Im{slot} Do Q")
+            resources += f" /XObject << {' '.join(names)} >>"
+            placed = target
+        stream = zlib.compress("\n".join(content).encode(), 6)
+        page_ids.append(len(objects) + 1)
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Resources << {resources} >> "
+            f"/Contents {len(objects) + 2} 0 R >>".encode()
+        )
+        objects.append(f"<< /Length {len(stream)} /Filter /FlateDecode >>\nstream\n".encode() + stream + b"\nendstream")
+
+    objects[0] = b"<< /Type /Catalog /Pages 2 0 R >>"
+    kids = " ".join(f"{i} 0 R" for i in page_ids)
+    objects[1] = f"<< /Type /Pages /Kids [{kids}] /Count {spec.pages} >>".encode()
+
+    output = bytearray(b"%PDF-1.7\n%\xe2\xe3\xcf\xd3\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+
+    if spec.xref == "offsets":
+        offsets = [offset + rng.randrange(7, 300) for offset in offsets]
+    xref_at = len(output)
+    if spec.xref != "missing":
+        output += _xref(offsets)
+    else:
+        xref_at = rng.randrange(xref_at)  # startxref points into an object
+    output += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R /Info 4 0 R >>\nstartxref\n{xref_at}\n%%EOF\n".encode()
+
+    if spec.xref == "incremental":
+        # A later save that changed the title, as editors append it
+        update_at = len(output)
+        info = f"<< /Title ({spec.title}) /Author ({spec.author}) /Producer (edited) >>".encode()
+        output += b"4 0 obj\n" + info + b"\nendobj\n"
+        second_xref = len(output)
+        output += f"xref\n0 1\n0000000000 65535 f \n4 1\n{update_at:010d} 00000 n \n".encode()
+        output += (
+            f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R /Info 4 0 R /Prev {xref_at} >>\n"
+            f"startxref\n{second_xref}\n%%EOF\n"
+        ).encode()
+    if spec.xref == "truncated":
+        # Cut into the last page's content, as an interrupted upload would
+        return bytes(output[:int(len(output) * 0.97)])
+    return bytes(output)
+
+
+def _xref(offsets: List[int]) -> bytes:
+    rows = [f"xref\n0 {len(offsets) + 1}\n0000000000 65535 f \n"]
+    rows.extend(f"{offset:010d} 00000 n \n" for offset in offsets)
+    return "".join(rows).encode()
+
+
+# --------------------------------------------------------------------------
+# EPUB
+
+
+def generate_epub(spec: BookSpec) -> bytes:
+    rng = random.Random(spec.seed)
+    image_count = int(spec.pages * spec.images_per_page)
+    images = _image_pool(rng, image_count, spec.image_kb) if image_count else []
+    buffer = io.BytesIO()
+
+    def write(archive: zipfile.ZipFile, name: str, data, compress: int = zipfile.ZIP_DEFLATED) -> None:
+        archive.writestr(zipfile.ZipInfo(name, date_time=_ZIP_DATE), data, compress_type=compress)
+
+    with zipfile.ZipFile(buffer, "w") as archive:
+        write(archive, "mimetype", "application/epub+zip", zipfile.ZIP_STORED)
+        write(
+            archive,
+            "META-INF/container.xml",
+            '<?xml version="1.0"?><container version="1.0" '
+            'xmlns="urn:oasis:names:tc:opendocument:xmlns:container"><rootfiles>'
+            '<rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/>'
+            "</rootfiles></container>",
+        )
+        manifest, spine, nav = [], [], []
+        for i, (data, _, _) in enumerate(images):
+            write(archive, f"OEBPS/images/img{i}.jpg", data, zipfile.ZIP_STORED)
+            manifest.append(f'<item id="img{i}" href="images/img{i}.jpg" media-type="image/jpeg"/>')
+        placed = 0
+        for chapter in range(spec.pages):
+            paragraphs = "".join(
+                f"<p>{_text(rng, 600)}</p>" for _ in range(max(1, spec.text_kb * 1024 // 600))
+            )
+            target = int((chapter + 1) * spec.images_per_page)
+            figures = "".join(
+                f'<img src="images/img{i % len(images)}.jpg" alt=""/>' for i in range(placed, target)
+            ) if images else ""
+            placed = max(placed, target)
+            write(
+                archive,
+                f"OEBPS/ch{chapter}.xhtml",
+                '<?xml version="1.0" encoding="utf-8"?><html xmlns="http://www.w3.org/1999/xhtml">'
+                f"<head><title>Chapter {chapter + 1}</title></head><body>"
+                f"<h1>Chapter {chapter + 1}</h1>{figures}{paragraphs}</body></html>",
+            )
+            manifest.append(f'<item id="ch{chapter}" href="ch{chapter}.xhtml" media-type="application/xhtml+xml"/>')
+            spine.append(f'<itemref idref="ch{chapter}"/>')
+            nav.append(f'<li><a href="ch{chapter}.xhtml">Chapter {chapter + 1}</a></li>')
+        write(
+            archive,
+            "OEBPS/nav.xhtml",
+            '<?xml version="1.0" encoding="utf-8"?><html xmlns="http://www.w3.org/1999/xhtml" '
+            'xmlns:epub="http://www.idpf.org/2007/ops"><body><nav epub:type="toc"><ol>'
+            f"{''.join(nav)}</ol></nav></body></html>",
+        )
+        manifest.append('<item id="nav" href="nav.xhtml" media-type="application/xhtml+xml" properties="nav"/>')
+
+        meta = ""
+        cover_data, _, _ = _jpeg(rng, max(8, spec.image_kb)) if spec.cover != "none" else (b"", 0, 0)
+        if spec.cover == "epub3":
+            write(archive, "OEBPS/images/front.jpg", cover_data, zipfile.ZIP_STORED)
+            manifest.append('<item id="front" href="images/front.jpg" media-type="image/jpeg" properties="cover-image"/>')
+        elif spec.cover == "epub2":
+            write(archive, "OEBPS/front.jpg", cover_data, zipfile.ZIP_STORED)
+            manifest.append('<item id="art" href="front.jpg" media-type="image/jpeg"/>')
+            meta = '<meta name="cover" content="art"/>'
+        elif spec.cover == "filename":
+            write(archive, "OEBPS/images/cover.jpg", cover_data, zipfile.ZIP_STORED)
+            manifest.append('<item id="i-front" href="images/cover.jpg" media-type="image/jpeg"/>')
+        elif spec.cover == "nested":
+            write(archive, "Art Work/cover image.jpg", cover_data, zipfile.ZIP_STORED)
+            manifest.append(
+                '<item id="cover-img" href="../Art%20Work/cover%20image.jpg" '
+                'media-type="image/jpeg" properties="cover-image"/>'
+            )
+        elif spec.cover == "missing":
+            manifest.append('<item id="cover" href="images/absent.jpg" media-type="image/jpeg" properties="cover-image"/>')
+
+        write(
+            archive,
+            "OEBPS/content.opf",
+            '<?xml version="1.0" encoding="utf-8"?><package xmlns="http://www.idpf.org/2007/opf" '
+            'version="3.0" unique-identifier="id"><metadata xmlns:dc="http://purl.org/dc/elements/1.1/">'
+            f'<dc:identifier id="id">urn:diread:{spec.seed}</dc:identifier><dc:title>{spec.title}</dc:title>'
+            f"<dc:creator>{spec.author}</dc:creator><dc:language>en</dc:language>{meta}</metadata>"
+            f"<manifest>{''.join(manifest)}</manifest><spine>{''.join(spine)}</spine></package>",
+        )
+    return buffer.getvalue()
+
+
+def generate(spec: BookSpec) -> bytes:
+    return generate_pdf(spec) if spec.file_type == "pdf" else generate_epub(spec)
+
+
+# --------------------------------------------------------------------------
+# Corpus
+
+
+def corpus_specs(
+    count: int,
+    seed: int = 1,
+    max_pages: int = 400,
+    image_density: float = 0.3,
+    image_kb: int = 120,
+    text_kb: int = 2,
+) -> List[BookSpec]:
+    """
+    A mixed corpus: 60% PDFs cycling through every kind of xref damage and
+    40% EPUBs cycling through every cover layout, with page counts spread
+    log-uniformly up to ``max_pages`` and image density around
+    ``image_density`` images per page.
+    """
+    rng = random.Random(seed)
+    specs = []
+    for i in range(count):
+        file_type = "pdf" if i % 5 < 3 else "epub"
+        pages = max(1, int(round(max_pages ** rng.random())))
+        if file_type == "epub":
+            pages = max(1, pages // 10)  # Chapters, not pages
+        specs.append(BookSpec(
+            name=f"{i:04d}",
+            file_type=file_type,
+            pages=pages,
+            text_kb=max(1, int(text_kb * (0.5 + rng.random()))) * (10 if file_type == "epub" else 1),
+            images_per_page=round(image_density * rng.random() * 2, 2),
+            image_kb=max(8, int(image_kb * (0.25 + rng.random() * 1.5))),
+            xref=XREF_DAMAGE[(i // 5) % len(XREF_DAMAGE)] if file_type == "pdf" else "ok",
+            cover=COVER_LAYOUTS[(i // 5) % len(COVER_LAYOUTS)] if file_type == "epub" else "none",
+            seed=seed * 100_003 + i,
+        ))
+    return specs
+
+
+def iter_corpus(specs: List[BookSpec]) -> Iterator[Tuple[BookSpec, bytes]]:
+    for spec in specs:
+        yield spec, generate(spec)
+
+
+def write_corpus(directory: Path, specs: List[BookSpec]) -> Dict[str, dict]:
+    """Write every book and a ``manifest.json`` describing it."""
+    directory.mkdir(parents=True, exist_ok=True)
+    manifest = {}
+    for spec, content in iter_corpus(specs):
+        filename = f"{spec.name}.{spec.file_type}"
+        (directory / filename).write_bytes(content)
+        manifest[filename] = {**asdict(spec), "size": len(content)}
+    (directory / "manifest.json").write_text(json.dumps(manifest, indent=2))
+    return manifest
+
+
+def read_corpus(directory: Path) -> List[Tuple[BookSpec, bytes]]:
+    """Books of a corpus directory written by ``write_corpus``."""
+    manifest = json.loads((directory / "manifest.json").read_text())
+    fields = BookSpec.__dataclass_fields__
+    return [
+        (BookSpec(**{k: v for k, v in entry.items() if k in fields}), (directory / filename).read_bytes())
+        for filename, entry in sorted(manifest.items())
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("directory", help="Output directory")
+    parser.add_argument("--count", type=int, default=40, help="Books to generate")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--max-pages", type=int, default=400)
+    parser.add_argument("--image-density", type=float, default=0.3, help="Mean images per page")
+    parser.add_argument("--image-kb", type=int, default=120, help="Mean image size")
+    parser.add_argument("--text-kb", type=int, default=2, help="Mean text per PDF page")
+    args = parser.parse_args()
+
+    specs = corpus_specs(args.count, args.seed, args.max_pages, args.image_density, args.image_kb, args.text_kb)
+    manifest = write_corpus(Path(args.directory), specs)
+    total = sum(entry["size"] for entry in manifest.values())
+    print(f"Wrote {len(manifest)} books ({total / 1e6:.1f} MB) to {args.directory}")
+
+
+if __name__ == "__main__":
+    main()
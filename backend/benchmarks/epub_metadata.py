@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Benchmark EPUB metadata extraction: lightweight zip/OPF parser vs ebooklib.
+
+Runs both parsers over every EPUB in a directory (or over a generated corpus
+of large illustrated EPUBs) and reports time and peak Python memory.
+
+Usage:
+    cd backend
+    python -m benchmarks.epub_metadata [EPUB_DIR] [--generate N] [--repeat R]
+"""
+
+import argparse
+import io
+import os
+import sys
+import time
+import tracemalloc
+import zipfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.services.book_service import BookService  # noqa: E402
+from app.services.epub_service import EpubService  # noqa: E402
+
+
+def generate_epub(chapters: int = 120, chapter_kb: int = 40, images: int = 30, image_kb: int = 400) -> bytes:
+    """Build a large EPUB 3 with incompressible images and a cover."""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        archive.writestr("mimetype", "application/epub+zip", compress_type=zipfile.ZIP_STORED)
+        archive.writestr(
+            "META-INF/container.xml",
+            '<?xml version="1.0"?><container version="1.0" '
+            'xmlns="urn:oasis:names:tc:opendocument:xmlns:container"><rootfiles>'
+            '<rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/>'
+            "</rootfiles></container>",
+        )
+        manifest, spine = [], []
+        paragraph = "<p>" + "Lorem ipsum dolor sit amet. " * 20 + "</p>"
+        for i in range(chapters):
+            body = paragraph * max(1, chapter_kb * 1024 // len(paragraph))
+            archive.writestr(
+                f"OEBPS/ch{i}.xhtml",
+                f'<html xmlns="http://www.w3.org/1999/xhtml"><body>{body}</body></html>',
+                compress_type=zipfile.ZIP_DEFLATED,
+            )
+            manifest.append(f'<item id="ch{i}" href="ch{i}.xhtml" media-type="application/xhtml+xml"/>')
+            spine.append(f'<itemref idref="ch{i}"/>')
+        for i in range(images):
+            archive.writestr(f"OEBPS/img{i}.jpg", os.urandom(image_kb * 1024))
+            manifest.append(f'<item id="img{i}" href="img{i}.jpg" media-type="image/jpeg"/>')
+        archive.writestr("OEBPS/cover.jpg", os.urandom(image_kb * 1024))
+        manifest.append('<item id="cover" href="cover.jpg" media-type="image/jpeg" properties="cover-image"/>')
+        archive.writestr(
+            "OEBPS/content.opf",
+            '<?xml version="1.0"?><package xmlns="http://www.idpf.org/2007/opf" version="3.0" '
+            'unique-identifier="id"><metadata xmlns:dc="http://purl.org/dc/elements/1.1/">'
+            '<dc:identifier id="id">bench</dc:identifier><dc:title>Benchmark Book</dc:title>'
+            "<dc:creator>Bench Author</dc:creator><dc:language>en</dc:language></metadata>"
+            f"<manifest>{''.join(manifest)}</manifest><spine>{''.join(spine)}</spine></package>",
+        )
+    return buffer.getvalue()
+
+
+def measure(parse, content: bytes, repeat: int) -> tuple[float, int]:
+    """Return (mean seconds per call, peak traced bytes) for a parser."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        parse(content)
+    elapsed = (time.perf_counter() - start) / repeat
+    _current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("directory", nargs="?", help="Directory of .epub files")
+    parser.add_argument("--generate", type=int, default=5, help="Generated books when no directory is given")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per book and parser")
+    args = parser.parse_args()
+
+    if args.directory:
+        corpus = [(p.name, p.read_bytes()) for p in sorted(Path(args.directory).glob("*.epub"))]
+    else:
+        corpus = [(f"generated-{i}.epub", generate_epub()) for i in range(args.generate)]
+
+    parsers = {
+        "lightweight": lambda content: EpubService.read_metadata(io.BytesIO(content)),
+        "ebooklib": BookService.extract_epub_metadata_ebooklib,
+    }
+    totals = {name: [0.0, 0] for name in parsers}
+
+    print(f"{'book':<28}{'MB':>8}" + "".join(f"{n + ' ms':>16}{n + ' peak MB':>20}" for n in parsers))
+    for name, content in corpus:
+        row = f"{name[:27]:<28}{len(content) / 1e6:>8.1f}"
+        for parser_name, parse in parsers.items():
+            seconds, peak = measure(parse, content, args.repeat)
+            totals[parser_name][0] += seconds
+            totals[parser_name][1] = max(totals[parser_name][1], peak)
+            row += f"{seconds * 1000:>16.1f}{peak / 1e6:>20.1f}"
+        print(row)
+
+    light, full = totals["lightweight"], totals["ebooklib"]
+    if light[0]:
+        print(f"\nSpeed-up: {full[0] / light[0]:.1f}x   "
+              f"Peak memory: {light[1] / 1e6:.1f} MB vs {full[1] / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
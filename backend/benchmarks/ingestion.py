@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Benchmark book ingestion over the synthetic corpus.
+
+Runs three phases over every book of a corpus (generated in memory, or a
+directory written by ``benchmarks.corpus``):
+
+    extract   BookService.extract_metadata on the file bytes
+    create    BookService.create_book: metadata, storage writes, cover, row
+    refresh   BookService.refresh_all_metadata over the stored books
+
+and reports MB/s, files/s and the peak RSS of each phase, then per kind of
+book (PDF xref damage, EPUB cover layout) the time per file and whether the
+title, page count and cover came out as generated. A parser regression
+shows up as a slower kind or a lower "ok" count. Results are written as
+JSON; ``--compare`` prints the change against an earlier file.
+
+Usage:
+    cd backend
+    python -m benchmarks.ingestion [--count 60] [--max-pages 400]
+                                   [--corpus DIR] [--output ingestion.json]
+                                   [--compare baseline.json]
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import logging
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+_tmp = tempfile.mkdtemp(prefix="diread-ingest-")
+# Assigned, not defaulted: the benchmark must never write to a configured database or bucket
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{_tmp}/ingest.db"
+os.environ["LOCAL_STORAGE_PATH"] = f"{_tmp}/storage"
+os.environ["STORAGE_PROVIDER"] = "local"
+
+from sqlalchemy import insert  # noqa: E402
+from starlette.datastructures import UploadFile  # noqa: E402
+
+from app.database import AsyncSessionLocal, create_tables  # noqa: E402
+from app.models import User  # noqa: E402
+from app.models.book import BookType  # noqa: E402
+from app.services.book_service import BookService  # noqa: E402
+from benchmarks.corpus import BookSpec, corpus_specs, generate, read_corpus  # noqa: E402
+
+
+class PeakRss:
+    """Highest resident set size while the block runs, sampled every few ms."""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._page = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+    def _current(self) -> int:
+        try:
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * self._page
+        except OSError:
+            # No procfs: the process high-water mark (KB on Linux, bytes on macOS)
+            usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return usage if sys.platform == "darwin" else usage * 1024
+
+    def _sample(self) -> None:
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self._current())
+            self._stop.wait(self.interval)
+
+    def __enter__(self) -> "PeakRss":
+        self.peak = self._current()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self._current())
+
+
+def kind(spec: BookSpec) -> str:
+    return f"pdf/{spec.xref}" if spec.file_type == "pdf" else f"epub/{spec.cover}"
+
+
+def check(spec: BookSpec, metadata: dict) -> Dict[str, bool]:
+    """Whether extraction recovered what the generator put in."""
+    pages = metadata.get("total_pages")
+    return {
+        "title": metadata.get("title") == spec.title,
+        "pages": pages == spec.pages if spec.file_type == "pdf" else bool(pages),
+        "cover": bool(metadata.get("cover")) == spec.has_cover,
+    }
+
+
+def phase_result(files: int, size: int, seconds: float, rss: PeakRss) -> dict:
+    return {
+        "files": files,
+        "mb": round(size / 1e6, 2),
+        "seconds": round(seconds, 3),
+        "mb_per_s": round(size / 1e6 / seconds, 2) if seconds else 0.0,
+        "files_per_s": round(files / seconds, 1) if seconds else 0.0,
+        "peak_rss_mb": round(rss.peak / 1e6, 1),
+    }
+
+
+async def run(corpus: List[Tuple[BookSpec, bytes]]) -> dict:
+    await create_tables()
+    user_id = str(uuid.uuid4())
+    async with AsyncSessionLocal() as db:
+        await db.execute(insert(User), [{"id": user_id, "email": "ingest@example.com", "password_hash": "x"}])
+        await db.commit()
+
+    total = sum(len(content) for _, content in corpus)
+    content_of = {spec.name: content for spec, content in corpus}
+    kinds: Dict[str, dict] = {}
+
+    def tally(spec: BookSpec, seconds: float, metadata: dict) -> None:
+        entry = kinds.setdefault(kind(spec), {"files": 0, "mb": 0.0, "extract_ms": 0.0,
+                                              "title_ok": 0, "pages_ok": 0, "cover_ok": 0})
+        entry["files"] += 1
+        entry["mb"] += len(content_of[spec.name]) / 1e6
+        entry["extract_ms"] += seconds * 1000
+        for field, ok in check(spec, metadata).items():
+            entry[f"{field}_ok"] += ok
+
+    phases = {}
+
+    with PeakRss() as rss:
+        start = time.perf_counter()
+        for spec, content in corpus:
+            file_start = time.perf_counter()
+            file_type = BookType.PDF if spec.file_type == "pdf" else BookType.EPUB
+            metadata = await BookService.extract_metadata(content, file_type)
+            tally(spec, time.perf_counter() - file_start, metadata)
+        phases["extract"] = phase_result(len(corpus), total, time.perf_counter() - start, rss)
+
+    with PeakRss() as rss:
+        start = time.perf_counter()
+        async with AsyncSessionLocal() as db:
+            for spec, content in corpus:
+                upload = UploadFile(io.BytesIO(content), filename=f"{spec.name}.{spec.file_type}")
+                await BookService.create_book(db, user_id, upload)
+        phases["create"] = phase_result(len(corpus), total, time.perf_counter() - start, rss)
+
+    with PeakRss() as rss:
+        start = time.perf_counter()
+        async with AsyncSessionLocal() as db:
+            await BookService.refresh_all_metadata(db, user_id)
+        phases["refresh"] = phase_result(len(corpus), total, time.perf_counter() - start, rss)
+
+    for entry in kinds.values():
+        entry["ms_per_file"] = round(entry.pop("extract_ms") / entry["files"], 2)
+        entry["mb"] = round(entry["mb"], 2)
+
+    return {
+        "benchmark": "ingestion",
+        "created_at": datetime.utcnow().isoformat() + "Z",
+        "corpus": {"files": len(corpus), "mb": round(total / 1e6, 2)},
+        "phases": phases,
+        "kinds": dict(sorted(kinds.items())),
+    }
+
+
+def delta(current: float, previous: Optional[float]) -> str:
+    if not previous:
+        return ""
+    return f"{(current / previous - 1) * 100:+.0f}%"
+
+
+def print_report(results: dict, baseline: Optional[dict]) -> None:
+    previous = baseline or {}
+    corpus = results["corpus"]
+    print(f"corpus: {corpus['files']} files, {corpus['mb']} MB\n")
+    print(f"{'phase':<10}{'seconds':>10}{'MB/s':>10}{'files/s':>10}{'peak RSS MB':>14}")
+    for name, phase in results["phases"].items():
+        before = previous.get("phases", {}).get(name, {})
+        print(
+            f"{name:<10}{phase['seconds']:>10}{phase['mb_per_s']:>10}{phase['files_per_s']:>10}"
+            f"{phase['peak_rss_mb']:>14}   {delta(phase['mb_per_s'], before.get('mb_per_s'))}"
+        )
+
+    print(f"\n{'kind':<18}{'files':>7}{'MB':>8}{'ms/file':>10}{'title ok':>10}{'pages ok':>10}{'cover ok':>10}")
+    for name, entry in results["kinds"].items():
+        before = previous.get("kinds", {}).get(name, {})
+        files = entry["files"]
+        print(
+            f"{name:<18}{files:>7}{entry['mb']:>8}{entry['ms_per_file']:>10}"
+            + "".join(f"{entry[field]:>7}/{files:<2}" for field in ("title_ok", "pages_ok", "cover_ok"))
+            + f"   {delta(entry['ms_per_file'], before.get('ms_per_file'))}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--corpus", help="Directory written by benchmarks.corpus")
+    parser.add_argument("--count", type=int, default=60, help="Books to generate without --corpus")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--max-pages", type=int, default=400)
+    parser.add_argument("--image-density", type=float, default=0.3)
+    parser.add_argument("--output", default="ingestion-results.json", help="JSON results file")
+    parser.add_argument("--compare", help="Earlier results file to compare with")
+    args = parser.parse_args()
+    logging.getLogger("pypdf").setLevel(logging.ERROR)  # Damaged PDFs warn on every parse
+
+    if args.corpus:
+        corpus = read_corpus(Path(args.corpus))
+    else:
+        specs = corpus_specs(args.count, args.seed, args.max_pages, args.image_density)
+        corpus = [(spec, generate(spec)) for spec in specs]
+
+    results = asyncio.run(run(corpus))
+    baseline = json.loads(Path(args.compare).read_text()) if args.compare else None
+    print_report(results, baseline)
+    Path(args.output).write_text(json.dumps(results, indent=2))
+    print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Benchmark list responses: ORM objects and response models vs column rows.
+
+Fills a temporary SQLite database with one user's books and highlights and
+times loading and encoding the full lists both ways: the previous path
+(ORM instances, ``model_validate`` per row, ``TypeAdapter.dump_json``) and
+the column path used by the list endpoints (selected columns encoded once
+by ``dump_rows``). Both bodies are checked to be byte-identical.
+
+Usage:
+    cd backend
+    python -m benchmarks.list_serialization [--rows N] [--repeat R]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+_tmp = tempfile.mkdtemp(prefix="diread-bench-")
+# Assigned, not defaulted: the benchmark must never write to a configured database or bucket
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{_tmp}/bench.db"
+os.environ["LOCAL_STORAGE_PATH"] = f"{_tmp}/storage"
+os.environ["STORAGE_PROVIDER"] = "local"
+
+from pydantic import TypeAdapter  # noqa: E402
+from sqlalchemy import insert  # noqa: E402
+
+from app.config import settings  # noqa: E402
+from app.database import AsyncSessionLocal, create_tables  # noqa: E402
+from app.models import User, Book, Highlight  # noqa: E402
+from app.models.book import BookType  # noqa: E402
+from app.routers.books import _book_columns  # noqa: E402
+from app.routers.highlights import _highlight_columns  # noqa: E402
+from app.schemas.book import BookResponse  # noqa: E402
+from app.schemas.highlight import HighlightResponse  # noqa: E402
+from app.services.book_service import BookService  # noqa: E402
+from app.services.storage_service import storage_service  # noqa: E402
+from app.utils.serialization import dump_rows  # noqa: E402
+
+
+async def populate(rows: int) -> tuple[str, str]:
+    """Insert one user with ``rows`` books and ``rows`` highlights on one book."""
+    user_id = str(uuid.uuid4())
+    start = datetime(2024, 1, 1)
+    books = [
+        {
+            "id": str(uuid.uuid4()),
+            "user_id": user_id,
+            "title": f"Benchmark Book {i}",
+            "author": f"Author {i % 500}" if i % 7 else None,
+            # Under the storage root, as stored files are, so cover URLs get signed
+            "cover_url": f"{settings.LOCAL_STORAGE_PATH}/covers/{user_id}/{i}.jpg" if i % 3 else None,
+            "file_url": f"{settings.LOCAL_STORAGE_PATH}/books/{user_id}/{i}.pdf",
+            "file_type": BookType.PDF if i % 2 else BookType.EPUB,
+            "file_size": 1_000_000 + i,
+            "total_pages": 100 + i % 400,
+            "created_at": start + timedelta(seconds=i),
+        }
+        for i in range(rows)
+    ]
+    highlights = [
+        {
+            "id": str(uuid.uuid4()),
+            "user_id": user_id,
+            "book_id": books[0]["id"],
+            "text": f"Highlighted passage number {i} with some text around it.",
+            "page_number": i % 300,
+            "cfi": f"epubcfi(/6/{2 + i % 40}!/4/2/1:{i % 900})",
+            "color": "yellow",
+            "note": f"Note {i}" if i % 4 == 0 else None,
+            "created_at": start + timedelta(seconds=i),
+        }
+        for i in range(rows)
+    ]
+    async with AsyncSessionLocal() as db:
+        await db.execute(insert(User), [{
+            "id": user_id, "email": "bench@example.com", "password_hash": "x", "created_at": start,
+        }])
+        await db.execute(insert(Book), books)
+        await db.execute(insert(Highlight), highlights)
+        await db.commit()
+    return user_id, books[0]["id"]
+
+
+async def orm_books(user_id: str) -> bytes:
+    async with AsyncSessionLocal() as db:
+        books, _ = await BookService.search_user_books(db, user_id)
+        return TypeAdapter(List[BookResponse]).dump_json([BookResponse.model_validate(b) for b in books])
+
+
+async def column_books(user_id: str) -> bytes:
+    async with AsyncSessionLocal() as db:
+        books, _ = await BookService.search_user_books(db, user_id, columns=_book_columns)
+        return dump_rows(books, BookResponse.model_fields, {"cover_url": storage_service.get_signed_url})
+
+
+async def orm_highlights(user_id: str, book_id: str) -> bytes:
+    async with AsyncSessionLocal() as db:
+        highlights = await BookService.get_highlights(db, book_id, user_id)
+        return TypeAdapter(List[HighlightResponse]).dump_json(
+            [HighlightResponse.model_validate(h) for h in highlights]
+        )
+
+
+async def column_highlights(user_id: str, book_id: str) -> bytes:
+    async with AsyncSessionLocal() as db:
+        highlights = await BookService.get_highlights(db, book_id, user_id, columns=_highlight_columns)
+        return dump_rows(highlights, HighlightResponse.model_fields)
+
+
+async def measure(run, repeat: int) -> tuple[float, bytes]:
+    """Return (best seconds of ``repeat`` runs, body)."""
+    best, body = float("inf"), b""
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = await run()
+        best = min(best, time.perf_counter() - start)
+    return best, body
+
+
+async def run(rows: int, repeat: int) -> None:
+    await create_tables()
+    user_id, book_id = await populate(rows)
+
+    cases = {
+        "books": (lambda: orm_books(user_id), lambda: column_books(user_id)),
+        "highlights": (
+            lambda: orm_highlights(user_id, book_id),
+            lambda: column_highlights(user_id, book_id),
+        ),
+    }
+    print(f"{rows} rows, best of {repeat}")
+    print(f"{'list':<12}{'MB':>8}{'models ms':>14}{'columns ms':>14}{'speed-up':>12}")
+    for name, (old, new) in cases.items():
+        old_seconds, old_body = await measure(old, repeat)
+        new_seconds, new_body = await measure(new, repeat)
+        if old_body != new_body:
+            raise SystemExit(f"{name}: column body differs from the response model body")
+        print(
+            f"{name:<12}{len(new_body) / 1e6:>8.2f}{old_seconds * 1000:>14.1f}"
+            f"{new_seconds * 1000:>14.1f}{old_seconds / new_seconds:>11.1f}x"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10_000, help="Books and highlights to generate")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per path")
+    args = parser.parse_args()
+    asyncio.run(run(args.rows, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
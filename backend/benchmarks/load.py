@@ -0,0 +1,619 @@
+#!/usr/bin/env python3
+"""
+End-to-end load benchmark of the API against a large synthetic dataset.
+
+Generates a SQLite database with thousands of users, 10^5 books and 10^6
+highlights and bookmarks (``--scale`` shrinks or grows all of them), then
+drives the real app in-process through its ASGI interface with concurrent
+clients. Every scenario reports throughput and p50/p95/p99 latency; the
+results are written as JSON so runs can be compared with ``--compare``.
+
+Scenarios:
+    login           POST /auth/login (bcrypt verify)
+    refresh         POST /auth/refresh, each client rotating its own token
+    library         GET /books of random users, skewed towards heavy readers
+    progress        PUT /books/{id}/progress storm on a few hundred books
+    upload[P]       POST /books/upload of small generated PDFs
+    download[P]     GET /books/{id}/download of 0.25-4 MB files
+
+P is the storage provider: ``local`` (files under the data directory) or
+``s3``, an in-memory S3 stand-in with optional per-call latency. Latency is
+taken when the last body chunk is sent, so background tasks of an upload
+run afterwards as they would behind a real server.
+
+Usage:
+    cd backend
+    python -m benchmarks.load [--scale 0.1] [--requests 500] [--concurrency 16]
+                              [--scenarios library,progress] [--data-dir DIR]
+                              [--output results.json] [--compare baseline.json]
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+BACKEND = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND))
+
+PASSWORD = "benchmark-password"
+
+# Rows at --scale 1
+DATASET = {"users": 2_000, "books": 100_000, "highlights": 1_000_000, "bookmarks": 1_000_000}
+
+# Requests per scenario relative to --requests; bcrypt bound scenarios run fewer
+REQUEST_SHARE = {"login": 0.1, "refresh": 0.04, "upload": 0.2}
+
+SAMPLE_FILES = 8  # Distinct stored files the seeded books point to
+CHUNK = 20_000
+
+
+def uid(rng: random.Random) -> str:
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def padded_pdf(size: int, title: str = "Benchmark") -> bytes:
+    """A valid PDF of about ``size`` bytes (padding after the trailer)."""
+    from pypdf import PdfWriter
+
+    writer = PdfWriter()
+    for _ in range(4):
+        writer.add_blank_page(612, 792)
+    writer.add_metadata({"/Title": title, "/Author": "Load Benchmark"})
+    output = io.BytesIO()
+    writer.write(output)
+    content = output.getvalue()
+    padding = max(0, size - len(content))
+    return content + b"\n%" + b"0" * padding
+
+
+# --------------------------------------------------------------------------
+# S3 stand-in
+
+
+class MemoryS3:
+    """
+    The subset of the boto3 S3 client StorageService uses, in memory.
+
+    ``latency`` seconds are slept per call, on the calling thread, like a
+    blocking boto3 request would.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.objects: Dict[str, bytes] = {}
+        self.latency = latency
+        self._lock = threading.Lock()
+
+    def _wait(self) -> None:
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _missing(self, operation: str):
+        from botocore.exceptions import ClientError
+
+        return ClientError({"Error": {"Code": "NoSuchKey", "Message": "Not Found"}}, operation)
+
+    def put_object(self, Bucket: str, Key: str, Body: bytes, **kwargs) -> dict:
+        self._wait()
+        with self._lock:
+            self.objects[Key] = bytes(Body)
+        return {}
+
+    def get_object(self, Bucket: str, Key: str, Range: Optional[str] = None) -> dict:
+        self._wait()
+        content = self.objects.get(Key)
+        if content is None:
+            raise self._missing("GetObject")
+        if Range:
+            start, end = Range.removeprefix("bytes=").split("-")
+            content = content[int(start):int(end) + 1]
+        return {"Body": io.BytesIO(content), "ContentLength": len(content)}
+
+    def head_object(self, Bucket: str, Key: str) -> dict:
+        self._wait()
+        if Key not in self.objects:
+            raise self._missing("HeadObject")
+        return {"ContentLength": len(self.objects[Key])}
+
+    def head_bucket(self, Bucket: str) -> dict:
+        self._wait()
+        return {}
+
+    def delete_object(self, Bucket: str, Key: str) -> dict:
+        self._wait()
+        with self._lock:
+            self.objects.pop(Key, None)
+        return {}
+
+    def delete_objects(self, Bucket: str, Delete: dict) -> dict:
+        self._wait()
+        with self._lock:
+            for item in Delete["Objects"]:
+                self.objects.pop(item["Key"], None)
+        return {}
+
+    def get_paginator(self, operation: str):
+        client = self
+
+        class _Paginator:
+            def paginate(self, Bucket: str, Prefix: str = ""):
+                client._wait()
+                keys = [key for key in list(client.objects) if key.startswith(Prefix)]
+                yield {"Contents": [{"Key": key} for key in keys]}
+
+        return _Paginator()
+
+    def generate_presigned_url(self, operation: str, Params: dict, ExpiresIn: int) -> str:
+        return f"https://s3.benchmark.invalid/{Params['Bucket']}/{Params['Key']}?expires={ExpiresIn}"
+
+
+# --------------------------------------------------------------------------
+# Dataset
+
+
+async def generate_dataset(sizes: Dict[str, int], storage_root: Path, seed: int) -> None:
+    """Insert the synthetic dataset with bulk inserts (no ORM objects)."""
+    from sqlalchemy import insert
+
+    from app.database import AsyncSessionLocal, create_tables
+    from app.models import User, Book, Highlight, Bookmark, ReadingProgress
+    from app.models.book import BookType
+    from app.services.auth_service import pwd_context
+
+    rng = random.Random(seed)
+    await create_tables()
+    password_hash = pwd_context.hash(PASSWORD)  # One hash: users differ only by email
+    start = datetime(2024, 1, 1)
+
+    sample_paths = []
+    for i in range(SAMPLE_FILES):
+        path = storage_root / "books" / "samples" / f"sample-{i}.pdf"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(padded_pdf(256 * 1024 * 2 ** (i % 5), title=f"Sample {i}"))
+        sample_paths.append(str(path))
+
+    async def bulk(db, model, rows: List[dict]) -> None:
+        for i in range(0, len(rows), CHUNK):
+            await db.execute(insert(model), rows[i:i + CHUNK])
+
+    async with AsyncSessionLocal() as db:
+        user_ids = [uid(rng) for _ in range(sizes["users"])]
+        await bulk(db, User, [
+            {
+                "id": user_id,
+                "email": f"user{i}@bench.example",
+                "password_hash": password_hash,
+                "name": f"Reader {i}",
+                "created_at": start,
+                "updated_at": start,
+            }
+            for i, user_id in enumerate(user_ids)
+        ])
+
+        # Squaring the draw gives a few users large libraries and most a few books
+        books = []
+        for i in range(sizes["books"]):
+            user_id = user_ids[int(len(user_ids) * rng.random() ** 2)]
+            is_pdf = rng.random() < 0.6
+            books.append({
+                "id": uid(rng),
+                "user_id": user_id,
+                "title": f"Synthetic Book {i}",
+                "author": f"Author {rng.randrange(5_000)}",
+                "cover_url": None,
+                "file_url": sample_paths[i % SAMPLE_FILES],
+                "file_type": BookType.PDF if is_pdf else BookType.EPUB,
+                "file_size": os.path.getsize(sample_paths[i % SAMPLE_FILES]),
+                "total_pages": rng.randrange(50, 800),
+                "created_at": start + timedelta(minutes=i),
+            })
+        await bulk(db, Book, books)
+
+        progress = [
+            {
+                "id": uid(rng),
+                "user_id": book["user_id"],
+                "book_id": book["id"],
+                "current_page": rng.randrange(book["total_pages"]),
+                "progress_percent": rng.random(),
+                "last_read_at": start + timedelta(minutes=rng.randrange(500_000)),
+            }
+            for book in books if rng.random() < 0.5
+        ]
+        await bulk(db, ReadingProgress, progress)
+
+        for model, count in ((Highlight, sizes["highlights"]), (Bookmark, sizes["bookmarks"])):
+            for offset in range(0, count, CHUNK):
+                rows = []
+                for i in range(offset, min(count, offset + CHUNK)):
+                    book = books[int(len(books) * rng.random() ** 2)]
+                    row = {
+                        "id": uid(rng),
+                        "user_id": book["user_id"],
+                        "book_id": book["id"],
+                        "page_number": rng.randrange(book["total_pages"]),
+                        "created_at": start + timedelta(seconds=i),
+                    }
+                    if model is Highlight:
+                        row.update(text=f"Highlighted passage {i} of a synthetic book.", color="yellow",
+                                   note=f"Note {i}" if i % 5 == 0 else None)
+                    else:
+                        row.update(title=f"Bookmark {i}")
+                    rows.append(row)
+                await db.execute(insert(model), rows)
+        await db.commit()
+
+
+# --------------------------------------------------------------------------
+# In-process ASGI client
+
+
+class AsgiClient:
+    """Sends requests straight to the ASGI app, without sockets or httpx."""
+
+    def __init__(self, app):
+        self.app = app
+        self.pending: set = set()
+        self.exceptions: Dict[str, int] = {}
+        self.failures = 0  # Exceptions raised after a non-5xx response
+
+    async def request(
+        self, method: str, path: str, headers: Optional[Dict[str, str]] = None, body: bytes = b""
+    ) -> Tuple[int, bytes, float]:
+        """Return (status, body, seconds until the last body chunk)."""
+        path, _, query = path.partition("?")
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": method,
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": query.encode(),
+            "root_path": "",
+            "headers": [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()]
+            + [(b"host", b"bench"), (b"content-length", str(len(body)).encode())],
+            "client": ("127.0.0.1", 50000),
+            "server": ("bench", 80),
+        }
+        received = False
+        done = asyncio.get_running_loop().create_future()
+        status, chunks = 500, []
+
+        async def receive():
+            nonlocal received
+            if not received:
+                received = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            await asyncio.Future()  # No disconnect until the app is done
+
+        async def send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+                if not message.get("more_body", False) and not done.done():
+                    done.set_result(time.perf_counter())
+
+        def finished(task: asyncio.Task) -> None:
+            self.pending.discard(task)
+            if not task.cancelled() and task.exception() is not None:
+                name = type(task.exception()).__name__
+                self.exceptions[name] = self.exceptions.get(name, 0) + 1
+                if status < 500:
+                    # E.g. a background task failing after the response was sent
+                    self.failures += 1
+
+        start = time.perf_counter()
+        task = asyncio.create_task(self.app(scope, receive, send))
+        # Background tasks keep the app call running after the response
+        self.pending.add(task)
+        task.add_done_callback(finished)
+        await asyncio.wait({task, done}, return_when=asyncio.FIRST_COMPLETED)
+        if not done.done():
+            task.result()  # Raise the app's exception
+        return status, b"".join(chunks), done.result() - start
+
+    async def drain(self) -> None:
+        """Wait for background tasks of finished requests."""
+        while self.pending:
+            await asyncio.gather(*list(self.pending), return_exceptions=True)
+
+
+def multipart(filename: str, content: bytes, content_type: str) -> Tuple[bytes, str]:
+    boundary = uuid.uuid4().hex
+    body = (
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"{filename}\"\r\n"
+        f"Content-Type: {content_type}\r\n\r\n"
+    ).encode() + content + f"\r\n--{boundary}--\r\n".encode()
+    return body, f"multipart/form-data; boundary={boundary}"
+
+
+# --------------------------------------------------------------------------
+# Scenarios
+
+
+class Context:
+    def __init__(self, client: AsgiClient, rng: random.Random, users: List[Tuple[str, int]],
+                 books: List[Tuple[str, str]], concurrency: int):
+        self.client = client
+        self.rng = rng
+        self.users = users  # (user_id, index), heavy readers first
+        self.books = books  # (book_id, user_id)
+        self.concurrency = concurrency
+        self._tokens: Dict[str, str] = {}
+
+    def auth(self, user_id: str) -> Dict[str, str]:
+        from app.services.auth_service import AuthService
+
+        if user_id not in self._tokens:
+            self._tokens[user_id] = AuthService.create_access_token(user_id)
+        return {"Authorization": f"Bearer {self._tokens[user_id]}"}
+
+    def skewed_user(self) -> Tuple[str, int]:
+        return self.users[int(len(self.users) * self.rng.random() ** 2)]
+
+
+async def scenario_login(ctx: Context, worker: int):
+    _, index = ctx.users[ctx.rng.randrange(len(ctx.users))]
+    body = json.dumps({"email": f"user{index}@bench.example", "password": PASSWORD}).encode()
+    return await ctx.client.request("POST", "/api/v1/auth/login", {"content-type": "application/json"}, body)
+
+
+async def setup_refresh(ctx: Context) -> None:
+    from app.database import AsyncSessionLocal
+    from app.services.auth_service import AuthService
+
+    ctx.refresh_tokens = {}
+    async with AsyncSessionLocal() as db:
+        for worker in range(ctx.concurrency):
+            user_id, _ = ctx.users[worker % len(ctx.users)]
+            token, token_hash = AuthService.create_refresh_token()
+            await AuthService.store_refresh_token(db, user_id, token_hash)
+            ctx.refresh_tokens[worker] = token
+
+
+async def scenario_refresh(ctx: Context, worker: int):
+    body = json.dumps({"refresh_token": ctx.refresh_tokens[worker]}).encode()
+    result = await ctx.client.request("POST", "/api/v1/auth/refresh", {"content-type": "application/json"}, body)
+    if result[0] == 200:
+        ctx.refresh_tokens[worker] = json.loads(result[1])["refresh_token"]
+    return result
+
+
+async def scenario_library(ctx: Context, worker: int):
+    user_id, _ = ctx.skewed_user()
+    return await ctx.client.request("GET", "/api/v1/books", ctx.auth(user_id))
+
+
+async def scenario_progress(ctx: Context, worker: int):
+    # Many devices syncing the same few hundred books at once
+    book_id, user_id = ctx.books[ctx.rng.randrange(min(300, len(ctx.books)))]
+    body = json.dumps({
+        "current_page": ctx.rng.randrange(500),
+        "progress_percent": round(ctx.rng.random(), 4),
+    }).encode()
+    headers = {**ctx.auth(user_id), "content-type": "application/json"}
+    return await ctx.client.request("PUT", f"/api/v1/books/{book_id}/progress", headers, body)
+
+
+async def scenario_upload(ctx: Context, worker: int):
+    user_id, _ = ctx.skewed_user()
+    size = ctx.rng.choice((64, 256, 1024)) * 1024
+    content = padded_pdf(size, title=f"Upload {uuid.uuid4().hex[:8]}")
+    body, content_type = multipart("upload.pdf", content, "application/pdf")
+    headers = {**ctx.auth(user_id), "content-type": content_type}
+    return await ctx.client.request("POST", "/api/v1/books/upload", headers, body)
+
+
+async def scenario_download(ctx: Context, worker: int):
+    book_id, user_id = ctx.books[ctx.rng.randrange(len(ctx.books))]
+    return await ctx.client.request("GET", f"/api/v1/books/{book_id}/download", ctx.auth(user_id))
+
+
+SCENARIOS = {
+    "login": (scenario_login, None),
+    "refresh": (scenario_refresh, setup_refresh),
+    "library": (scenario_library, None),
+    "progress": (scenario_progress, None),
+    "upload": (scenario_upload, None),
+    "download": (scenario_download, None),
+}
+STORAGE_SCENARIOS = ("upload", "download")
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(q / 100 * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+async def run_scenario(ctx: Context, name: str, requests: int) -> dict:
+    run, setup = SCENARIOS[name.split("[")[0]]
+    if setup is not None:
+        await setup(ctx)
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    remaining = requests
+
+    async def worker(index: int) -> None:
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            status, _, seconds = await run(ctx, index)
+            latencies.append(seconds)
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(ctx.concurrency)))
+    elapsed = time.perf_counter() - start
+    await ctx.client.drain()
+
+    exceptions, ctx.client.exceptions = ctx.client.exceptions, {}
+    failures, ctx.client.failures = ctx.client.failures, 0
+    latencies.sort()
+    # Failed requests, counting ones that raised after a successful response
+    errors = sum(count for status, count in statuses.items() if int(status) >= 400) + failures
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "statuses": statuses,
+        "exceptions": exceptions,  # Raised by the app, including in background tasks
+        "seconds": round(elapsed, 3),
+        "throughput": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        **{
+            f"{label}_ms": round(percentile(latencies, q) * 1000, 2)
+            for label, q in (("p50", 50), ("p95", 95), ("p99", 99), ("max", 100))
+        },
+    }
+
+
+# --------------------------------------------------------------------------
+# Driver
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def load_samples(limit: int) -> Tuple[List[Tuple[str, int]], List[Tuple[str, str]]]:
+    """Users ordered by library size, and a deterministic sample of books."""
+    from sqlalchemy import func, select
+
+    from app.database import AsyncSessionLocal
+    from app.models import User, Book
+
+    async with AsyncSessionLocal() as db:
+        rows = (await db.execute(
+            select(User.id, User.email, func.count(Book.id).label("books"))
+            .outerjoin(Book, Book.user_id == User.id)
+            .group_by(User.id)
+            .order_by(func.count(Book.id).desc(), User.email)
+        )).all()
+        users = [(row.id, int(row.email.removeprefix("user").split("@")[0])) for row in rows]
+        books = (await db.execute(select(Book.id, Book.user_id).order_by(Book.id).limit(limit))).all()
+    return users, [tuple(book) for book in books]
+
+
+def print_report(results: dict, baseline: Optional[dict]) -> None:
+    columns = ("requests", "errors", "throughput", "p50_ms", "p95_ms", "p99_ms", "max_ms")
+    print(f"\n{'scenario':<18}" + "".join(f"{name:>12}" for name in columns))
+    for name, result in results["scenarios"].items():
+        print(f"{name:<18}" + "".join(f"{result[column]:>12}" for column in columns))
+        if result["exceptions"]:
+            print(f"{'  exceptions':<18}" + ", ".join(f"{n} x {e}" for e, n in result["exceptions"].items()))
+        previous = (baseline or {}).get("scenarios", {}).get(name)
+        if previous:
+            deltas = "".join(
+                f"{(result[column] / previous[column] - 1) * 100:>+11.0f}%" if previous[column] else f"{'':>12}"
+                for column in columns[2:]
+            )
+            print(f"{'  vs baseline':<18}{'':>24}" + deltas)
+
+
+async def run(args) -> dict:
+    from app.services.storage_service import storage_service
+    from main import app
+
+    sizes = {name: max(1, int(count * args.scale)) for name, count in DATASET.items()}
+    data_dir = Path(args.data_dir)
+    marker = data_dir / "dataset.json"
+    dataset = {"sizes": sizes, "seed": args.seed}
+
+    async with app.router.lifespan_context(app):
+        if not marker.exists() or json.loads(marker.read_text()) != dataset:
+            print(f"Generating dataset in {data_dir}: {sizes}", flush=True)
+            start = time.perf_counter()
+            await generate_dataset(sizes, data_dir / "storage", args.seed)
+            marker.write_text(json.dumps(dataset))
+            print(f"Generated in {time.perf_counter() - start:.1f} s", flush=True)
+        else:
+            print(f"Reusing dataset in {data_dir}: {sizes}", flush=True)
+
+        users, books = await load_samples(10_000)
+        ctx = Context(AsgiClient(app), random.Random(args.seed), users, books, args.concurrency)
+
+        names = args.scenarios.split(",") if args.scenarios else list(SCENARIOS)
+        providers = args.storage.split(",")
+        fake_s3 = MemoryS3(latency=args.s3_latency_ms / 1000)
+        for path in {str(p) for p in (data_dir / "storage" / "books" / "samples").glob("*.pdf")}:
+            fake_s3.objects[path] = Path(path).read_bytes()  # Seeded file_url is used as the key
+
+        scenarios = {}
+        for name in names:
+            share = REQUEST_SHARE.get(name, 1.0)
+            requests = max(ctx.concurrency, int(args.requests * share))
+            for provider in providers if name in STORAGE_SCENARIOS else [None]:
+                label = f"{name}[{provider}]" if provider else name
+                storage_service.provider = provider or "local"
+                storage_service._s3 = fake_s3 if provider == "s3" else None
+                print(f"Running {label} ({requests} requests)...", flush=True)
+                scenarios[label] = await run_scenario(ctx, label, requests)
+        storage_service.provider, storage_service._s3 = "local", None
+
+    return {
+        "benchmark": "load",
+        "created_at": datetime.utcnow().isoformat() + "Z",
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "dataset": dataset,
+        "concurrency": args.concurrency,
+        "s3_latency_ms": args.s3_latency_ms,
+        "scenarios": scenarios,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiplier for the dataset size")
+    parser.add_argument("--requests", type=int, default=1_000, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent clients")
+    parser.add_argument("--scenarios", help=f"Comma-separated subset of: {','.join(SCENARIOS)}")
+    parser.add_argument("--storage", default="local,s3", help="Providers for upload/download")
+    parser.add_argument("--s3-latency-ms", type=float, default=0.0, help="Delay per S3 stand-in call")
+    parser.add_argument("--data-dir", help="Keep the dataset here and reuse it on later runs")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="load-results.json", help="JSON results file")
+    parser.add_argument("--compare", help="Earlier results file to compare with")
+    args = parser.parse_args()
+
+    args.data_dir = args.data_dir or tempfile.mkdtemp(prefix="diread-load-")
+    os.makedirs(args.data_dir, exist_ok=True)
+    data_dir = os.path.abspath(args.data_dir)
+    # Before the app is imported: settings are read once
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{data_dir}/load.db"
+    os.environ["LOCAL_STORAGE_PATH"] = f"{data_dir}/storage"
+    # R2-style URLs (endpoint/bucket/key), which the S3 stand-in serves
+    os.environ["STORAGE_ENDPOINT_URL"] = "https://s3.benchmark.invalid"
+
+    results = asyncio.run(run(args))
+    baseline = json.loads(Path(args.compare).read_text()) if args.compare else None
+    print_report(results, baseline)
+    Path(args.output).write_text(json.dumps(results, indent=2))
+    print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+Microbenchmarks of hot service functions, with a regression gate.
+
+Each benchmark times one call in rounds of calibrated iterations, like
+pytest-benchmark, and reports min/median/mean/stddev per call and calls per
+second. ``--save`` stores the results as a baseline; ``--compare`` checks a
+run against one and exits with status 1 when the median of any benchmark
+got slower by more than ``--threshold`` percent. Baselines are only
+comparable on the same machine.
+
+Usage:
+    cd backend
+    python -m benchmarks.micro [-k auth] [--save baseline.json]
+    python -m benchmarks.micro --compare baseline.json [--threshold 10]
+"""
+
+import argparse
+import asyncio
+import inspect
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+_tmp = tempfile.mkdtemp(prefix="diread-micro-")
+# Assigned, not defaulted: the benchmark must never write to a configured database or bucket
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{_tmp}/micro.db"
+os.environ["LOCAL_STORAGE_PATH"] = f"{_tmp}/storage"
+os.environ["STORAGE_PROVIDER"] = "local"
+
+from sqlalchemy import insert  # noqa: E402
+
+from app.config import settings  # noqa: E402
+from app.database import AsyncSessionLocal, create_tables  # noqa: E402
+from app.models import User, Book, Highlight  # noqa: E402
+from app.models.book import BookType  # noqa: E402
+from app.routers.books import _book_columns  # noqa: E402
+from app.routers.highlights import _highlight_columns  # noqa: E402
+from app.schemas.book import BookResponse  # noqa: E402
+from app.schemas.highlight import HighlightResponse  # noqa: E402
+from app.services.auth_service import AuthService  # noqa: E402
+from app.services.book_service import BookService  # noqa: E402
+from app.services.storage_service import storage_service  # noqa: E402
+from app.utils.serialization import dump_rows  # noqa: E402
+
+LIST_ROWS = 1_000
+FILE_SIZE = 1024 * 1024
+REFRESH_TOKENS = 3  # Stored tokens the lookup scans; each costs a bcrypt verify
+
+# name -> async setup returning the callable to time (plain or async)
+BENCHMARKS: Dict[str, Callable] = {}
+
+
+def benchmark(name: str):
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+
+class Fixture:
+    """One user with a library, highlights, a refresh token and a stored file."""
+
+    async def create(self) -> "Fixture":
+        await create_tables()
+        self.user_id = str(uuid.uuid4())
+        start = datetime(2024, 1, 1)
+        self.books = [
+            {
+                "id": str(uuid.uuid4()),
+                "user_id": self.user_id,
+                "title": f"Benchmark Book {i}",
+                "author": f"Author {i % 50}",
+                # Under the storage root, as stored files are, so cover URLs get signed
+                "cover_url": f"{settings.LOCAL_STORAGE_PATH}/covers/{self.user_id}/{i}.jpg" if i % 3 else None,
+                "file_url": f"{settings.LOCAL_STORAGE_PATH}/books/{self.user_id}/{i}.pdf",
+                "file_type": BookType.PDF,
+                "file_size": 1_000_000 + i,
+                "total_pages": 300,
+                "created_at": start + timedelta(seconds=i),
+            }
+            for i in range(LIST_ROWS)
+        ]
+        highlights = [
+            {
+                "id": str(uuid.uuid4()),
+                "user_id": self.user_id,
+                "book_id": self.books[0]["id"],
+                "text": f"Highlighted passage number {i} with some text around it.",
+                "page_number": i % 300,
+                "color": "yellow",
+                "created_at": start + timedelta(seconds=i),
+            }
+            for i in range(LIST_ROWS)
+        ]
+        async with AsyncSessionLocal() as db:
+            await db.execute(insert(User), [{"id": self.user_id, "email": "micro@example.com", "password_hash": "x"}])
+            await db.execute(insert(Book), self.books)
+            await db.execute(insert(Highlight), highlights)
+            # The token looked up is stored last, so the lookup verifies every token
+            for _ in range(REFRESH_TOKENS - 1):
+                await AuthService.store_refresh_token(db, self.user_id, AuthService.create_refresh_token()[1])
+            self.refresh_token, token_hash = AuthService.create_refresh_token()
+            await AuthService.store_refresh_token(db, self.user_id, token_hash)
+            await db.commit()
+        self.file_content = os.urandom(FILE_SIZE)
+        self.file_url = await storage_service.upload_book(self.user_id, self.file_content, "pdf")
+        return self
+
+
+@benchmark("auth.create_access_token")
+async def bench_create_access_token(fx: Fixture):
+    return lambda: AuthService.create_access_token(fx.user_id)
+
+
+@benchmark("auth.verify_token")
+async def bench_verify_token(fx: Fixture):
+    token = AuthService.create_access_token(fx.user_id)
+    return lambda: AuthService.verify_token(token)
+
+
+@benchmark(f"auth.find_refresh_token[{REFRESH_TOKENS} stored]")
+async def bench_find_refresh_token(fx: Fixture):
+    async def run():
+        async with AsyncSessionLocal() as db:
+            assert await AuthService.find_refresh_token(db, fx.refresh_token) is not None
+    return run
+
+
+@benchmark("book.update_progress")
+async def bench_update_progress(fx: Fixture):
+    book_id = fx.books[0]["id"]
+    page = 0
+
+    async def run():
+        nonlocal page
+        page += 1
+        async with AsyncSessionLocal() as db:
+            await BookService.update_progress(db, book_id, fx.user_id, page % 300, None, (page % 100) / 100)
+    return run
+
+
+@benchmark(f"serialize.books[{LIST_ROWS}]")
+async def bench_serialize_books(fx: Fixture):
+    async with AsyncSessionLocal() as db:
+        rows, _ = await BookService.search_user_books(db, fx.user_id, columns=_book_columns)
+    return lambda: dump_rows(rows, BookResponse.model_fields, {"cover_url": storage_service.get_signed_url})
+
+
+@benchmark(f"serialize.highlights[{LIST_ROWS}]")
+async def bench_serialize_highlights(fx: Fixture):
+    async with AsyncSessionLocal() as db:
+        rows = await BookService.get_highlights(db, fx.books[0]["id"], fx.user_id, columns=_highlight_columns)
+    return lambda: dump_rows(rows, HighlightResponse.model_fields)
+
+
+@benchmark("storage.write_local[1MB]")
+async def bench_storage_write(fx: Fixture):
+    # Same file each time, so the benchmark does not fill the disk
+    return lambda: storage_service._upload_local(f"{fx.user_id}/write.pdf", fx.file_content, "books")
+
+
+@benchmark("storage.read_local[1MB]")
+async def bench_storage_read(fx: Fixture):
+    return lambda: storage_service.get_book(fx.file_url)
+
+
+@benchmark("storage.read_range_local[64KB]")
+async def bench_storage_read_range(fx: Fixture):
+    return lambda: storage_service.read_range(fx.file_url, FILE_SIZE // 2, 64 * 1024)
+
+
+async def measure(run: Callable, round_time: float, max_time: float, min_rounds: int) -> dict:
+    """Seconds per call over calibrated rounds; returns summary statistics."""
+    # Warm-up call; lambdas returning coroutines are timed as async too
+    result = run()
+    is_async = inspect.isawaitable(result)
+    if is_async:
+        await result
+
+    async def timed(iterations: int) -> float:
+        start = time.perf_counter()
+        if is_async:
+            for _ in range(iterations):
+                await run()
+        else:
+            for _ in range(iterations):
+                run()
+        return time.perf_counter() - start
+
+    single = max(await timed(1), 1e-7)
+    iterations = max(1, int(round_time / single))
+    rounds = max(min_rounds, min(1000, int(max_time / (single * iterations))))
+    samples = [await timed(iterations) / iterations for _ in range(rounds)]
+    return {
+        "rounds": rounds,
+        "iterations": iterations,
+        "min": min(samples),
+        "max": max(samples),
+        "mean": statistics.fmean(samples),
+        "stddev": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        "median": statistics.median(samples),
+        "ops": 1 / statistics.median(samples),
+    }
+
+
+def format_time(seconds: float) -> str:
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f} {unit}"
+    return f"{seconds / 1e-9:.0f} ns"
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], threshold: float) -> List[str]:
+    """Print the change of each median; return the benchmarks that regressed."""
+    regressions = []
+    print(f"\n{'benchmark':<40}{'baseline':>14}{'now':>14}{'change':>10}")
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            print(f"{name:<40}{'-':>14}{format_time(result['median']):>14}{'new':>10}")
+            continue
+        change = (result["median"] / previous["median"] - 1) * 100
+        flag = ""
+        if change > threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(
+            f"{name:<40}{format_time(previous['median']):>14}{format_time(result['median']):>14}"
+            f"{change:>+9.1f}%{flag}"
+        )
+    return regressions
+
+
+async def run(selected: List[str], round_time: float, max_time: float, min_rounds: int) -> Dict[str, dict]:
+    fixture = await Fixture().create()
+    results = {}
+    print(f"{'benchmark':<40}{'min':>12}{'median':>12}{'mean':>12}{'stddev':>12}{'ops/s':>12}{'rounds':>8}")
+    for name in selected:
+        target = await BENCHMARKS[name](fixture)
+        stats = await measure(target, round_time, max_time, min_rounds)
+        results[name] = stats
+        print(
+            f"{name:<40}" + "".join(format_time(stats[k]).rjust(12) for k in ("min", "median", "mean", "stddev"))
+            + f"{stats['ops']:>12.1f}{stats['rounds']:>8}"
+        )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-k", dest="keyword", help="Only benchmarks whose name contains this")
+    parser.add_argument("--save", help="Write the results to this baseline file")
+    parser.add_argument("--compare", help="Baseline file to compare with")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Allowed slowdown of the median, percent")
+    parser.add_argument("--round-time", type=float, default=0.02, help="Target seconds per round")
+    parser.add_argument("--max-time", type=float, default=1.0, help="Target seconds per benchmark")
+    parser.add_argument("--min-rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    selected = [name for name in BENCHMARKS if not args.keyword or args.keyword in name]
+    results = asyncio.run(run(selected, args.round_time, args.max_time, args.min_rounds))
+
+    if args.save:
+        Path(args.save).write_text(json.dumps({
+            "created_at": datetime.utcnow().isoformat() + "Z",
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "benchmarks": results,
+        }, indent=2))
+        print(f"\nBaseline written to {args.save}")
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())["benchmarks"]
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} benchmark(s) slower than the baseline by more than {args.threshold:g}%")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Benchmark cold start: create_all on every boot vs the stored schema check.
+
+Each scenario starts fresh interpreters against an existing database and
+reports the time to import the app, the time until the lifespan startup is
+done (the app is ready to serve), the wall time of the whole process and
+the time of the first PDF and EPUB parse after startup.
+
+Usage:
+    cd backend
+    python -m benchmarks.startup [--runs N]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BACKEND = Path(__file__).resolve().parent.parent
+
+# Runs in a fresh interpreter; prints timings in milliseconds as JSON
+_CHILD = """
+import time
+start = time.perf_counter()
+import asyncio, io, json, sys
+import main
+imported = time.perf_counter()
+
+async def run(mode):
+    from app.database import create_tables, init_schema
+    if mode == "create_all":
+        await create_tables()
+    else:
+        await init_schema()
+    await main.preload()
+    ready = time.perf_counter()
+
+    from benchmarks.startup import sample_pdf, sample_epub
+    from app.services.pdf_service import PdfService
+    from app.services.epub_service import EpubService
+    PdfService.read_metadata(io.BytesIO(sample_pdf()))
+    EpubService.read_metadata(io.BytesIO(sample_epub()))
+    parsed = time.perf_counter()
+    print(json.dumps({
+        "import": (imported - start) * 1000,
+        "ready": (ready - start) * 1000,
+        "first_parse": (parsed - ready) * 1000,
+    }))
+
+asyncio.run(run(sys.argv[1]))
+"""
+
+SCENARIOS = {
+    "create_all": ("create_all", "none"),
+    "schema check": ("check", "none"),
+    "schema check + startup preload": ("check", "startup"),
+}
+
+
+def sample_pdf() -> bytes:
+    from pypdf import PdfWriter
+    import io
+
+    writer = PdfWriter()
+    writer.add_blank_page(200, 200)
+    output = io.BytesIO()
+    writer.write(output)
+    return output.getvalue()
+
+
+def sample_epub() -> bytes:
+    import io
+    import zipfile
+
+    output = io.BytesIO()
+    with zipfile.ZipFile(output, "w") as archive:
+        archive.writestr("mimetype", "application/epub+zip")
+        archive.writestr(
+            "META-INF/container.xml",
+            '<?xml version="1.0"?><container version="1.0" '
+            'xmlns="urn:oasis:names:tc:opendocument:xmlns:container"><rootfiles>'
+            '<rootfile full-path="content.opf" media-type="application/oebps-package+xml"/>'
+            "</rootfiles></container>",
+        )
+        archive.writestr(
+            "content.opf",
+            '<?xml version="1.0"?><package xmlns="http://www.idpf.org/2007/opf" version="3.0">'
+            '<metadata xmlns:dc="http://purl.org/dc/elements/1.1/"><dc:title>Start</dc:title>'
+            "</metadata><manifest/><spine/></package>",
+        )
+    return output.getvalue()
+
+
+def run_child(mode: str, preload: str, env: dict) -> dict:
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", _CHILD, mode],
+        cwd=BACKEND,
+        env={**env, "PRELOAD_MODULES": preload},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    timings["process"] = (time.perf_counter() - start) * 1000
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="Processes per scenario")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="diread-startup-")
+    env = {
+        **os.environ,
+        "DATABASE_URL": f"sqlite+aiosqlite:///{tmp}/startup.db",
+        "LOCAL_STORAGE_PATH": f"{tmp}/storage",
+        "PYTHONPATH": str(BACKEND),
+    }
+    run_child("check", "none", env)  # Create the database and store the fingerprint
+
+    columns = ("import", "ready", "process", "first_parse")
+    print(f"median of {args.runs} runs, ms")
+    print(f"{'scenario':<32}" + "".join(f"{name:>13}" for name in columns))
+    for name, (mode, preload) in SCENARIOS.items():
+        runs = [run_child(mode, preload, env) for _ in range(args.runs)]
+        print(f"{name:<32}" + "".join(
+            f"{statistics.median(run[column] for run in runs):>13.0f}" for column in columns
+        ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+Backfill the full-text content index for existing books.
+
+Books are indexed one at a time and progress is stored in the database,
+so the script can be stopped and restarted at any point, and can run
+next to the API without blocking it.
+
+Usage:
+    cd backend
+    source venv/bin/activate
+    python index_content.py [--limit N] [--retry-failed]
+"""
+
+import argparse
+import asyncio
+
+from app.database import init_schema
+from app.services.content_index_service import ContentIndexService
+
+
+async def main(limit, retry_failed):
+    await init_schema()
+
+    print("=" * 50)
+    print("diRead Content Indexer")
+    print("=" * 50)
+
+    counts = await ContentIndexService.backfill(limit=limit, retry_failed=retry_failed)
+
+    print(f"Indexed: {counts['done']}")
+    print(f"Failed:  {counts['failed']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill the book content index")
+    parser.add_argument("--limit", type=int, default=None, help="Maximum number of books to index")
+    parser.add_argument("--retry-failed", action="store_true", help="Re-index books that failed before")
+    args = parser.parse_args()
+    asyncio.run(main(args.limit, args.retry_failed))
@@ -1,9 +1,29 @@
+import asyncio
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, Response, HTTPException, status
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.config import settings
-from app.database import create_tables
+from app.database import init_schema, engine
+from app.utils.compression import CompressionMiddleware
+from app.utils.query_stats import QueryStatsMiddleware
+from app.utils import metrics, tracing
+from app.utils.preload import preload
+from app.utils.warmup import warm_up
+from app.services.cache_service import cache_service
+from app.services import (
+    AuthService,
+    BookService,
+    StorageService,
+    EmailService,
+    SearchService,
+    ContentIndexService,
+    EpubService,
+    PdfService,
+    PaginationService,
+    VersionService,
+)
 from app.routers import (
     auth_router,
     users_router,
@@ -11,16 +31,40 @@ from app.routers import (
     progress_router,
     bookmarks_router,
     highlights_router,
+    files_router,
 )
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup
-    await create_tables()
+    # Startup: only reads the stored schema fingerprint unless models changed
+    await init_schema()
+    if settings.WARMUP_ENABLED:
+        # Serve while warming up; /health reports ready once it is done
+        app.state.ready = False
+        app.state.warmup = asyncio.create_task(warm_up(app.state))
+    else:
+        app.state.ready = True
+        app.state.preload = await preload()
+    background = []
+    if settings.METRICS_ENABLED:
+        background.append(asyncio.create_task(metrics.monitor_event_loop()))
+        if settings.METRICS_MULTIPROCESS_DIR:
+            background.append(asyncio.create_task(metrics.flush_snapshots()))
+    if settings.TRACING_ENABLED:
+        background.append(asyncio.create_task(tracing.export_spans()))
     yield
-    # Shutdown
-    pass
+    # Shutdown: runs after in-flight requests and their background tasks
+    if settings.WARMUP_ENABLED:
+        app.state.warmup.cancel()
+    for task in background:
+        task.cancel()
+    if settings.METRICS_ENABLED and settings.METRICS_MULTIPROCESS_DIR:
+        metrics.collect_cache_stats(cache_service.stats())
+        metrics.registry.write_snapshot()  # Keep this worker's final counts
+    if settings.TRACING_ENABLED:
+        await tracing.exporter.flush()
+    await engine.dispose()
 
 
 app = FastAPI(
@@ -39,6 +83,33 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Query Stats Middleware (counts statements; headers and N+1 warnings with DEBUG)
+app.add_middleware(QueryStatsMiddleware)
+
+# Compression Middleware
+if settings.COMPRESSION_ENABLED:
+    app.add_middleware(CompressionMiddleware)
+
+# Tracing Middleware (root span per sampled request; service methods get child spans)
+if settings.TRACING_ENABLED:
+    tracing.instrument(
+        AuthService,
+        BookService,
+        StorageService,
+        EmailService,
+        SearchService,
+        ContentIndexService,
+        EpubService,
+        PdfService,
+        PaginationService,
+        VersionService,
+    )
+    app.add_middleware(tracing.TracingMiddleware)
+
+# Metrics Middleware (outermost, so latencies include compression)
+if settings.METRICS_ENABLED:
+    app.add_middleware(metrics.MetricsMiddleware)
+
 # Include routers
 app.include_router(auth_router, prefix=settings.API_V1_PREFIX)
 app.include_router(users_router, prefix=settings.API_V1_PREFIX)
@@ -46,6 +117,7 @@ app.include_router(books_router, prefix=settings.API_V1_PREFIX)
 app.include_router(progress_router, prefix=settings.API_V1_PREFIX)
 app.include_router(bookmarks_router, prefix=settings.API_V1_PREFIX)
 app.include_router(highlights_router, prefix=settings.API_V1_PREFIX)
+app.include_router(files_router, prefix=settings.API_V1_PREFIX)
 
 
 @app.get("/")
@@ -58,15 +130,24 @@ async def root():
 
 
 @app.get("/health")
-async def health_check():
+async def health_check(response: Response):
+    if not getattr(app.state, "ready", True):
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+        return {"status": "starting"}
     return {"status": "healthy"}
 
 
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics(request: Request):
+    """Metrics in the Prometheus text format."""
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if settings.METRICS_TOKEN and request.headers.get("authorization") != f"Bearer {settings.METRICS_TOKEN}":
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid metrics token")
+    metrics.collect_cache_stats(cache_service.stats())
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
+
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(
-        "main:app",
-        host="0.0.0.0",
-        port=8000,
-        reload=settings.DEBUG,
-    )
+    import serve
+    serve.main()
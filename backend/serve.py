@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Production server: several supervised uvicorn workers on one socket.
+
+The supervisor restarts workers that die, and each worker is recycled after
+SERVER_MAX_REQUESTS requests (plus jitter, so they do not all restart at
+once). uvloop and httptools are used when installed (``uvicorn[standard]``).
+
+Signals sent to the supervisor:
+    HUP          restart the workers one by one, picking up new code
+    TTIN / TTOU  add / remove a worker
+    TERM / INT   stop accepting connections, let in-flight requests and
+                 their background tasks finish for up to
+                 SERVER_GRACEFUL_TIMEOUT seconds, then exit
+
+Usage:
+    cd backend
+    python serve.py [--workers N] [--host HOST] [--port PORT]
+"""
+
+import argparse
+import asyncio
+import importlib.util
+import os
+
+import uvicorn
+from uvicorn.supervisors import Multiprocess
+
+from app.config import settings
+
+
+def _available(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+async def _prepare_database() -> None:
+    """Upgrade the schema once here, so workers do not race to do it."""
+    from app.database import init_schema, engine
+
+    await init_schema()
+    await engine.dispose()
+
+
+def _reset_metrics_dir() -> None:
+    """Drop snapshots of a previous run; their pids may belong to other processes now."""
+    directory = settings.METRICS_MULTIPROCESS_DIR
+    if not directory:
+        return
+    os.makedirs(directory, exist_ok=True)
+    for name in os.listdir(directory):
+        if name.endswith((".json", ".tmp")):
+            os.remove(os.path.join(directory, name))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: one per CPU)")
+    parser.add_argument("--host", default=settings.SERVER_HOST)
+    parser.add_argument("--port", type=int, default=settings.SERVER_PORT)
+    parser.add_argument("--reload", action="store_true", default=settings.DEBUG,
+                        help="Single process that reloads on code changes (development)")
+    args = parser.parse_args()
+
+    if args.reload:
+        uvicorn.run("main:app", host=args.host, port=args.port, reload=True)
+        return
+
+    workers = args.workers or settings.server_workers
+    loop = "uvloop" if _available("uvloop") else "asyncio"
+    http = "httptools" if _available("httptools") else "h11"
+
+    asyncio.run(_prepare_database())
+    _reset_metrics_dir()
+    print(f"Starting {workers} workers on {args.host}:{args.port} ({loop}, {http})", flush=True)
+
+    config = uvicorn.Config(
+        "main:app",
+        host=args.host,
+        port=args.port,
+        workers=workers,
+        loop=loop,
+        http=http,
+        backlog=settings.SERVER_BACKLOG,
+        timeout_keep_alive=settings.SERVER_KEEPALIVE_TIMEOUT,
+        timeout_graceful_shutdown=settings.SERVER_GRACEFUL_TIMEOUT,
+        limit_max_requests=settings.SERVER_MAX_REQUESTS or None,
+        limit_max_requests_jitter=settings.SERVER_MAX_REQUESTS_JITTER,
+    )
+    # Always supervise, even a single worker, so recycled workers are replaced
+    Multiprocess(config, sockets=[config.bind_socket()]).run()
+
+
+if __name__ == "__main__":
+    main()